@@ -0,0 +1,132 @@
+"""
+webhook 准入控制
+================
+职责：
+1) 按任务类别（chat / read / expand / subscribe）限制在途数量，并限制单个用户同时在途的任务数；
+2) 超出容量时不入队，由 handle_event 立即给用户一个轻量的“繁忙，请稍后重试”提示，
+   推送后的集中点击不会堆积出无上限的流水线运行（线程与 LLM 配额都被占满）；
+3) 两种计数方式：
+   - 启用 worker 时：admit_job 在 SQLite 事务内按 jobs 表的 queued / running 计数并入队，跨 Web 进程生效；
+   - 在 Web 进程内执行的任务（未启用 worker 的后台任务、菜单 / 订阅切换等直接处理的请求）：
+     AdmissionController 进程内计数，任务结束时 release。
+
+用法：
+    reason = admission.try_acquire("expand", user_id)   # None 表示放行
+    if reason is None:
+        try: ...
+        finally: admission.release("expand", user_id)
+"""
+
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    ACTION_DEDUP_MAX_KEYS,
+    ADMISSION_BUSY_REPLY_INTERVAL_SEC,
+    ADMISSION_CLASS_LIMITS,
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_PER_USER_LIMIT,
+)
+from database import enqueue_job_admitted
+from job_queue import JOB_HANDLERS, shard_for
+from metrics import ADMISSION_REJECTIONS
+from router_fast_path import peek_intent
+from ttl_set import TTLSet
+
+BUSY_TEXT = "⏳ 当前请求较多，正在排队处理其他任务，请稍后再试一次～"
+BUSY_TOAST = "当前请求较多，请稍后重试"
+
+# router 意图 -> 任务类别；无法预判的消息按 chat 处理（需要 LLM 路由）
+_INTENT_CLASS = {"write": "subscribe", "read": "read", "chat": "chat"}
+
+
+def classify_message(text: str) -> str:
+    """按快速通道预判用户消息的任务类别（不调用 LLM）。"""
+    return _INTENT_CLASS.get(peek_intent(text) or "chat", "chat")
+
+
+class AdmissionController:
+    """进程内在途计数：按类别与按用户各一个上限，线程安全。"""
+
+    def __init__(self, class_limits: Dict[str, int], per_user_limit: int):
+        self.class_limits = dict(class_limits)
+        self.per_user_limit = int(per_user_limit)
+        self._lock = threading.Lock()
+        self._by_class: Dict[str, int] = defaultdict(int)
+        self._by_user: Dict[str, int] = defaultdict(int)
+
+    def try_acquire(self, task_class: str, user_id: Optional[str]) -> Optional[str]:
+        """占用一个名额；返回 None 表示放行，否则返回拒绝原因（"class" / "user"）。"""
+        if not ADMISSION_CONTROL_ENABLED:
+            return None
+        with self._lock:
+            limit = self.class_limits.get(task_class, 0)
+            if limit > 0 and self._by_class[task_class] >= limit:
+                reason = "class"
+            elif user_id and self.per_user_limit > 0 and self._by_user[user_id] >= self.per_user_limit:
+                reason = "user"
+            else:
+                self._by_class[task_class] += 1
+                if user_id:
+                    self._by_user[user_id] += 1
+                return None
+        ADMISSION_REJECTIONS.inc(task_class=task_class, reason=reason)
+        return reason
+
+    def release(self, task_class: str, user_id: Optional[str]) -> None:
+        if not ADMISSION_CONTROL_ENABLED:
+            return
+        with self._lock:
+            self._by_class[task_class] = max(0, self._by_class[task_class] - 1)
+            if not self._by_class[task_class]:
+                del self._by_class[task_class]
+            if user_id:
+                self._by_user[user_id] = max(0, self._by_user[user_id] - 1)
+                if not self._by_user[user_id]:
+                    del self._by_user[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": dict(self._by_class), "users": len(self._by_user)}
+
+
+admission = AdmissionController(ADMISSION_CLASS_LIMITS, ADMISSION_PER_USER_LIMIT)
+
+# 繁忙提示按用户限频
+_recent_busy_replies = TTLSet(ttl_sec=ADMISSION_BUSY_REPLY_INTERVAL_SEC, max_size=ACTION_DEDUP_MAX_KEYS)
+
+
+def should_notify_busy(user_id: Optional[str]) -> bool:
+    """同一用户在 ADMISSION_BUSY_REPLY_INTERVAL_SEC 内只提示一次。"""
+    return _recent_busy_replies.add(user_id or "")
+
+
+def admit_job(
+    kind: str,
+    payload: Dict[str, Any],
+    task_class: str,
+    user_id: Optional[str],
+) -> Tuple[Optional[int], Optional[str]]:
+    """
+    worker 模式的准入 + 入队（按用户分片）：返回 (job_id, None) 或 (None, 拒绝原因)。
+    未启用准入控制时不设上限。
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    shard = shard_for(user_id or kind)
+    job_id, reason = enqueue_job_admitted(
+        kind,
+        json.dumps(payload, ensure_ascii=False),
+        shard,
+        task_class,
+        user_id,
+        ADMISSION_CLASS_LIMITS.get(task_class, 0) if ADMISSION_CONTROL_ENABLED else 0,
+        ADMISSION_PER_USER_LIMIT if ADMISSION_CONTROL_ENABLED else 0,
+    )
+    if job_id is None:
+        ADMISSION_REJECTIONS.inc(task_class=task_class, reason=reason)
+        return None, reason
+    print(f"📥 [JobQueue] Enqueued {kind} job={job_id} shard={shard} class={task_class}")
+    return job_id, None
@@ -95,6 +95,22 @@ class AgentState(TypedDict):
     # 控制流标志
     intent: Optional[str] # write / read / chat
     force_refresh: Optional[bool] # [新增] 是否强制刷新
+    # [新增] writer 渐进式投递时已回复的卡片消息 ID（非空表示卡片已送达，无需再整卡回复）
+    delivered_message_id: Optional[str]
+
+    # [新增] 日内增量刷新（refresh_mode=incremental）相关字段
+    refresh_mode: Optional[str] # full / incremental
+    refresh_snapshot: Optional[Dict] # fetcher 产出的事件快照（供持久化为 refresh_state）
+    rewrite_event_ids: Optional[List[str]] # 本轮需重新评分/改写的事件；None 表示全部
+    previous_scored_events: Optional[List[Dict]] # 上一轮评分结果（增量合并基线）
+    rewrite_cache: Optional[Dict] # 上一轮改写文本 {"headlines": {id: title}, "summaries": {id: summary}}
+    rewrite_texts: Optional[Dict] # 本轮最终使用的改写文本（同上结构）
+
+    # [新增] 多订阅汇总：用户订阅了多个类别时由 fetcher 给出，fanout 节点并发生成并合并卡片
+    fanout_categories: Optional[List[str]]
+
+    # [新增] 本轮流水线 run_id（fetcher 分配；scorer 据此把评分写入 news_event_scores）
+    pipeline_run_id: Optional[str]
 
 
 class RouterDecision(BaseModel):
@@ -106,8 +122,19 @@ class RouterDecision(BaseModel):
         None, description="提取出的具体领域关键词，如 'AI', '科技'"
     )
 
-from tools import fetch_news
+from tools import afetch_news, fetch_news
+from news_store import new_run_id, record_articles, record_clusters, record_run, record_scores
 from news_dedup import dedupe_news_payload
+from news_incremental import (
+    build_refresh_events,
+    build_scoring_input,
+    build_snapshot,
+    collect_seen_ids,
+    load_refresh_state,
+    merge_incremental_articles,
+    merge_rewrite_texts,
+)
+from datetime import datetime, timedelta, timezone
 from config import (
     NEWS_DEDUP_DEBUG,
     NEWS_DEDUP_EMBEDDING_MODEL,
@@ -118,22 +145,28 @@ from config import (
     NEWS_SCORING_ENABLED,
     NEWS_SCORING_FAIL_OPEN,
     NEWS_SCORING_TOPK,
+    NEWS_INCREMENTAL_OVERLAP_MINUTES,
+    WRITER_PROGRESSIVE_DELIVERY,
 )
-from simple_bot import llm_fast, llm_reasoning # Import capability-based LLMs
+import simple_bot # Capability-based LLMs（simple_bot.llm_fast / llm_reasoning 首次访问时才创建）
 from news_scoring_spec_v2 import score_events
+from router_fast_path import classify_fast, remember_decision
+from tracing import annotate, bind_span, record_token_usage, traced_node
+from metrics import PIPELINE_STAGE_SECONDS, observe_timings
+from async_database import run_in_db_executor
+import asyncio
 import json
+import threading
+import time
 
 from langchain_core.prompts import ChatPromptTemplate
 
-def router_node(state: AgentState):
-    """
-    进阶版意图识别：使用 LLM 结构化输出 + 容错兜底
-    
-    新增：如果 state 中已有 user_preference（定时任务传入），直接返回 read 意图，跳过 LLM 解析
-    """
+def _route_without_llm(state: AgentState) -> Optional[Dict]:
+    """Router 的零 LLM 拦截器；命中返回路由结果，未命中返回 None（继续走 LLM）。"""
     # --- 拦截器 0: 定时任务绕行通道 (scheduler 专用) ---
     if state.get("user_preference"):
         print(f"⚡ [Router] Scheduler mode detected, preference={state['user_preference']}, skipping LLM")
+        annotate(router_source="scheduler")
         return {"intent": "read"}  # 直接返回 read 意图，user_preference 保持不变
     
     last_message = state["messages"][-1].content
@@ -150,52 +183,91 @@ def router_node(state: AgentState):
         if match:
             category = match.group(1).strip()
             print(f"🚀 [Router] Intercepted Detail Request: {category}")
+            annotate(router_source="detail")
             return {
                 "intent": "detail",
                 "selected_cluster": category,
                 "selected_category": state.get("selected_category"),
             }
+
+    # --- 拦截器 2: 零 LLM 快速通道（菜单指令语法 + 历史决策 LRU） ---
+    return classify_fast(last_message)
+
+
+def _router_llm_request(last_message: str):
+    """构造 Router 的 LLM 调用：返回 (structured_llm, prompt_message)。"""
+    # 定义 System Prompt 强化指令 (适配 Reasoning 模型)
+    system_prompt = """你是一个智能意图路由器。请分析用户的输入，提取核心意图和实体。
+    
+    规则：
+    1. 如果用户想看新闻、日报、简报 -> intent: read
+    2. 如果用户想订阅、关注、追踪某话题 -> intent: write, category: <话题>
+    3. 其他情况（闲聊、问好、不想看了） -> intent: chat
+    
+    输出格式：必须是符合 RouterDecision 结构的 JSON。"""
+    
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "{input}"),
+    ])
+    
+    # 绑定工具 (使用 Fast 模型 -> DeepSeek V3)
+    print(f"🤖 User Input: {last_message}")
+    structured_llm = simple_bot.llm_fast.with_structured_output(RouterDecision) 
+    return structured_llm, prompt.invoke({"input": last_message})
+
+
+def _router_llm_result(last_message: str, decision: RouterDecision) -> Dict:
+    print(f"👉 LLM Decision: {decision.intent}, Category: {decision.category}")
+    annotate(router_source="llm")
+    remember_decision(last_message, decision.intent, decision.category)
+    return {
+        "intent": decision.intent, 
+        "user_preference": decision.category
+    }
+
+
+def _router_error_result(e: Exception) -> Dict:
+    print(f"⚠️ Router LLM Error: {e}")
+    # 兜底策略：诚实报错，不进行猜测
+    return {
+        "intent": "error",
+        "messages": [AIMessage(content=f"❌ 意图识别失败啦。\n错误详情: {str(e)}")]
+    }
+
+
+def router_node(state: AgentState):
+    """
+    进阶版意图识别：使用 LLM 结构化输出 + 容错兜底
     
+    新增：如果 state 中已有 user_preference（定时任务传入），直接返回 read 意图，跳过 LLM 解析
+    """
+    routed = _route_without_llm(state)
+    if routed:
+        return routed
+
+    last_message = state["messages"][-1].content
     try:
-        # 定义 System Prompt 强化指令 (适配 Reasoning 模型)
-        system_prompt = """你是一个智能意图路由器。请分析用户的输入，提取核心意图和实体。
-        
-        规则：
-        1. 如果用户想看新闻、日报、简报 -> intent: read
-        2. 如果用户想订阅、关注、追踪某话题 -> intent: write, category: <话题>
-        3. 其他情况（闲聊、问好、不想看了） -> intent: chat
-        
-        输出格式：必须是符合 RouterDecision 结构的 JSON。"""
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "{input}"),
-        ])
-        
-        # 绑定工具 (使用 Fast 模型 -> DeepSeek V3)
-        print(f"🤖 User Input: {last_message}")
-        structured_llm = llm_fast.with_structured_output(RouterDecision) 
-        
-        # 组合 chain
-        # chain = prompt | structured_llm
-        prompt_message = prompt.invoke({"input": last_message})
-        decision = structured_llm.invoke(prompt_message)
-        
-        print(f"👉 LLM Decision: {decision.intent}, Category: {decision.category}")
-        return {
-            "intent": decision.intent, 
-            "user_preference": decision.category
-        }
+        structured_llm, prompt_message = _router_llm_request(last_message)
+        return _router_llm_result(last_message, structured_llm.invoke(prompt_message))
     except Exception as e:
-        print(f"⚠️ Router LLM Error: {e}")
-        # 兜底策略：诚实报错，不进行猜测
-        return {
-            "intent": "error",
-            "messages": [AIMessage(content=f"❌ 意图识别失败啦。\n错误详情: {str(e)}")]
-        }
+        return _router_error_result(e)
+
+
+async def arouter_node(state: AgentState):
+    """router_node 的 async 版本（LLM 调用走 ainvoke）"""
+    routed = _route_without_llm(state)
+    if routed:
+        return routed
 
+    last_message = state["messages"][-1].content
+    try:
+        structured_llm, prompt_message = _router_llm_request(last_message)
+        return _router_llm_result(last_message, await structured_llm.ainvoke(prompt_message))
+    except Exception as e:
+        return _router_error_result(e)
 
-from database import upsert_preference, get_preference
+from database import upsert_preference, get_preference, get_subscriptions
 from langchain_core.messages import AIMessage
 
 def saver_node(state: AgentState):
@@ -218,68 +290,83 @@ def saver_node(state: AgentState):
 
 
 
-def fetcher_node(state: AgentState):
+def _plan_fetch(state: AgentState) -> Dict:
     """
-    负责获取新闻数据：
-    支持两种模式：
-    1. 【定时任务模式】state 中已有 user_preference（直接从 config 传入）→ 使用该值
-    2. 【用户交互模式】state 中无 user_preference → 从数据库查询用户订阅偏好
-    
-    然后检查缓存或抓取新闻：
-    - 先检查数据库缓存 (除非 force_refresh=True)
-    - 如果无缓存，调用 Tool 抓取 RSS
+    fetcher 的前置判断（纯数据库操作，不访问外部 API）。返回三种计划之一：
+    - {"result": {...}}：无需抓取（无订阅 / 多订阅转 fanout / 命中缓存），直接作为节点输出
+    - {"mode": "incremental", "pref", "cached", "refresh_state"}：日内增量刷新
+    - {"mode": "full", "pref"}：全量抓取
     """
-    print("🕵️ [Fetcher] Node started")
-    
     # 策略 1: 优先使用 State 中已存在的 user_preference（定时任务传入）
     pref = state.get("user_preference")
     
     # 策略 2: 如果 State 中没有，则从数据库查询（用户交互场景）
     if not pref:
         print("🔍 [Fetcher] No preference in state, querying database...")
-        pref = get_preference(state["user_id"])
+        subscriptions = get_subscriptions(state["user_id"])
+        # 订阅了多个类别：交给 fanout 节点并发生成并合并为一张卡片
+        if len(subscriptions) > 1:
+            print(f"🔀 [Fetcher] Multiple subscriptions found: {subscriptions}, fan out.")
+            return {"result": {"user_preference": None, "fanout_categories": subscriptions}}
+        pref = get_preference(state["user_id"]) or (subscriptions[0] if subscriptions else None)
     else:
         print(f"✅ [Fetcher] Using preference from state: {pref}")
     
     # 策略 3: 如果两者都没有，返回提示
     if not pref:
         print("⚠️ [Fetcher] No preference found in state or database")
-        return {
+        return {"result": {
             "user_preference": None, 
             "messages": [AIMessage(content="您还没有订阅任何内容，请发送 '订阅 AI'，'订阅 MUSIC'，或者'订阅 GAMES'")]
-        }
+        }}
     
     # 1. 尝试从数据库读取今日已生成的缓存
     today = date.today().isoformat()
-    # 注意：get_cached_news 返回 {"content": str, "briefing_data": str/json, "generated_at": str}
-    
-    # 策略：如果有缓存且非强制刷新，我们直接返回缓存
-    if not state.get("force_refresh"):
+
+    # 策略 0: 日内增量刷新（只处理上次窗口之后的新文章）；无可用快照时退回全量刷新
+    if state.get("refresh_mode") == "incremental":
         cached = get_cached_news(pref, today)
-        if cached and cached.get("briefing_data"):
-            print(f"✅ [Fetcher] Found cached data for {pref}. generated_at={cached.get('generated_at')}")
-            try:
-                briefing_json = json.loads(cached["briefing_data"])
-                return {
-                    "user_preference": pref, 
-                    "news_content": None, 
-                    "dedup_trace": None,
-                    "briefing_data": briefing_json,
-                    "scored_events": None,
-                    "scoring_meta": None,
-                    "generated_at": cached.get("generated_at")
-                }
-            except Exception as e:
-                print(f"⚠️ [Fetcher] Cache parse failed: {e}")
-                pass
+        refresh_state = load_refresh_state(cached)
+        if refresh_state:
+            return {"mode": "incremental", "pref": pref, "cached": cached, "refresh_state": refresh_state}
+        print(f"⚠️ [Fetcher] No refresh_state for {pref}, fallback to full refresh.")
+    # 注意：get_cached_news 返回 {"content": str|None, "briefing": dict|None, "generated_at": str, ...}
+    
+    # 策略：如果有缓存且非强制刷新，我们直接返回缓存（增量模式退回全量时同样跳过缓存）
+    if not state.get("force_refresh") and state.get("refresh_mode") != "incremental":
+        # 经 briefing_cache 读取：版本未变时只查一列 generated_at，不再重复解码简报
+        try:
+            entry = briefing_cache.get(pref, today)
+        except Exception as e:
+            print(f"⚠️ [Fetcher] Parse cache failed for {pref}: {e}, fetching again")
+            entry = None
+        if entry is not None:
+            print(f"✅ [Fetcher] Found cached data for {pref}. generated_at={entry.generated_at}")
+            annotate(cache_hit=True)
+            return {"result": {
+                "user_preference": pref, 
+                "news_content": None, 
+                "dedup_trace": None,
+                "briefing_data": entry.briefing,
+                "scored_events": None,
+                "scoring_meta": None,
+                "generated_at": entry.generated_at,
+                "pipeline_run_id": None,
+            }}
     else:
         print(f"🔄 [Fetcher] Force refresh enabled. Skipping cache check.")
 
-    # 2. 无缓存或强制刷新，执行实时抓取
     # 2. 无缓存或强制刷新，执行实时抓取
     print(f"🌍 [Fetcher] Fetching news for: {pref}")
-    
-    news_data = fetch_news(pref)
+    annotate(cache_hit=False, refresh_mode=state.get("refresh_mode") or "full")
+    return {"mode": "full", "pref": pref}
+
+
+def _complete_full_fetch(pref: str, news_data, fetch_end: datetime) -> Dict:
+    """全量抓取的后半段：原始文章落库 + 去重 + 去重簇落库 + 构造刷新快照。"""
+    run_id = new_run_id(pref, fetch_end)
+    record_run(run_id, pref, "full", fetch_end - timedelta(hours=24), fetch_end)
+    record_articles(pref, news_data)
 
     # 可插拔去重：默认由 config 开关控制，关闭时不影响原有流程
     dedup_trace = None
@@ -299,8 +386,11 @@ def fetcher_node(state: AgentState):
             f"rate={dedup_meta.get('dedup_rate')} "
             f"fail_open={dedup_meta.get('fail_open')}"
         )
+        observe_timings("dedup", dedup_meta.get("timing_ms"))
     
     print(f"✅ [Fetcher] Got data (length: {len(str(news_data))})")
+    refresh_events = build_refresh_events(news_data, dedup_trace)
+    record_clusters(run_id, pref, refresh_events)
     # 关键：当需要重新抓取时，显式清空旧结构化结果，避免 writer 命中 checkpointer 残留 state
     return {
         "user_preference": pref,
@@ -311,11 +401,142 @@ def fetcher_node(state: AgentState):
         "scoring_meta": None,
         "generated_at": None,
         "selected_cluster": None,
+        "refresh_snapshot": build_snapshot(
+            refresh_events, collect_seen_ids(refresh_events, dedup_trace), fetch_end
+        ),
+        "rewrite_event_ids": None,
+        "previous_scored_events": None,
+        "rewrite_cache": None,
+        "pipeline_run_id": run_id,
+    }
+
+
+def fetcher_node(state: AgentState):
+    """
+    负责获取新闻数据：
+    支持两种模式：
+    1. 【定时任务模式】state 中已有 user_preference（直接从 config 传入）→ 使用该值
+    2. 【用户交互模式】state 中无 user_preference → 从数据库查询用户订阅偏好
+    
+    然后检查缓存或抓取新闻：
+    - 先检查数据库缓存 (除非 force_refresh=True)
+    - 如果无缓存，调用 Tool 抓取 RSS
+    """
+    print("🕵️ [Fetcher] Node started")
+    plan = _plan_fetch(state)
+    if "result" in plan:
+        return plan["result"]
+    if plan["mode"] == "incremental":
+        window_start, fetch_end = _incremental_window(plan["pref"], plan["refresh_state"])
+        news_data = fetch_news(plan["pref"], start_dt=window_start, end_dt=fetch_end)
+        return _complete_incremental_fetch(
+            plan["pref"], plan["cached"], plan["refresh_state"], news_data, window_start, fetch_end
+        )
+
+    fetch_end = datetime.now(timezone.utc)
+    news_data = fetch_news(plan["pref"], end_dt=fetch_end)
+    return _complete_full_fetch(plan["pref"], news_data, fetch_end)
+
+
+async def afetcher_node(state: AgentState):
+    """
+    fetcher_node 的 async 版本：新闻接口走 httpx；
+    去重（含 embedding 请求与相似度计算）放到线程中执行，避免阻塞事件循环。
+    """
+    print("🕵️ [Fetcher] Node started (async)")
+    plan = await run_in_db_executor(_plan_fetch, state)
+    if "result" in plan:
+        return plan["result"]
+    if plan["mode"] == "incremental":
+        window_start, fetch_end = _incremental_window(plan["pref"], plan["refresh_state"])
+        news_data = await afetch_news(plan["pref"], start_dt=window_start, end_dt=fetch_end)
+        return await asyncio.to_thread(
+            _complete_incremental_fetch,
+            plan["pref"], plan["cached"], plan["refresh_state"], news_data, window_start, fetch_end,
+        )
+
+    fetch_end = datetime.now(timezone.utc)
+    news_data = await afetch_news(plan["pref"], end_dt=fetch_end)
+    return await asyncio.to_thread(_complete_full_fetch, plan["pref"], news_data, fetch_end)
+
+
+def _incremental_window(pref: str, refresh_state: Dict):
+    """增量抓取窗口：上次窗口结束时间向前重叠若干分钟，到当前时间为止。"""
+    window_end = datetime.fromisoformat(refresh_state["window_end"])
+    window_start = window_end - timedelta(minutes=NEWS_INCREMENTAL_OVERLAP_MINUTES)
+    print(f"🔁 [Fetcher] Incremental refresh for {pref}: since={window_start.isoformat()}")
+    annotate(cache_hit=False, refresh_mode="incremental")
+    return window_start, datetime.now(timezone.utc)
+
+
+def _complete_incremental_fetch(
+    pref: str, cached: Dict, refresh_state: Dict, news_data, window_start: datetime, fetch_end: datetime
+):
+    """增量抓取的后半段：新文章并入已有事件，只把变化的事件交给 scorer。"""
+    record_articles(pref, news_data)
+    events, touched, created, merge_meta = merge_incremental_articles(
+        refresh_state,
+        news_data,
+        mode=NEWS_DEDUP_MODE if NEWS_DEDUP_ENABLED else "off",
+        threshold=NEWS_DEDUP_THRESHOLD,
+        debug=NEWS_DEDUP_DEBUG,
+        embedding_model=NEWS_DEDUP_EMBEDDING_MODEL,
+    )
+    print(
+        "🧹 [Fetcher] Incremental merge done: "
+        f"fetched={merge_meta.get('fetched_count')} "
+        f"duplicate={merge_meta.get('duplicate_count')} "
+        f"merged={merge_meta.get('merged_clusters')} "
+        f"new={merge_meta.get('new_clusters')} "
+        f"warnings={merge_meta.get('warnings')}"
+    )
+
+    changed_ids = touched + created
+    annotate(fetched=merge_meta.get("fetched_count"), changed_events=len(changed_ids))
+    if not changed_ids:
+        # 没有变化：直接复用缓存中的简报，writer 走缓存渲染
+        print(f"⏩ [Fetcher] No new events for {pref}, reuse cached briefing.")
+        return {
+            "user_preference": pref,
+            "news_content": None,
+            "dedup_trace": None,
+            "briefing_data": cached["briefing"],
+            "scored_events": None,
+            "scoring_meta": None,
+            "generated_at": cached.get("generated_at"),
+            "refresh_snapshot": None,
+            "rewrite_event_ids": [],
+            "previous_scored_events": None,
+            "rewrite_cache": None,
+            "pipeline_run_id": None,
+        }
+
+    run_id = new_run_id(pref, fetch_end)
+    record_run(run_id, pref, "incremental", window_start, fetch_end)
+    record_clusters(run_id, pref, events)
+    payload, trace = build_scoring_input(events, changed_ids)
+    return {
+        "user_preference": pref,
+        "news_content": json.dumps(payload, ensure_ascii=False),
+        "dedup_trace": trace,
+        "briefing_data": None,
+        "scored_events": None,
+        "scoring_meta": None,
+        "generated_at": None,
+        "selected_cluster": None,
+        "refresh_snapshot": build_snapshot(
+            events, merge_meta["seen_ids"], fetch_end, merge_meta["run_seq"]
+        ),
+        "rewrite_event_ids": changed_ids,
+        "previous_scored_events": refresh_state["scored_events"],
+        "rewrite_cache": refresh_state.get("rewrite_texts"),
+        "pipeline_run_id": run_id,
     }
 
-from messaging import reply_message
+from messaging import areply_message, reply_message, update_message
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from lark_card_builder import build_cover_card
+from lark_card_builder import build_cover_card, build_multi_cover_card
 
 
 def scorer_node(state: AgentState):
@@ -349,26 +570,60 @@ def scorer_node(state: AgentState):
             }
         return {"messages": [AIMessage(content=f"评分前数据解析失败：{str(e)}")]}
 
+    # 增量模式：只对变化的事件评分，再与上一轮结果按 event_id 合并
+    previous_scored = state.get("previous_scored_events")
+    incremental = state.get("refresh_mode") == "incremental" and previous_scored is not None
+    source_pool_urls = None
+    if incremental:
+        snapshot_events = (state.get("refresh_snapshot") or {}).get("events") or []
+        source_pool_urls = [(ev.get("article") or {}).get("sourceURL") for ev in snapshot_events]
+
     try:
         # 核心评分调用（AI/full 与 GAMES/MUSIC/simple 在模块内自动分流）
+        scoring_t0 = time.perf_counter()
         scored_events, scoring_meta = score_events(
             category=category,
             deduped_payload=payload,
             dedup_trace=state.get("dedup_trace"),
-            llm=llm_reasoning,
+            llm=simple_bot.llm_reasoning,
             topk=NEWS_SCORING_TOPK,
             debug=NEWS_SCORING_DEBUG,
+            source_pool_urls=source_pool_urls,
         )
+        if incremental:
+            scored_by_id = {ev.get("event_id"): ev for ev in previous_scored}
+            scored_by_id.update({ev.get("event_id"): ev for ev in scored_events})
+            scoring_meta = {**(scoring_meta or {}), "incremental_scored": len(scored_events)}
+            scored_events = sorted(
+                scored_by_id.values(),
+                key=lambda x: float(x.get("final_score", 0)),
+                reverse=True,
+            )
+        PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - scoring_t0, stage="scoring", step="total")
         print(
             f"✅ [Scorer] Done. category={category} "
             f"events={len(scored_events)} mode={(scoring_meta or {}).get('mode')}"
         )
+        # 评分引擎在自有线程池内调用 LLM（回调拿不到 span，不计数），token 用量按其分步汇总补记
+        scoring_model = getattr(simple_bot.llm_reasoning, "model_name", None)
+        for scoring_step, usage in (((scoring_meta or {}).get("token_usage") or {}).get("by_step") or {}).items():
+            if usage.get("total_tokens"):
+                record_token_usage(usage, scoring_model, step=f"scorer.{scoring_step}")
+        annotate(scored_events=len(scored_events), scoring_mode=(scoring_meta or {}).get("mode"), incremental=incremental)
+        record_scores(state.get("pipeline_run_id"), category, scored_events)
         return {
             "scored_events": scored_events,
             "scoring_meta": scoring_meta,
         }
     except Exception as e:
         print(f"❌ [Scorer] Failed: {e}")
+        if incremental:
+            # 增量评分失败：保留上一轮结果，本轮不改写任何事件
+            return {
+                "scored_events": previous_scored,
+                "scoring_meta": {"error": str(e), "fail_open": True},
+                "rewrite_event_ids": [],
+            }
         # fail-open：评分失败时不影响 writer 旧流程
         if NEWS_SCORING_FAIL_OPEN:
             return {
@@ -377,90 +632,21 @@ def scorer_node(state: AgentState):
             }
         return {"messages": [AIMessage(content=f"评分模块失败：{str(e)}")]}
 
-def writer_node(state: AgentState):
+async def ascorer_node(state: AgentState):
     """
-    核心写作节点：
-    1. 接收 Fetcher 抓取到的原始新闻数据
-    2. 调用 Reasoning LLM (DeepSeek R1) 进行深度分析
-    3. 生成结构化简报 (Summary + Clusters)
-    4. 将结果存入 State，并渲染飞书卡片
+    scorer_node 的 async 版本：评分引擎自带批次线程池（同步 LLM 调用），
+    整体放到线程中执行，避免阻塞事件循环。
     """
-    print("✍️ [Writer] Node started")
-    
-    if state.get("message_id"):
-        reply_message(state["message_id"], "✍️ AI 正在深度分析新闻数据，生成交互式早报...")
-        
-    news_json = state.get("news_content")
-    category = state.get("user_preference", "未知领域")
-    
-    # 策略 0: 仅在非强制刷新时允许复用 State 中的 briefing_data (来自 Cache)
-    if (not state.get("force_refresh")) and state.get("briefing_data"):
-        try:
-            print(f"⏩ [Writer] Using cached briefing data for {category}")
-            # Pydantic 还原
-            briefing = NewsBriefing(**state["briefing_data"])
-            
-            # 构建卡片 (传入 generated_at 和 category)
-            card_content = build_cover_card(briefing, generated_at=state.get("generated_at"), category=category)
-            
-            return {
-                "briefing_data": state["briefing_data"], 
-                "messages": [AIMessage(content=card_content)]
-            }
-        except Exception as e:
-            print(f"⚠️ [Writer] Failed to reuse cache: {e}, falling back to generation")
-            # 失败了则继续往下执行生成逻辑
+    return await asyncio.to_thread(scorer_node, state)
 
-    # 策略 0.5: 若评分模块产出可用，则 writer 只做“程序选材 + LLM改写”
-    # 关键约束：
-    # 1) 排序和选材由程序完成，LLM 不得改优先级
-    # 2) URL 由程序回填，LLM 不参与
-    # 3) 最终必须通过 NewsBriefing 校验；不通过则直接报错返回
-    scored_events = state.get("scored_events") or []
-    if scored_events:
-        try:
-            print(f"🧾 [Writer] Using scored events path. count={len(scored_events)}")
-
-            # 1) 固定板块配置（保持与现有卡片结构一致）
-            cluster_config = CATEGORY_CLUSTERS.get(category, CATEGORY_CLUSTERS["AI"])
-            cluster_names = [name for name, _ in cluster_config]
-
-            # 2) 输入最小校验：确保评分核心字段存在，避免后续组装不确定行为
-            for ev in scored_events:
-                required_keys = ["event_id", "cluster_label", "source_title", "selected_url", "final_score"]
-                missing_keys = [k for k in required_keys if k not in ev]
-                if missing_keys:
-                    raise ValueError(f"scored event missing keys={missing_keys}, event={ev}")
-
-            # 3) 评分结果按 final_score 排序，优先级完全由 scorer 决定
-            sorted_events = sorted(
-                scored_events,
-                key=lambda x: float(x.get("final_score", 0)),
-                reverse=True,
-            )
-            top_events = sorted_events[:HEADLINE_COUNT]
-
-            # 4) 先按板块筛选候选（程序规则），再交给 LLM 改写文本
-            cluster_items: Dict[str, List[Dict]] = {name: [] for name in cluster_names}
-            for ev in sorted_events:
-                name = ev.get("cluster_label")
-                if name in cluster_items and len(cluster_items[name]) < CLUSTER_ITEM_COUNT:
-                    cluster_items[name].append(
-                        {
-                            "event_id": ev.get("event_id"),
-                            "title": ev.get("source_title") or "",
-                            "summary": ev.get("source_summary") or "",
-                            "url": ev.get("selected_url") or "",
-                            "score": ev.get("final_score", 0),
-                        }
-                    )
-
-            # 5) 第一次 LLM 调用：只改写头条 title（event_id 对齐，不允许改排序）
-            headline_prompt = ChatPromptTemplate.from_messages(
-                [
-                    (
-                        "system",
-                        f"""你是资深行业情报编辑。用户订阅偏好：{category}。
+
+def _build_headline_chain(category: str):
+    """头条改写链：只改写 title，不负责排序、选条、URL。"""
+    headline_prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                f"""你是资深行业情报编辑。用户订阅偏好：{category}。
 你只负责改写标题，不负责排序、不负责选条、不负责URL。
 请基于输入 events，逐条输出 event_id 和改写后的 title。
 title的改写要用 **一句话总结**，按视觉宽度尽量控制长度：**1个中文字 = 2个英文字母/数字**，总视觉宽度必须在 **{HEADLINE_LENGTH_MIN}~{HEADLINE_LENGTH_MAX}个中文字** 之间，且总字符数（中英文加在一起）**不得超过{HEADLINE_LEN_MAX}个
@@ -471,32 +657,20 @@ title的改写要用 **一句话总结**，按视觉宽度尽量控制长度：*
 3. title 句末不要加句号
 4. 不要输出任何解释文本
 """,
-                    ),
-                    ("human", "{payload}"),
-                ]
-            )
-            headline_structured_llm = llm_reasoning.with_structured_output(RewrittenHeadlineBatch)
-            headline_chain = headline_prompt | headline_structured_llm
-            headline_payload = [
-                {
-                    "event_id": ev.get("event_id"),
-                    "title": ev.get("source_title") or "",
-                    "summary": ev.get("source_summary") or "",
-                    "cluster_label": ev.get("cluster_label") or "",
-                    "score": ev.get("final_score", 0),
-                }
-                for ev in top_events
-            ]
-            rewritten_headlines: RewrittenHeadlineBatch = headline_chain.invoke(
-                {"payload": json.dumps({"events": headline_payload}, ensure_ascii=False)}
-            )
+            ),
+            ("human", "{payload}"),
+        ]
+    )
+    return headline_prompt | simple_bot.llm_reasoning.with_structured_output(RewrittenHeadlineBatch)
+
 
-            # 6) 第二次 LLM 调用：只改写专题 summary（event_id 对齐，不允许改归类）
-            summary_prompt = ChatPromptTemplate.from_messages(
-                [
-                    (
-                        "system",
-                        f"""你是资深行业情报编辑。用户订阅偏好：{category}。
+def _build_summary_chain(category: str):
+    """专题摘要改写链：只改写 summary，不负责排序、分组、URL。"""
+    summary_prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                f"""你是资深行业情报编辑。用户订阅偏好：{category}。
 你只负责改写摘要，不负责排序、不负责分组、不负责URL。
 请基于输入 events，逐条输出 event_id 和改写后的 summary。
 每条改写后的 summary要 **有吸引力**，能让人一眼看出新闻的价值
@@ -508,85 +682,338 @@ title的改写要用 **一句话总结**，按视觉宽度尽量控制长度：*
 3. summary 句末不要加句号
 4. 不要输出任何解释文本
 """,
-                    ),
-                    ("human", "{payload}"),
-                ]
-            )
-            summary_structured_llm = llm_reasoning.with_structured_output(RewrittenSummaryBatch)
-            summary_chain = summary_prompt | summary_structured_llm
-            flat_cluster_items = []
-            for cluster_name in cluster_names:
-                for item in cluster_items[cluster_name]:
-                    flat_cluster_items.append(
-                        {
-                            "event_id": item.get("event_id"),
-                            "cluster_label": cluster_name,
-                            "title": item.get("title") or "",
-                            "summary": item.get("summary") or "",
-                            "score": item.get("score", 0),
-                        }
-                    )
-            rewritten_summaries: RewrittenSummaryBatch = summary_chain.invoke(
-                {"payload": json.dumps({"events": flat_cluster_items}, ensure_ascii=False)}
-            )
+            ),
+            ("human", "{payload}"),
+        ]
+    )
+    return summary_prompt | simple_bot.llm_reasoning.with_structured_output(RewrittenSummaryBatch)
+
+
+def _check_rewrite_ids(kind: str, expected_ids: List[str], got_ids: List[str]):
+    if sorted(expected_ids) != sorted(got_ids):
+        raise ValueError(f"{kind} rewrite ids mismatch. expected={expected_ids}, got={got_ids}")
+
+
+def _assemble_scored_briefing(
+    top_events: List[Dict],
+    cluster_names: List[str],
+    cluster_items: Dict[str, List[Dict]],
+    headline_text_by_id: Dict[str, str],
+    summary_text_by_cluster: Dict[str, Dict[str, str]],
+) -> NewsBriefing:
+    """按程序确定的顺序组装 NewsBriefing；尚未完成改写的专题输出空列表。"""
+    briefing_payload = {
+        "headlines": [
+            {
+                "title": headline_text_by_id[str(ev.get("event_id"))],
+                "url": ev.get("selected_url") or "",
+            }
+            for ev in top_events
+        ],
+        "clusters": [
+            {
+                "name": cluster_name,
+                "items": [
+                    {
+                        "summary": summary_text_by_cluster[cluster_name][str(item.get("event_id"))],
+                        "url": item.get("url") or "",
+                    }
+                    for item in cluster_items[cluster_name]
+                ] if cluster_name in summary_text_by_cluster else [],
+            }
+            for cluster_name in cluster_names
+        ],
+    }
+    return NewsBriefing(**briefing_payload)
 
-            # 7) 严格做 event_id 对齐校验；对不齐直接视为失败（不做自动修复）
-            expected_headline_ids = [str(ev.get("event_id")) for ev in top_events]
-            got_headline_ids = [str(it.event_id) for it in rewritten_headlines.items]
-            if sorted(expected_headline_ids) != sorted(got_headline_ids):
-                raise ValueError(
-                    f"headline rewrite ids mismatch. expected={expected_headline_ids}, got={got_headline_ids}"
-                )
-            expected_summary_ids = [str(it.get("event_id")) for it in flat_cluster_items]
-            got_summary_ids = [str(it.event_id) for it in rewritten_summaries.items]
-            if sorted(expected_summary_ids) != sorted(got_summary_ids):
-                raise ValueError(
-                    f"summary rewrite ids mismatch. expected={expected_summary_ids}, got={got_summary_ids}"
-                )
 
-            headline_text_by_id = {str(it.event_id): it.title for it in rewritten_headlines.items}
-            summary_text_by_id = {str(it.event_id): it.summary for it in rewritten_summaries.items}
+class ProgressiveCardDelivery:
+    """
+    渐进式卡片投递：
+    - 第一次 publish 回复封面卡片并记住新消息 ID
+    - 之后的 publish 通过 update_message 原位更新同一张卡片
+    reply_to 为空（定时任务）或首次回复失败时，所有 publish 变为空操作，由调用方整卡回复。
+    """
+
+    def __init__(self, reply_to: Optional[str], category: str):
+        self.reply_to = reply_to
+        self.category = category
+        self.card_message_id: Optional[str] = None
+
+    def publish(self, briefing: NewsBriefing, pending_clusters: List[str]):
+        if not self.reply_to:
+            return
+        card_content = build_cover_card(
+            briefing, category=self.category, pending_clusters=pending_clusters
+        )
+        if self.card_message_id is None:
+            self.card_message_id = reply_message(self.reply_to, card_content, return_message_id=True)
+            if not self.card_message_id:
+                print("⚠️ [Writer] Progressive cover reply failed, fallback to final reply.")
+                self.reply_to = None
+            return
+        update_message(self.card_message_id, card_content)
+
+    def finish_failed(self, briefing: NewsBriefing, failed_clusters: List[str]) -> None:
+        """封面已投递后流程失败：把未完成的专题标记为不可用，卡片不再停留在“生成中”。"""
+        if self.card_message_id is None:
+            return
+        card_content = build_cover_card(
+            briefing, category=self.category, failed_clusters=failed_clusters
+        )
+        update_message(self.card_message_id, card_content)
+
 
-            # 8) 程序组装 NewsBriefing：URL 和板块顺序完全由程序控制
-            briefing_payload = {
-                "headlines": [
+class ScoredRewritePlan:
+    """
+    评分路径的改写计划：程序选材、复用缓存文本、改写结果校验与组装。
+    与并发执行方式解耦：同步 writer 用线程池执行 jobs()，async writer 用 asyncio 执行。
+    """
+
+    def __init__(self, state: AgentState, category: str):
+        scored_events = state.get("scored_events") or []
+        self.state = state
+        self.category = category
+        self.scored_events = scored_events
+
+        # 1) 固定板块配置（保持与现有卡片结构一致）
+        cluster_config = CATEGORY_CLUSTERS.get(category, CATEGORY_CLUSTERS["AI"])
+        self.cluster_names = [name for name, _ in cluster_config]
+
+        # 2) 输入最小校验：确保评分核心字段存在，避免后续组装不确定行为
+        for ev in scored_events:
+            required_keys = ["event_id", "cluster_label", "source_title", "selected_url", "final_score"]
+            missing_keys = [k for k in required_keys if k not in ev]
+            if missing_keys:
+                raise ValueError(f"scored event missing keys={missing_keys}, event={ev}")
+
+        # 3) 评分结果按 final_score 排序，优先级完全由 scorer 决定
+        sorted_events = sorted(
+            scored_events,
+            key=lambda x: float(x.get("final_score", 0)),
+            reverse=True,
+        )
+        self.top_events = sorted_events[:HEADLINE_COUNT]
+
+        # 4) 先按板块筛选候选（程序规则），再交给 LLM 改写文本
+        self.cluster_items: Dict[str, List[Dict]] = {name: [] for name in self.cluster_names}
+        for ev in sorted_events:
+            name = ev.get("cluster_label")
+            if name in self.cluster_items and len(self.cluster_items[name]) < CLUSTER_ITEM_COUNT:
+                self.cluster_items[name].append(
                     {
-                        "title": headline_text_by_id[str(ev.get("event_id"))],
+                        "event_id": ev.get("event_id"),
+                        "title": ev.get("source_title") or "",
+                        "summary": ev.get("source_summary") or "",
                         "url": ev.get("selected_url") or "",
+                        "score": ev.get("final_score", 0),
                     }
-                    for ev in top_events
-                ],
-                "clusters": [
-                    {
-                        "name": cluster_name,
-                        "items": [
-                            {
-                                "summary": summary_text_by_id[str(item.get("event_id"))],
-                                "url": item.get("url") or "",
-                            }
-                            for item in cluster_items[cluster_name]
-                        ],
-                    }
-                    for cluster_name in cluster_names
-                ],
-            }
+                )
 
-            # 9) 最终强校验：若不符合 NewsBriefing，直接抛异常，不做修复兜底
-            briefing = NewsBriefing(**briefing_payload)
+        # 5) 并发改写：头条 1 次调用 + 每个非空专题 1 次调用（event_id 对齐，不允许改排序/归类）
+        #    头条一完成就先投递封面卡片，之后每完成一个专题就原位补齐按钮
+        #    增量刷新时，未变化事件直接复用上一轮改写文本，只改写变化的事件
+        stale_ids = {str(x) for x in (state.get("rewrite_event_ids") or [])}
+        self.rewrite_cache = state.get("rewrite_cache") or {}
+        cached_headlines = {
+            k: v for k, v in (self.rewrite_cache.get("headlines") or {}).items() if k not in stale_ids
+        }
+        cached_summaries = {
+            k: v for k, v in (self.rewrite_cache.get("summaries") or {}).items() if k not in stale_ids
+        }
 
-            card_content = build_cover_card(briefing, category=category)
-            return {
-                "briefing_data": briefing.model_dump(),
-                "messages": [AIMessage(content=card_content)],
+        self.headline_todo = [ev for ev in self.top_events if str(ev.get("event_id")) not in cached_headlines]
+        self.headline_text_by_id: Dict[str, str] = {
+            str(ev.get("event_id")): cached_headlines[str(ev.get("event_id"))]
+            for ev in self.top_events
+            if str(ev.get("event_id")) in cached_headlines
+        }
+        self.headlines_ready = not self.headline_todo
+        self.summary_text_by_cluster: Dict[str, Dict[str, str]] = {}
+        self.summary_todo: Dict[str, List[Dict]] = {}
+        # 需要调用 LLM 的专题中，可复用的那部分条目文本
+        self.reused_partial: Dict[str, str] = {}
+        for cluster_name in self.cluster_names:
+            items = self.cluster_items[cluster_name]
+            todo = [it for it in items if str(it.get("event_id")) not in cached_summaries]
+            reused = {
+                str(it.get("event_id")): cached_summaries[str(it.get("event_id"))]
+                for it in items
+                if str(it.get("event_id")) in cached_summaries
             }
-        except Exception as e:
-            print(f"❌ [Writer] Scored-events generation failed: {e}")
-            return {"messages": [AIMessage(content=f"生成早报失败，请稍后重试。\nError: {str(e)}")]}
+            # 空专题 / 全部可复用的专题无需调用 LLM，直接视为已完成
+            if todo:
+                self.summary_todo[cluster_name] = todo
+                self.reused_partial.update(reused)
+            else:
+                self.summary_text_by_cluster[cluster_name] = reused
+
+        self.delivery = ProgressiveCardDelivery(
+            state.get("message_id") if WRITER_PROGRESSIVE_DELIVERY else None,
+            category,
+        )
+        annotate(
+            cache_hit=False,
+            rewrite_headlines=len(self.headline_todo),
+            rewrite_summaries=sum(len(todo) for todo in self.summary_todo.values()),
+        )
 
-    # 策略 1: 如果没有 News Content (这不应该发生，Fetcher 应该处理了)，报错
-    if not news_json:
-        return {"messages": [AIMessage(content="未能获取新闻数据")]}
+    def jobs(self) -> List[tuple]:
+        """需要调用 LLM 的改写任务：[(key, chain, inputs)]，key=None 表示头条，否则为专题名。"""
+        jobs = []
+        if self.headline_todo:
+            headline_payload = [
+                {
+                    "event_id": ev.get("event_id"),
+                    "title": ev.get("source_title") or "",
+                    "summary": ev.get("source_summary") or "",
+                    "cluster_label": ev.get("cluster_label") or "",
+                    "score": ev.get("final_score", 0),
+                }
+                for ev in self.headline_todo
+            ]
+            jobs.append((
+                None,
+                _build_headline_chain(self.category),
+                {"payload": json.dumps({"events": headline_payload}, ensure_ascii=False)},
+            ))
+        if self.summary_todo:
+            summary_chain = _build_summary_chain(self.category)
+        for cluster_name, todo in self.summary_todo.items():
+            cluster_payload = [
+                {
+                    "event_id": item.get("event_id"),
+                    "cluster_label": cluster_name,
+                    "title": item.get("title") or "",
+                    "summary": item.get("summary") or "",
+                    "score": item.get("score", 0),
+                }
+                for item in todo
+            ]
+            jobs.append((
+                cluster_name,
+                summary_chain,
+                {"payload": json.dumps({"events": cluster_payload}, ensure_ascii=False)},
+            ))
+        return jobs
+
+    def apply(self, key: Optional[str], result) -> None:
+        """写入一个改写结果。6) 严格做 event_id 对齐校验；对不齐直接视为失败（不做自动修复）"""
+        if key is None:
+            rewritten_headlines: RewrittenHeadlineBatch = result
+            _check_rewrite_ids(
+                "headline",
+                [str(ev.get("event_id")) for ev in self.headline_todo],
+                [str(it.event_id) for it in rewritten_headlines.items],
+            )
+            self.headline_text_by_id.update(
+                {str(it.event_id): it.title for it in rewritten_headlines.items}
+            )
+            self.headlines_ready = True
+            return
+        rewritten_summaries: RewrittenSummaryBatch = result
+        _check_rewrite_ids(
+            "summary",
+            [str(it.get("event_id")) for it in self.summary_todo[key]],
+            [str(it.event_id) for it in rewritten_summaries.items],
+        )
+        self.summary_text_by_cluster[key] = {
+            **{
+                str(it.get("event_id")): self.reused_partial[str(it.get("event_id"))]
+                for it in self.cluster_items[key]
+                if str(it.get("event_id")) in self.reused_partial
+            },
+            **{str(it.event_id): it.summary for it in rewritten_summaries.items},
+        }
 
+    def assemble(self) -> NewsBriefing:
+        return _assemble_scored_briefing(
+            self.top_events, self.cluster_names, self.cluster_items,
+            self.headline_text_by_id, self.summary_text_by_cluster,
+        )
+
+    def publish_progress(self) -> None:
+        if self.headlines_ready:
+            self.delivery.publish(
+                self.assemble(),
+                pending_clusters=[n for n in self.cluster_names if n not in self.summary_text_by_cluster],
+            )
+
+    def failed_result(self, e: Exception) -> Optional[Dict]:
+        """
+        改写中途失败：封面卡片已投递时原位更新为终态（失败专题标记为不可用），
+        并返回 delivered_message_id，避免再回复一条“生成早报失败”；封面尚未投递时返回 None。
+        """
+        if self.delivery.card_message_id is None:
+            return None
+        failed = [n for n in self.cluster_names if n not in self.summary_text_by_cluster]
+        print(f"❌ [Writer] Scored-events generation failed after cover delivery: {e}, failed clusters={failed}")
+        try:
+            self.delivery.finish_failed(self.assemble(), failed)
+        except Exception as update_error:
+            print(f"⚠️ [Writer] Failed to finalize progressive card: {update_error}")
+        return {
+            "messages": [AIMessage(content=f"生成早报失败，请稍后重试。\nError: {str(e)}")],
+            "delivered_message_id": self.delivery.card_message_id,
+        }
+
+    def result(self) -> Dict:
+        # 7) 程序组装 NewsBriefing：URL 和板块顺序完全由程序控制
+        #    最终强校验：若不符合 NewsBriefing，直接抛异常，不做修复兜底
+        briefing = self.assemble()
+        card_content = build_cover_card(briefing, category=self.category)
+        return {
+            "briefing_data": briefing.model_dump(),
+            "messages": [AIMessage(content=card_content)],
+            "delivered_message_id": self.delivery.card_message_id,
+            "rewrite_texts": merge_rewrite_texts(
+                self.rewrite_cache,
+                {
+                    "headlines": self.headline_text_by_id,
+                    "summaries": {
+                        event_id: text
+                        for texts in self.summary_text_by_cluster.values()
+                        for event_id, text in texts.items()
+                    },
+                },
+                self.state.get("rewrite_event_ids"),
+                {str(ev.get("event_id")) for ev in self.scored_events},
+            ),
+        }
+
+
+def _writer_cached_result(state: AgentState, category: str) -> Optional[Dict]:
+    """策略 0: 仅在非强制刷新时允许复用 State 中的 briefing_data (来自 Cache)；不可复用时返回 None"""
+    if state.get("force_refresh") or not state.get("briefing_data"):
+        return None
+    try:
+        print(f"⏩ [Writer] Using cached briefing data for {category}")
+        annotate(cache_hit=True)
+        if state.get("generated_at"):
+            # 封面卡片按 (category, date, generated_at, 模板版本) 记忆化：同一版本只做一次 Pydantic 还原与渲染
+            entry = briefing_cache.load(
+                category,
+                date.today().isoformat(),
+                {"briefing": state["briefing_data"], "generated_at": state["generated_at"]},
+            )
+            card_content = entry.card
+        else:
+            # 无版本信息（非缓存来源），直接渲染
+            briefing = NewsBriefing(**state["briefing_data"])
+            card_content = build_cover_card(briefing, generated_at=state.get("generated_at"), category=category)
+        
+        return {
+            "briefing_data": state["briefing_data"], 
+            "messages": [AIMessage(content=card_content)]
+        }
+    except Exception as e:
+        print(f"⚠️ [Writer] Failed to reuse cache: {e}, falling back to generation")
+        # 失败了则继续往下执行生成逻辑
+        return None
+
+
+def _build_legacy_writer_chain(category: str):
+    """旧路径（无评分结果）：让 LLM 直接从原始新闻生成完整 NewsBriefing。"""
     # 动态生成板块配置
     cluster_config = CATEGORY_CLUSTERS.get(category, CATEGORY_CLUSTERS["AI"])
     cluster_count = len(cluster_config)
@@ -627,36 +1054,137 @@ title的改写要用 **一句话总结**，按视觉宽度尽量控制长度：*
         ("human", "{news_data}"),
     ])
     
-    print("🧠 [Writer] Invoking LLM for Structured Output...")
     # 切换到 llm_reasoning (Claude 3.5 Sonnet / DeepSeek R1) 以获得最佳写作质量
-    structured_llm = llm_reasoning.with_structured_output(NewsBriefing) 
-    chain = prompt | structured_llm
+    structured_llm = simple_bot.llm_reasoning.with_structured_output(NewsBriefing) 
+    return prompt | structured_llm
+
+
+def _legacy_writer_result(briefing: NewsBriefing, category: str) -> Dict:
+    print(f"✅ [Writer] Briefing Generated. Clusters: {[c.name for c in briefing.clusters]}")
+    # 构建飞书交互卡片（content 为 card json，由 messaging 识别为 interactive 消息）
+    card_content = build_cover_card(briefing, category=category)
+    return {
+        "briefing_data": briefing.model_dump(),
+        "messages": [AIMessage(content=card_content)] 
+    }
+
+
+def _writer_error_result(stage: str, e: Exception) -> Dict:
+    print(f"❌ [Writer] {stage} failed: {e}")
+    return {"messages": [AIMessage(content=f"生成早报失败，请稍后重试。\nError: {str(e)}")]}
+
+
+def writer_node(state: AgentState):
+    """
+    核心写作节点：
+    1. 接收 Fetcher 抓取到的原始新闻数据
+    2. 调用 Reasoning LLM (DeepSeek R1) 进行深度分析
+    3. 生成结构化简报 (Summary + Clusters)
+    4. 将结果存入 State，并渲染飞书卡片
+    """
+    print("✍️ [Writer] Node started")
     
-    try:
-        briefing: NewsBriefing = chain.invoke({"news_data": news_json})
-        print(f"✅ [Writer] Briefing Generated. Clusters: {[c.name for c in briefing.clusters]}")
-        
-        # 1. 构建飞书交互卡片
-        card_content = build_cover_card(briefing, category=category)
-        
-        # 2. 返回结果
-        # 注意：我们需要标记这是一张卡片，而不是普通文本
-        # 下游发送端 (lark_service 或 messaging) 需要识别这个标记
-        # 这里我们将 content 设为 card json，开头加一个特殊标记？
-        # 或者使用 additional_kwargs
+    if state.get("message_id"):
+        reply_message(state["message_id"], "✍️ AI 正在深度分析新闻数据，生成交互式早报...")
         
-        return {
-            "briefing_data": briefing.model_dump(),
-            "messages": [AIMessage(content=card_content)] 
-        }
+    category = state.get("user_preference", "未知领域")
+    cached_result = _writer_cached_result(state, category)
+    if cached_result:
+        return cached_result
+
+    # 策略 0.5: 若评分模块产出可用，则 writer 只做“程序选材 + LLM改写”
+    # 关键约束：
+    # 1) 排序和选材由程序完成，LLM 不得改优先级
+    # 2) URL 由程序回填，LLM 不参与
+    # 3) 最终必须通过 NewsBriefing 校验；不通过则直接报错返回
+    if state.get("scored_events"):
+        plan = None
+        try:
+            print(f"🧾 [Writer] Using scored events path. count={len(state['scored_events'])}")
+            plan = ScoredRewritePlan(state, category)
+            jobs = plan.jobs()
+            with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+                futures = {
+                    executor.submit(bind_span(chain.invoke), inputs): key
+                    for key, chain, inputs in jobs
+                }
+                # 头条可全部复用时，无需等待专题即可先投递封面
+                if futures and plan.headlines_ready:
+                    plan.publish_progress()
+                for future in as_completed(futures):
+                    plan.apply(futures[future], future.result())
+                    plan.publish_progress()
+            return plan.result()
+        except Exception as e:
+            failed_result = plan.failed_result(e) if plan else None
+            return failed_result or _writer_error_result("Scored-events generation", e)
+
+    # 策略 1: 如果没有 News Content (这不应该发生，Fetcher 应该处理了)，报错
+    news_json = state.get("news_content")
+    if not news_json:
+        return {"messages": [AIMessage(content="未能获取新闻数据")]}
+
+    print("🧠 [Writer] Invoking LLM for Structured Output...")
+    try:
+        briefing: NewsBriefing = _build_legacy_writer_chain(category).invoke({"news_data": news_json})
+        return _legacy_writer_result(briefing, category)
     except Exception as e:
-        print(f"❌ [Writer] Analysis Failed: {e}")
-        return {"messages": [AIMessage(content=f"生成早报失败，请稍后重试。\nError: {str(e)}")]}
+        return _writer_error_result("Analysis", e)
+
+
+async def awriter_node(state: AgentState):
+    """writer_node 的 async 版本：改写任务用 chain.ainvoke 并发，飞书消息调用放到线程中执行。"""
+    print("✍️ [Writer] Node started (async)")
+
+    if state.get("message_id"):
+        await areply_message(state["message_id"], "✍️ AI 正在深度分析新闻数据，生成交互式早报...")
+
+    category = state.get("user_preference", "未知领域")
+    cached_result = _writer_cached_result(state, category)
+    if cached_result:
+        return cached_result
+
+    if state.get("scored_events"):
+        plan = None
+        try:
+            print(f"🧾 [Writer] Using scored events path. count={len(state['scored_events'])}")
+            plan = ScoredRewritePlan(state, category)
+
+            async def run_job(key, chain, inputs):
+                return key, await chain.ainvoke(inputs)
+
+            tasks = [asyncio.create_task(run_job(*job)) for job in plan.jobs()]
+            try:
+                if tasks and plan.headlines_ready:
+                    await asyncio.to_thread(plan.publish_progress)
+                for next_done in asyncio.as_completed(tasks):
+                    key, result = await next_done
+                    plan.apply(key, result)
+                    await asyncio.to_thread(plan.publish_progress)
+            finally:
+                for task in tasks:
+                    task.cancel()
+            return plan.result()
+        except Exception as e:
+            failed_result = await asyncio.to_thread(plan.failed_result, e) if plan else None
+            return failed_result or _writer_error_result("Scored-events generation", e)
+
+    news_json = state.get("news_content")
+    if not news_json:
+        return {"messages": [AIMessage(content="未能获取新闻数据")]}
+
+    print("🧠 [Writer] Invoking LLM for Structured Output (async)...")
+    try:
+        briefing: NewsBriefing = await _build_legacy_writer_chain(category).ainvoke({"news_data": news_json})
+        return _legacy_writer_result(briefing, category)
+    except Exception as e:
+        return _writer_error_result("Analysis", e)
 
 
 # --- 详情展示节点 ---
 
-from database import get_cached_news # Import at top or inside if circular
+from database import get_cached_news, get_cached_news_generated_at # Import at top or inside if circular
+from briefing_cache import briefing_cache
 from datetime import date
 
 # --- 详情展示节点 ---
@@ -685,8 +1213,13 @@ def detail_node(state: AgentState):
         }
 
     today = date.today().isoformat()
-    cached = get_cached_news(selected_category, today)
-    if not cached or not cached.get("briefing_data"):
+    try:
+        entry = briefing_cache.get(selected_category, today)
+    except Exception as e:
+        print(f"⚠️ [Detail] Parse cache failed for category={selected_category}: {e}")
+        return {"messages": [AIMessage(content="⚠️ 数据解析错误")]}
+
+    if entry is None:
         return {
             "messages": [
                 AIMessage(
@@ -695,21 +1228,9 @@ def detail_node(state: AgentState):
             ]
         }
 
-    try:
-        briefing_dump = json.loads(cached["briefing_data"])
-        briefing = NewsBriefing(**briefing_dump)
-    except Exception as e:
-        print(f"⚠️ [Detail] Parse cache failed for category={selected_category}: {e}")
-        return {"messages": [AIMessage(content="⚠️ 数据解析错误")]}
-
-    # 仅做精确匹配，避免同名专题串到其他类别
-    found_cluster = None
-    for cluster in briefing.clusters:
-        if cluster.name == target_cluster:
-            found_cluster = cluster
-            break
-
-    if not found_cluster:
+    # 仅做精确匹配，避免同名专题串到其他类别；详情文本已在缓存中预渲染
+    msg = entry.details.get(target_cluster)
+    if msg is None:
         return {
             "messages": [
                 AIMessage(content=f"⚠️ 在 {selected_category} 类别下未找到专题：{target_cluster}")
@@ -720,67 +1241,221 @@ def detail_node(state: AgentState):
         f"✅ [Detail] target_cluster={target_cluster}, "
         f"selected_category={selected_category}, resolved_category={selected_category}"
     )
-        
-    # 渲染详情：每条新闻的摘要本身就是超链接
-    msg = f"## 📂 专题详情：{found_cluster.name}\n\n"
-    for i, item in enumerate(found_cluster.items, 1):
-        msg += f"{i}. [{item.summary}]({item.url})\n"
-    
     return {"messages": [AIMessage(content=msg)]}
 
 
 
-# --- 组装图谱 (The Map) ---
-from langgraph.graph import StateGraph, END
+async def adetail_node(state: AgentState):
+    """detail_node 的 async 版本：进程内缓存仍需一次 SQLite 查询，放到数据库线程池执行。"""
+    return await run_in_db_executor(detail_node, state)
+
 
-# 1. 拿出一张空白地图
-workflow = StateGraph(AgentState)
+# --- 多订阅汇总节点 ---
+def _fanout_prepare(state: AgentState) -> List[str]:
+    categories = state.get("fanout_categories") or []
+    print(f"🔀 [Fanout] Node started, categories={categories}")
+    annotate(fanout_categories=categories)
+    return categories
+
+
+def _fanout_needs_notice(state: AgentState, categories: List[str]) -> bool:
+    """有类别需要现场生成时，先回复一条进度提示。"""
+    if not state.get("message_id"):
+        return False
+    today = date.today().isoformat()
+    return bool(state.get("force_refresh")) or any(
+        get_cached_news_generated_at(c, today) is None for c in categories
+    )
+
+
+def _fanout_inputs(state: AgentState, category: str) -> Dict:
+    return {
+        "messages": [],
+        "user_id": state["user_id"],
+        # 子流程不单独回复，由 fanout 节点统一回复合并卡片
+        "message_id": None,
+        "user_preference": category,
+        "force_refresh": bool(state.get("force_refresh")),
+        "selected_cluster": None,
+        "selected_category": None,
+        "delivered_message_id": None,
+        "refresh_mode": None,
+        "fanout_categories": None,
+    }
+
+
+def _fanout_section(category: str, result: Optional[Dict]) -> Dict:
+    briefing = None
+    generated_at = None
+    if result and result.get("briefing_data"):
+        briefing = NewsBriefing(**result["briefing_data"])
+        generated_at = result.get("generated_at")
+    print(f"✅ [Fanout] {category} done, ok={briefing is not None}")
+    return {"category": category, "briefing": briefing, "generated_at": generated_at}
+
+
+def _fanout_result(categories: List[str], sections: Dict[str, Dict]) -> Dict:
+    card_content = build_multi_cover_card([sections[c] for c in categories])
+    return {"messages": [AIMessage(content=card_content)], "briefing_data": None}
+
+
+def fanout_node(state: AgentState):
+    """
+    用户订阅了多个类别时：每个类别独立跑一遍 fetcher -> scorer -> writer 子流程
+    （有缓存则直接读缓存），并发执行后合并为一张卡片；总耗时取决于最慢的类别。
+    """
+    categories = _fanout_prepare(state)
+    if _fanout_needs_notice(state, categories):
+        reply_message(state["message_id"], f"✍️ AI 正在汇总您订阅的 {len(categories)} 个类别日报...")
+
+    sections: Dict[str, Dict] = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(categories))) as executor:
+        futures = {
+            executor.submit(bind_span(_get_compiled("category_pipeline").invoke), _fanout_inputs(state, c)): c
+            for c in categories
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            try:
+                sections[category] = _fanout_section(category, future.result())
+            except Exception as e:
+                print(f"❌ [Fanout] Pipeline failed for {category}: {e}")
+                sections[category] = _fanout_section(category, None)
+    return _fanout_result(categories, sections)
+
+
+async def afanout_node(state: AgentState):
+    """fanout_node 的 async 版本：各类别子流程用 ainvoke 在同一事件循环内并发。"""
+    categories = _fanout_prepare(state)
+    if await run_in_db_executor(_fanout_needs_notice, state, categories):
+        await areply_message(state["message_id"], f"✍️ AI 正在汇总您订阅的 {len(categories)} 个类别日报...")
+
+    results = await asyncio.gather(
+        *(_get_compiled("category_pipeline").ainvoke(_fanout_inputs(state, c)) for c in categories),
+        return_exceptions=True,
+    )
+    sections: Dict[str, Dict] = {}
+    for category, result in zip(categories, results):
+        if isinstance(result, Exception):
+            print(f"❌ [Fanout] Pipeline failed for {category}: {result}")
+            result = None
+        sections[category] = _fanout_section(category, result)
+    return _fanout_result(categories, sections)
+
+
+# --- 组装图谱 (The Map) ---
+from langchain_core.runnables import RunnableLambda
 
 # Chat Node: 使用 LLM 进行自然对话
 def chat_node(state):
     """聊天模式节点 - 调用 LLM 进行多轮对话"""
     # state["messages"] 已包含历史上下文（由 run_agent 的滑动窗口提供）
-    response = llm_fast.invoke(state["messages"])
+    response = simple_bot.llm_fast.invoke(state["messages"])
     return {"messages": [response]}
 
-# 2. 在地图上画站点 (Nodes)
-workflow.add_node("router", router_node)
-workflow.add_node("saver", saver_node)
-workflow.add_node("fetcher", fetcher_node)
-workflow.add_node("scorer", scorer_node)
-workflow.add_node("writer", writer_node)
-workflow.add_node("detail", detail_node) # 新增 Detail 节点
-workflow.add_node("chat", chat_node)
-
-# 3. 设置起点
-workflow.set_entry_point("router")
-
-# 4. 设置分岔路口
-workflow.add_conditional_edges(
-    "router",
-    lambda x: x["intent"],
-    {
-        "write": "saver",
-        "read": "fetcher",
-        "detail": "detail", 
-        "chat": "chat",
-        "error": END
-    }
-)
+async def achat_node(state):
+    """chat_node 的 async 版本"""
+    response = await simple_bot.llm_fast.ainvoke(state["messages"])
+    return {"messages": [response]}
+
+def _node(name, func, afunc=None):
+    """
+    注册节点：graph.invoke 走同步实现，graph.ainvoke 走 async 实现；
+    未提供 async 实现的节点（纯数据库操作）在 ainvoke 时由 LangChain 放到线程中执行。
+    """
+    return RunnableLambda(
+        traced_node(name)(func),
+        afunc=traced_node(name)(afunc) if afunc else None,
+        name=name,
+    )
+
+
+# 图在首次访问 agent_graph.graph / category_pipeline 时才组装编译（连同 langgraph 的导入），
+# Web 进程启动不再被编译阻塞；lifespan 中由后台预热线程提前触发
+_graph_lock = threading.Lock()
+
+
+def _build_graphs():
+    """组装并编译主图与单类别子流程，返回 (graph, category_pipeline)。"""
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.graph import StateGraph, END
+
+    # 1. 拿出一张空白地图
+    workflow = StateGraph(AgentState)
+
+    # 2. 在地图上画站点 (Nodes)
+    workflow.add_node("router", _node("router", router_node, arouter_node))
+    workflow.add_node("saver", _node("saver", saver_node))
+    workflow.add_node("fetcher", _node("fetcher", fetcher_node, afetcher_node))
+    workflow.add_node("scorer", _node("scorer", scorer_node, ascorer_node))
+    workflow.add_node("writer", _node("writer", writer_node, awriter_node))
+    workflow.add_node("detail", _node("detail", detail_node, adetail_node)) # 新增 Detail 节点
+    workflow.add_node("chat", _node("chat", chat_node, achat_node))
+    workflow.add_node("fanout", _node("fanout", fanout_node, afanout_node))
+
+    # 3. 设置起点
+    workflow.set_entry_point("router")
+
+    # 4. 设置分岔路口
+    workflow.add_conditional_edges(
+        "router",
+        lambda x: x["intent"],
+        {
+            "write": "saver",
+            "read": "fetcher",
+            "detail": "detail", 
+            "chat": "chat",
+            "error": END
+        }
+    )
+
+    # 5. 设置终点
+    workflow.add_edge("saver", END)
+    workflow.add_edge("chat", END)
+    # 评分模块可插拔：默认关闭时保持旧链路不变，开启后插入 scorer
+    # 多订阅时 fetcher 转入 fanout，由其并发调用下方的单类别子流程
+    workflow.add_conditional_edges(
+        "fetcher",
+        lambda x: "fanout" if x.get("fanout_categories") else "next",
+        {"fanout": "fanout", "next": "scorer" if NEWS_SCORING_ENABLED else "writer"},
+    )
+    if NEWS_SCORING_ENABLED:
+        workflow.add_edge("scorer", "writer")
+    workflow.add_edge("writer", END)
+    workflow.add_edge("detail", END) # Detail -> END
+    workflow.add_edge("fanout", END)
+
+    # 单类别子流程（fetcher -> [scorer] -> writer），供 fanout 并发调用
+    # 不挂 checkpointer：子流程只产出结果，不写入用户主线程的 state
+    category_workflow = StateGraph(AgentState)
+    category_workflow.add_node("fetcher", _node("fetcher", fetcher_node, afetcher_node))
+    category_workflow.add_node("writer", _node("writer", writer_node, awriter_node))
+    category_workflow.set_entry_point("fetcher")
+    if NEWS_SCORING_ENABLED:
+        category_workflow.add_node("scorer", _node("scorer", scorer_node, ascorer_node))
+        category_workflow.add_edge("fetcher", "scorer")
+        category_workflow.add_edge("scorer", "writer")
+    else:
+        category_workflow.add_edge("fetcher", "writer")
+    category_workflow.add_edge("writer", END)
+    category_pipeline = category_workflow.compile()
+
+    # 6. 编译（启用 Checkpointer 以持久化 State）
+    memory = MemorySaver()
+    return workflow.compile(checkpointer=memory), category_pipeline
+
+
+def _get_compiled(name):
+    with _graph_lock:
+        if "graph" not in globals():
+            t0 = time.perf_counter()
+            globals()["graph"], globals()["category_pipeline"] = _build_graphs()
+            print(f"🧩 [Graph] Compiled in {int((time.perf_counter() - t0) * 1000)}ms")
+    return globals()[name]
+
 
-# 5. 设置终点
-workflow.add_edge("saver", END)
-workflow.add_edge("chat", END)
-# 评分模块可插拔：默认关闭时保持旧链路不变，开启后插入 scorer
-if NEWS_SCORING_ENABLED:
-    workflow.add_edge("fetcher", "scorer")
-    workflow.add_edge("scorer", "writer")
-else:
-    workflow.add_edge("fetcher", "writer")
-workflow.add_edge("writer", END)
-workflow.add_edge("detail", END) # Detail -> END
-
-# 6. 编译（启用 Checkpointer 以持久化 State）
-from langgraph.checkpoint.memory import MemorySaver
-memory = MemorySaver()
-graph = workflow.compile(checkpointer=memory)
+def __getattr__(name):
+    """模块级懒加载：from agent_graph import graph 时才编译。"""
+    if name in ("graph", "category_pipeline"):
+        return _get_compiled(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
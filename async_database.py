@@ -0,0 +1,58 @@
+"""
+数据库的 async 门面
+===================
+FastAPI 的 async 处理器（handle_event 等）不能在事件循环上直接调用 sqlite3：
+一次磁盘抖动或写锁等待就会卡住所有 webhook，飞书 3 秒内收不到 ack 就会重试。
+
+这里把 database.py 的同名函数包装成协程，统一提交到一个有界的专用线程池执行
+（每个线程复用 database.get_connection 的线程级长连接）。用法：
+
+    import async_database as adb
+    subscriptions = await adb.get_subscriptions(user_id)
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import database
+from config import DB_ASYNC_WORKERS
+
+_executor = ThreadPoolExecutor(max_workers=max(1, DB_ASYNC_WORKERS), thread_name_prefix="db")
+
+
+async def run_in_db_executor(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    在数据库线程池中执行任意同步函数（如内部会查库的缓存查询）。
+    与 asyncio.to_thread 一样复制当前上下文，tracing.annotate 仍记到调用方的 span 上。
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+def _to_async(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await run_in_db_executor(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def shutdown_db_executor() -> None:
+    """服务关闭时调用：等待已提交的查询完成。"""
+    _executor.shutdown(wait=True)
+
+
+upsert_preference = _to_async(database.upsert_preference)
+get_preference = _to_async(database.get_preference)
+add_subscription = _to_async(database.add_subscription)
+remove_subscription = _to_async(database.remove_subscription)
+get_subscriptions = _to_async(database.get_subscriptions)
+list_all_subscriptions = _to_async(database.list_all_subscriptions)
+replace_subscriptions = _to_async(database.replace_subscriptions)
+save_cached_news = _to_async(database.save_cached_news)
+get_cached_news = _to_async(database.get_cached_news)
+get_cached_news_generated_at = _to_async(database.get_cached_news_generated_at)
@@ -0,0 +1,185 @@
+"""
+日报详情快速通道
+================
+职责：
+1) 进程内 LRU 缓存已解码的日报简报与预渲染好的专题详情 markdown；
+2) 以 (category, date, generated_at) 作为版本键：每次查询只读一列 generated_at，
+   与缓存版本不一致时才重新解码；
+3) 封面卡片不再落库，首次读取时由简报渲染并记忆化在条目上（推送、菜单取日报、writer 缓存命中共用），
+   记忆化版本为 (category, date, generated_at, CARD_TEMPLATE_VERSION)；
+4) save_cached_news 写库时主动失效对应条目（同进程内立即生效）。
+
+卡片“展开专题”点击直接走这里，不经过 LangGraph（router -> detail）。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import BRIEFING_CACHE_SIZE, CARD_TEMPLATE_VERSION
+from database import get_cached_news, get_cached_news_generated_at
+from tracing import annotate
+
+
+def render_cluster_detail(cluster: Dict[str, Any]) -> str:
+    """渲染专题详情：每条新闻的摘要本身就是超链接。"""
+    msg = f"## 📂 专题详情：{cluster.get('name', '')}\n\n"
+    for i, item in enumerate(cluster.get("items") or [], 1):
+        msg += f"{i}. [{item.get('summary', '')}]({item.get('url', '')})\n"
+    return msg
+
+
+class BriefingEntry:
+    """一份已解码的日报：原始 dict + 每个专题预渲染好的详情文本 + 按需渲染的封面卡片。"""
+
+    __slots__ = ("category", "generated_at", "briefing", "details", "_card", "_card_version", "_card_lock")
+
+    def __init__(self, category: str, generated_at: Optional[str], briefing: Dict[str, Any]):
+        self.category = category
+        self.generated_at = generated_at
+        self.briefing = briefing
+        self.details: Dict[str, str] = {}
+        for cluster in briefing.get("clusters") or []:
+            name = cluster.get("name")
+            if name and name not in self.details:
+                self.details[name] = render_cluster_detail(cluster)
+        # 旧数据落库的卡片文本不带模板版本，不再沿用，首次访问时按当前模板渲染
+        self._card: Optional[str] = None
+        self._card_version: Optional[int] = None
+        self._card_lock = threading.Lock()
+
+    @property
+    def card(self) -> str:
+        """封面卡片 JSON：首次访问（或模板版本变化）时渲染，之后直接复用，不再做 Pydantic 校验。"""
+        if self._card_version != CARD_TEMPLATE_VERSION:
+            with self._card_lock:
+                if self._card_version != CARD_TEMPLATE_VERSION:
+                    # 延迟导入：lark_card_builder 依赖 agent_graph 中的数据模型
+                    from agent_graph import NewsBriefing
+                    from lark_card_builder import build_cover_card
+
+                    self._card = build_cover_card(
+                        NewsBriefing(**self.briefing), generated_at=self.generated_at, category=self.category
+                    )
+                    self._card_version = CARD_TEMPLATE_VERSION
+        return self._card
+
+
+def _validate_briefing(briefing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """校验简报结构；不符合 NewsBriefing 约定时抛 ValueError。"""
+    if not isinstance(briefing, dict) or not isinstance(briefing.get("clusters"), list):
+        raise ValueError("briefing missing clusters")
+    for cluster in briefing["clusters"]:
+        if not isinstance(cluster, dict) or not isinstance(cluster.get("items"), list):
+            raise ValueError("invalid cluster in briefing")
+    return briefing
+
+
+class BriefingCache:
+    """线程安全的 LRU：(category, date) -> BriefingEntry（条目内记录 generated_at 版本）。"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max(0, int(max_size))
+        self._items: "OrderedDict[Tuple[str, str], BriefingEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hit": 0, "miss": 0, "stale": 0, "invalidated": 0}
+
+    def get(self, category: str, date_str: str) -> Optional[BriefingEntry]:
+        """
+        返回当前版本的日报条目；数据库无缓存返回 None。
+        解析失败抛 ValueError（调用方按“数据解析错误”处理）。
+        """
+        key = (category, date_str)
+        generated_at = get_cached_news_generated_at(category, date_str)
+        if generated_at is None:
+            self.invalidate(category, date_str)
+            return None
+
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and entry.generated_at == generated_at:
+                self._items.move_to_end(key)
+                self._stats["hit"] += 1
+                annotate(briefing_cache="hit")
+                return entry
+            outcome = "stale" if entry is not None else "miss"
+            self._stats[outcome] += 1
+        annotate(briefing_cache=outcome)
+
+        return self.load(category, date_str, get_cached_news(category, date_str))
+
+    def load(self, category: str, date_str: str, cached: Optional[Dict[str, Any]]) -> Optional[BriefingEntry]:
+        """
+        用已查出的缓存行（get_cached_news / get_cached_news_batch 的结果）构建并登记条目；
+        版本与已缓存条目一致时直接复用（保留已渲染的卡片）。
+        """
+        if not cached or not cached.get("briefing"):
+            return None
+        key = (category, date_str)
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and entry.generated_at == cached.get("generated_at"):
+                self._items.move_to_end(key)
+                return entry
+        entry = BriefingEntry(category, cached.get("generated_at"), _validate_briefing(cached["briefing"]))
+        if self.max_size > 0:
+            with self._lock:
+                self._items[key] = entry
+                self._items.move_to_end(key)
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+        return entry
+
+    def invalidate(self, category: Optional[str] = None, date_str: Optional[str] = None) -> None:
+        """失效指定 (category, date)；不传参数时清空全部。"""
+        with self._lock:
+            if category is None:
+                removed = len(self._items)
+                self._items.clear()
+            else:
+                removed = 1 if self._items.pop((category, date_str), None) is not None else 0
+            self._stats["invalidated"] += removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._items)}
+
+
+briefing_cache = BriefingCache(BRIEFING_CACHE_SIZE)
+
+
+def get_cluster_detail(category: str, date_str: str, cluster_name: str) -> Optional[str]:
+    """
+    快速通道入口：返回预渲染的专题详情；缓存缺失/解析失败/专题不存在时返回 None，
+    由调用方退回完整链路（会给出对应的错误提示）。
+    """
+    t0 = time.perf_counter()
+    try:
+        entry = briefing_cache.get(category, date_str)
+    except Exception as e:
+        print(f"⚠️ [BriefingCache] Parse cache failed for category={category}: {e}")
+        return None
+    detail = entry.details.get(cluster_name) if entry is not None else None
+    elapsed_us = int((time.perf_counter() - t0) * 1_000_000)
+    print(
+        f"⚡ [BriefingCache] category={category} cluster={cluster_name} "
+        f"found={detail is not None} elapsed_us={elapsed_us}"
+    )
+    return detail
+
+
+def get_cover_card(category: str, date_str: str) -> Optional[str]:
+    """返回当日封面卡片（按需渲染并记忆化）；无缓存返回 None。"""
+    try:
+        entry = briefing_cache.get(category, date_str)
+    except Exception as e:
+        print(f"⚠️ [BriefingCache] Load cover card failed for category={category}: {e}")
+        return None
+    return entry.card if entry is not None else None
+
+
+def invalidate_briefing(category: Optional[str] = None, date_str: Optional[str] = None) -> None:
+    """供 save_cached_news 调用：写库后失效对应日报。"""
+    briefing_cache.invalidate(category, date_str)
+
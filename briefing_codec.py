@@ -0,0 +1,119 @@
+"""
+日报缓存的紧凑编码
+==================
+daily_news_cache 只存一份结构化简报（briefing），封面卡片在读取时按需渲染并在进程内记忆化
+（见 briefing_cache.BriefingEntry.card），不再重复存储卡片 JSON。
+
+编码格式：1 字节版本号 + zlib(紧凑 JSON, UTF-8)
+- 版本号放在最前，后续更换序列化方式时旧数据仍可按版本解码；
+- zlib 流首字节固定为 0x78，与版本号不冲突，可据此识别早期未带版本号的归档数据。
+
+基准测试（旧的 JSON 文本 vs 新编码，解码耗时与体积）：
+    python briefing_codec.py                 # 使用内置样例
+    python briefing_codec.py --db ./data/rss_agent.db
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, List
+
+CODEC_VERSION = 1
+_ZLIB_LEVEL = 6
+# 早期（无版本号）归档数据：裸 zlib 流，首字节为 0x78
+_LEGACY_ZLIB_HEADER = 0x78
+
+
+def encode_payload(obj: Any) -> bytes:
+    """对象 -> 版本号 + 压缩后的紧凑 JSON。"""
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return bytes([CODEC_VERSION]) + zlib.compress(raw, _ZLIB_LEVEL)
+
+
+def decode_payload(blob: bytes) -> Any:
+    """encode_payload 的逆操作；未知版本抛 ValueError。"""
+    if not blob:
+        raise ValueError("empty payload")
+    version = blob[0]
+    if version == CODEC_VERSION:
+        return json.loads(zlib.decompress(blob[1:]))
+    if version == _LEGACY_ZLIB_HEADER:
+        return json.loads(zlib.decompress(blob))
+    raise ValueError(f"unknown payload version: {version}")
+
+
+def _sample_briefings() -> List[str]:
+    headlines = [{"title": f"示例头条 {i}：某公司发布新一代模型与芯片路线图", "url": f"https://example.com/h/{i}"} for i in range(10)]
+    clusters = [
+        {
+            "name": name,
+            "items": [
+                {"summary": f"{name} 示例摘要 {j}：这里是一段长度接近真实日报的中文新闻摘要文本。", "url": f"https://example.com/{name}/{j}"}
+                for j in range(8)
+            ],
+        }
+        for name in ("产品", "模型", "硬件与算力", "投融资与政策")
+    ]
+    return [json.dumps({"headlines": headlines, "clusters": clusters}, ensure_ascii=False)]
+
+
+def _db_briefings(db_path: str) -> List[str]:
+    conn = sqlite3.connect(db_path)
+    try:
+        texts = [row[0] for row in conn.execute("SELECT briefing_data FROM daily_news_cache WHERE briefing_data IS NOT NULL")]
+        texts += [
+            json.dumps(decode_payload(row[0]), ensure_ascii=False)
+            for row in conn.execute("SELECT briefing_blob FROM daily_news_cache WHERE briefing_blob IS NOT NULL")
+        ]
+    finally:
+        conn.close()
+    return [t for t in texts if t and t != "{}"]
+
+
+def benchmark(texts: List[str], rounds: int) -> Dict[str, float]:
+    """对比旧 JSON 文本（json.loads）与新编码（decode_payload）的体积与解码耗时。"""
+    blobs = [encode_payload(json.loads(t)) for t in texts]
+    text_bytes = sum(len(t.encode("utf-8")) for t in texts)
+    blob_bytes = sum(len(b) for b in blobs)
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            json.loads(text)
+    json_us = (time.perf_counter() - t0) / (rounds * len(texts)) * 1_000_000
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for blob in blobs:
+            decode_payload(blob)
+    codec_us = (time.perf_counter() - t0) / (rounds * len(blobs)) * 1_000_000
+
+    return {
+        "samples": len(texts),
+        "json_bytes": text_bytes,
+        "codec_bytes": blob_bytes,
+        "json_decode_us": round(json_us, 1),
+        "codec_decode_us": round(codec_us, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日报缓存编码基准测试")
+    parser.add_argument("--db", help="从数据库读取真实日报作为样本（默认使用内置样例）")
+    parser.add_argument("--rounds", type=int, default=2000, help="每个样本的解码次数")
+    args = parser.parse_args()
+
+    texts = _db_briefings(args.db) if args.db else _sample_briefings()
+    if not texts:
+        print("⚠️ 没有可用的日报样本")
+        return
+    result = benchmark(texts, args.rounds)
+    print(f"📦 samples={result['samples']}")
+    print(f"   json : {result['json_bytes']:>10,}B  decode {result['json_decode_us']:>8.1f}us/op")
+    print(f"   codec: {result['codec_bytes']:>10,}B  decode {result['codec_decode_us']:>8.1f}us/op")
+
+
+if __name__ == "__main__":
+    main()
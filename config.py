@@ -38,3 +38,171 @@ NEWS_SCORING_DEBUG = True
 NEWS_SCORING_TOPK = 10
 # 评分规范模块名（便于后续平滑切换不同实现）
 NEWS_SCORING_SPEC_MODULE = "news_scoring_spec_v2"
+
+# --- Router Fast Path Config ---
+# 是否启用 Router 零 LLM 快速通道（关键词语法 + 历史决策 LRU）
+ROUTER_FAST_PATH_ENABLED = True
+# 历史路由决策 LRU 容量（按归一化文本缓存）
+ROUTER_DECISION_CACHE_SIZE = 2048
+# 每处理多少条消息打印一次命中率统计（0 表示不打印）
+ROUTER_FAST_PATH_LOG_EVERY = 50
+
+# --- Writer Delivery Config ---
+# 是否启用渐进式卡片投递（头条改写完成即回复封面，专题完成后原位补齐）
+WRITER_PROGRESSIVE_DELIVERY = True
+
+# --- Incremental Refresh Config ---
+# 是否启用日内增量刷新任务（只处理上次生成后新增的文章）
+NEWS_INCREMENTAL_REFRESH_ENABLED = True
+# 增量刷新的执行小时（北京时间，APScheduler cron 表达式）
+NEWS_INCREMENTAL_REFRESH_HOURS = "10-22"
+# 增量拉取窗口向前重叠的分钟数（防止接口入库延迟导致漏抓）
+NEWS_INCREMENTAL_OVERLAP_MINUTES = 10
+
+# --- Briefing Detail Cache Config ---
+# 进程内缓存的已解析日报份数（按 category + date，卡片“展开专题”快速通道使用）
+BRIEFING_CACHE_SIZE = 32
+# 封面卡片模板版本：修改 build_cover_card 的卡片结构时递增，已记忆化的卡片随之重新渲染
+CARD_TEMPLATE_VERSION = 1
+
+# --- Tracing Config ---
+# 是否记录 agent 图节点 span（耗时 / token / 缓存命中），输出到本地滚动 JSONL
+TRACE_ENABLED = True
+# span 输出文件（与数据库同在 volume 挂载的 data 目录下）
+TRACE_LOG_PATH = "/app/data/traces/agent_spans.jsonl"
+# 单个文件上限（字节）与保留的滚动文件个数
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+TRACE_BACKUP_COUNT = 5
+
+# --- SQLite Config ---
+# 写锁等待上限（毫秒），同时用于 sqlite3.connect(timeout) 与 PRAGMA busy_timeout
+SQLITE_BUSY_TIMEOUT_MS = 5000
+# busy_timeout 仍拿不到锁时，整体重试的次数（指数退避 + 抖动）
+SQLITE_BUSY_RETRIES = 3
+# 每条连接的页缓存大小（KB）
+SQLITE_CACHE_SIZE_KB = 16 * 1024
+# 内存映射读取上限（字节，0 表示关闭）
+SQLITE_MMAP_SIZE_BYTES = 64 * 1024 * 1024
+
+# --- News Store Config ---
+# 是否把每轮流水线的原始文章 / 去重簇 / 事件评分写入规范化表（写入失败不影响主链路）
+NEWS_STORE_ENABLED = True
+
+# --- Delivery Config ---
+# 推送规划时每个投递单元包含的最大用户数（同一单元共享同一份卡片内容）
+DELIVERY_BATCH_SIZE = 200
+
+# --- DB Retention Config ---
+# 是否启用每日数据库保留/压缩任务
+DB_MAINTENANCE_ENABLED = True
+# 执行时间（北京时间，避开 08:00 生成与 09:10 推送）
+DB_MAINTENANCE_HOUR = 4
+# daily_news_cache 保留天数（更早的行移出热表）
+DB_NEWS_CACHE_RETENTION_DAYS = 30
+# 移出的缓存行是否压缩归档到 daily_news_archive（False 则直接删除）
+DB_NEWS_CACHE_ARCHIVE = True
+# 流水线中间结果（news_runs / news_articles / news_clusters / news_event_scores）保留天数
+DB_NEWS_STORE_RETENTION_DAYS = 14
+# 每次增量 VACUUM 最多回收的页数（0 表示回收全部空闲页）
+DB_INCREMENTAL_VACUUM_PAGES = 0
+
+# --- Async DB Config ---
+# async 处理器访问 SQLite 的专用线程数（每个线程持有一条长连接；SQLite 单写者，无需太多）
+DB_ASYNC_WORKERS = 4
+
+# --- Feishu Token Config ---
+# tenant_access_token 距过期不足该秒数时即刷新（飞书有效期 2 小时，剩余 30 分钟内可换取新 token）
+FEISHU_TOKEN_REFRESH_MARGIN_SEC = 300
+# 是否在后台线程中提前刷新 token（请求路径上不再等待鉴权接口）
+FEISHU_TOKEN_BACKGROUND_REFRESH = True
+
+# --- Feishu HTTP Client Config ---
+# 飞书接口默认超时（秒）：建连 / 读取
+FEISHU_HTTP_CONNECT_TIMEOUT_SEC = 5
+FEISHU_HTTP_READ_TIMEOUT_SEC = 15
+# 连接池上限（同步 requests.Session 与异步 httpx.AsyncClient 各自一份）
+FEISHU_HTTP_POOL_SIZE = 32
+
+# --- Push Dispatch Config ---
+# 每日推送的最大并发请求数
+PUSH_DISPATCH_CONCURRENCY = 16
+# 令牌桶限速：每秒发送上限（对齐飞书单应用发消息频控 50 次/秒）与允许的突发量
+PUSH_RATE_LIMIT_QPS = 50
+PUSH_RATE_BURST = 50
+# 5xx / 429 / 频控 / 网络异常的最大重试次数
+PUSH_MAX_RETRIES = 3
+# 重试退避（秒）：base * 2^attempt 封顶 max，再取 [0, 上限] 随机抖动
+PUSH_RETRY_BASE_DELAY_SEC = 0.5
+PUSH_RETRY_MAX_DELAY_SEC = 8
+# 相同内容的推送是否走批量发送接口（message/v4/batch_send，整批被明确拒绝时回退为逐用户发送；outbox 同样适用）
+PUSH_BATCH_SEND_ENABLED = True
+# 批量发送接口单次请求的最大 open_id 数（飞书上限 200）
+PUSH_BATCH_SEND_MAX_RECIPIENTS = 200
+
+# --- Push Outbox Config ---
+# 每日推送 / 群推送是否先写入 SQLite outbox 再发送（关闭则直接发送，失败即丢失）
+OUTBOX_ENABLED = True
+# 每次领取的最大消息数
+OUTBOX_CLAIM_LIMIT = 1000
+# 领取租约（秒）：进程中途退出时，租约到期后消息会被重新领取
+OUTBOX_LEASE_SEC = 300
+# 最大发送次数（含首次），超过后转入死信
+OUTBOX_MAX_ATTEMPTS = 5
+# 失败重排期退避（秒）：base * 2^(attempts-1)，封顶 max
+OUTBOX_RETRY_BASE_SEC = 60
+OUTBOX_RETRY_MAX_SEC = 3600
+# 后台 drain 任务间隔（秒）：发送到期的重试消息与重启前遗留的消息
+OUTBOX_DRAIN_INTERVAL_SEC = 60
+# 已发送的 outbox 行保留天数（由每日数据库维护任务清理）
+OUTBOX_RETENTION_DAYS = 7
+
+# --- Event Dedup Config ---
+# webhook 事件去重保留时长（秒）：覆盖飞书的超时重试间隔（最长约 6 小时）
+EVENT_DEDUP_TTL_SEC = 12 * 3600
+# 内存中最多保留的事件 ID 数（超出时淘汰最早的）
+EVENT_DEDUP_MAX_KEYS = 100_000
+# 是否把事件 ID 持久化到 SQLite（重启后仍能去重）
+EVENT_DEDUP_PERSIST = True
+# 卡片点击短窗口去重（expand / 订阅切换）的内存上限
+ACTION_DEDUP_MAX_KEYS = 10_000
+
+# --- Job Worker Config ---
+# 是否把 agent 运行 / 日报生成 / 归档推送交给独立 worker 进程执行（关闭则在 Web 进程内执行）
+JOB_WORKERS_ENABLED = True
+# worker 进程数（即分片数；同一用户的任务固定落在同一分片）
+JOB_WORKER_PROCESSES = 2
+# 每个 worker 进程内并发执行任务的线程数
+JOB_WORKER_THREADS = 4
+# 空闲时轮询队列的间隔（秒）
+JOB_POLL_INTERVAL_SEC = 0.2
+# worker 中途退出时任务的最大执行次数（含首次），超过后标记失败
+JOB_MAX_ATTEMPTS = 2
+# 已完成 / 失败任务的保留天数（由每日数据库维护任务清理）
+JOB_RETENTION_DAYS = 7
+
+# --- Metrics Config ---
+# worker 进程把指标快照写入 SQLite 的间隔（秒），/metrics 合并各进程快照输出
+METRICS_FLUSH_INTERVAL_SEC = 15
+# 超过该时长（秒）未更新的进程快照视为已退出，不再计入 /metrics
+METRICS_SNAPSHOT_TTL_SEC = 300
+
+# --- Web Worker Config ---
+# uvicorn Web 进程数；设为 1 时以 reload 模式启动（开发调试）
+WEB_WORKERS = 2
+# 非 leader 进程尝试接管调度器的间隔（秒）：leader 退出后最长约该时长内完成接管
+SCHEDULER_LEADER_RETRY_SEC = 5
+
+# --- Admission Control Config ---
+# 是否对 webhook 触发的任务做准入控制（超出容量时立即回复“繁忙”，不再无限排队）
+ADMISSION_CONTROL_ENABLED = True
+# 各任务类别的在途上限（启用 worker 时按 jobs 表中 queued / running 的任务计，跨进程生效）
+ADMISSION_CLASS_LIMITS = {
+    "chat": 16,       # 闲聊（LLM 多轮对话）
+    "read": 32,       # 获取日报（命中缓存时很快，未命中会触发抓取与生成）
+    "expand": 64,     # 卡片“展开专题”
+    "subscribe": 32,  # 订阅 / 退订
+}
+# 单个用户同时在途的任务上限（各类别合计）
+ADMISSION_PER_USER_LIMIT = 3
+# 同一用户两次“繁忙”提示的最小间隔（秒），避免连点时刷屏
+ADMISSION_BUSY_REPLY_INTERVAL_SEC = 10
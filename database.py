@@ -1,202 +1,939 @@
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
+import functools
+import json
 import os
-from typing import List, Tuple
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from briefing_codec import decode_payload, encode_payload
+from config import (
+    SQLITE_BUSY_RETRIES,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE_BYTES,
+)
 
 # 使用 volume 挂载的 data 目录，确保数据持久化
 DB_FILE = os.path.join("/app/data", "rss_agent.db")
 
+# --- 连接层 ---
+# 每个线程持有一条长连接（sqlite3 连接不可跨线程共享），复用连接自带的 prepared statement 缓存；
+# WAL 模式下读写互不阻塞，写写冲突先由 busy_timeout 等待，仍失败时由 _retry_on_busy 整体重试。
+_local = threading.local()
+
+
+def _open_connection() -> sqlite3.Connection:
+    # isolation_level=None：单条语句自动提交，多语句写入显式走 transaction()
+    conn = sqlite3.connect(
+        DB_FILE,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=256,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA cache_size=-{int(SQLITE_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE_BYTES)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """返回当前线程的长连接（DB_FILE 变化或 fork 后自动重建）。"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_file == DB_FILE and _local.pid == os.getpid():
+        return conn
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    conn = _open_connection()
+    _local.conn = conn
+    _local.db_file = DB_FILE
+    _local.pid = os.getpid()
+    return conn
+
+
+def close_connection():
+    """关闭当前线程的连接（线程结束时连接随 thread-local 一起释放，一般无需手动调用）。"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _is_busy_error(e: Exception) -> bool:
+    message = str(e).lower()
+    return "locked" in message or "busy" in message
+
+
+def _retry_on_busy(fn):
+    """数据库忙（database is locked）时带抖动退避重试整个函数；其余异常原样抛出。"""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(SQLITE_BUSY_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _is_busy_error(e) or attempt >= SQLITE_BUSY_RETRIES:
+                    raise
+                delay = 0.05 * (2 ** attempt) + random.uniform(0, 0.05)
+                print(f"⚠️ [DB] {fn.__name__} busy, retry {attempt + 1}/{SQLITE_BUSY_RETRIES} in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    return wrapper
+
+
+@contextmanager
+def transaction():
+    """
+    写事务上下文：BEGIN IMMEDIATE 提前拿写锁，正常退出 COMMIT，异常 ROLLBACK。
+    嵌套使用时并入外层事务。
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+@_retry_on_busy
 def init_db():
     """初始化数据库，创建必要的表"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # 创建用户偏好表
-    # user_id: 你的 open_id
-    # category: AI / GAMES / MUSIC
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_preferences (
-            user_id TEXT PRIMARY KEY,
-            category TEXT NOT NULL,
-            updated_at TIMESTAMP
-        )
-    ''')
-    
-    # 缓存新闻内容的表（每天每个类别生成一次）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS daily_news_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            content TEXT NOT NULL,
-            generated_at TIMESTAMP,
-            date TEXT NOT NULL,
-            UNIQUE(category, date)
-        )
-    ''')
-
-    # 用户多类别订阅表（允许一个用户关注多个类别）
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_subscriptions (
-            user_id TEXT NOT NULL,
-            category TEXT NOT NULL,
-            updated_at TIMESTAMP,
-            UNIQUE(user_id, category)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    
-    # 尝试添加 briefing_data 列 (如果已存在则忽略)
-    conn = sqlite3.connect(DB_FILE)
-    try:
-        conn.execute('ALTER TABLE daily_news_cache ADD COLUMN briefing_data TEXT')
-        print("✅ Added column 'briefing_data' to daily_news_cache.")
-    except sqlite3.OperationalError:
-        pass # 列已存在
-    conn.close()
-
-    # 幂等迁移：将旧的单值偏好补录到新的多订阅表
-    migrate_preferences_to_subscriptions()
+    with transaction() as conn:
+        # 创建用户偏好表
+        # user_id: 你的 open_id
+        # category: AI / GAMES / MUSIC
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_preferences (
+                user_id TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                updated_at TIMESTAMP
+            )
+        ''')
+
+        # 缓存新闻内容的表（每天每个类别生成一次）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_news_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                content TEXT NOT NULL,
+                generated_at TIMESTAMP,
+                date TEXT NOT NULL,
+                UNIQUE(category, date)
+            )
+        ''')
+
+        # 用户多类别订阅表（允许一个用户关注多个类别）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_subscriptions (
+                user_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                updated_at TIMESTAMP,
+                UNIQUE(user_id, category)
+            )
+        ''')
+
+        # 尝试添加 briefing_data 列 (如果已存在则忽略)
+        try:
+            conn.execute('ALTER TABLE daily_news_cache ADD COLUMN briefing_data TEXT')
+            print("✅ Added column 'briefing_data' to daily_news_cache.")
+        except sqlite3.OperationalError:
+            pass # 列已存在
+        # 增量刷新快照（事件/评分/改写文本），供日内增量刷新复用
+        try:
+            conn.execute('ALTER TABLE daily_news_cache ADD COLUMN refresh_state TEXT')
+            print("✅ Added column 'refresh_state' to daily_news_cache.")
+        except sqlite3.OperationalError:
+            pass # 列已存在
+        # 紧凑编码的简报（briefing_codec），有值时 content / briefing_data 留空，卡片读取时渲染
+        try:
+            conn.execute('ALTER TABLE daily_news_cache ADD COLUMN briefing_blob BLOB')
+            print("✅ Added column 'briefing_blob' to daily_news_cache.")
+        except sqlite3.OperationalError:
+            pass # 列已存在
+
+        # --- 规范化流水线数据：原始文章 / 每轮去重簇 / 每轮事件评分 ---
+        # 一次 fetcher -> dedup -> scorer 执行记为一轮（run_id）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_runs (
+                run_id TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                window_start TIMESTAMP,
+                window_end TIMESTAMP,
+                created_at TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_runs_category ON news_runs (category, created_at)')
+
+        # 原始文章（按文章 ID 去重；同一 URL 可按 source_url 索引查询）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_articles (
+                article_id TEXT PRIMARY KEY,
+                category TEXT,
+                title TEXT,
+                summary TEXT,
+                source_url TEXT,
+                source_name TEXT,
+                published_at TEXT,
+                raw_json TEXT NOT NULL,
+                first_seen_at TIMESTAMP,
+                last_seen_at TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_articles_url ON news_articles (source_url)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_articles_published ON news_articles (category, published_at)')
+
+        # 每轮去重簇（代表稿 kept_id + 成员表）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_clusters (
+                run_id TEXT NOT NULL,
+                cluster_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                kept_id TEXT,
+                event_size INTEGER,
+                PRIMARY KEY (run_id, cluster_id)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_cluster_members (
+                run_id TEXT NOT NULL,
+                cluster_id TEXT NOT NULL,
+                article_id TEXT NOT NULL,
+                PRIMARY KEY (run_id, cluster_id, article_id)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_cluster_members_article ON news_cluster_members (article_id)')
+
+        # 每轮事件评分（score_breakdown 与完整评分结果以 JSON 保存）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_event_scores (
+                run_id TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                final_score REAL,
+                cluster_label TEXT,
+                selected_url TEXT,
+                score_breakdown TEXT,
+                result_json TEXT NOT NULL,
+                PRIMARY KEY (run_id, event_id)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_event_scores_url ON news_event_scores (selected_url)')
+
+        # 保留任务按日期 / 最近出现时间批量清理
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_daily_news_cache_date ON daily_news_cache (date)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_articles_last_seen ON news_articles (last_seen_at)')
+
+        # 过期日报缓存的压缩归档（payload 为 zlib 压缩的 JSON，见 db_maintenance.py）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_news_archive (
+                category TEXT NOT NULL,
+                date TEXT NOT NULL,
+                generated_at TIMESTAMP,
+                payload BLOB NOT NULL,
+                archived_at TIMESTAMP,
+                UNIQUE(category, date)
+            )
+        ''')
+
+        # --- 推送 outbox：先落库再发送，重启后续发且按幂等键去重 ---
+        # 同一份内容（如某类别当日卡片）只存一份，outbox 行按 payload_hash 引用
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS push_outbox_payloads (
+                payload_hash TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP
+            )
+        ''')
+        # status: pending（待发 / 待重试）-> sending（已领取，next_attempt_at 为租约到期时间）-> sent / dead
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS push_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                source TEXT NOT NULL,
+                receive_id TEXT NOT NULL,
+                receive_id_type TEXT NOT NULL DEFAULT 'open_id',
+                payload_hash TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                sent_at TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_push_outbox_due ON push_outbox(status, next_attempt_at)')
+
+        # 事件 / 点击去重键（ttl_set 持久化模式），重启后仍能识别飞书的超时重试
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dedup_keys (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_dedup_keys_expires ON dedup_keys(expires_at)')
+
+        # 后台任务队列（job_queue / job_worker）：Web 进程只入队，worker 进程按分片领取执行
+        # status: queued -> running -> done / failed
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(shard, status, id)')
+        # 准入控制：webhook 触发的任务记录任务类别与用户，按在途（queued / running）数量限流
+        for column in ("task_class", "user_id"):
+            try:
+                conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} TEXT')
+                print(f"✅ Added column '{column}' to jobs.")
+            except sqlite3.OperationalError:
+                pass # 列已存在
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_class_inflight ON jobs(task_class, status)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user_inflight ON jobs(user_id, status)')
+
+        # 各进程的指标快照（worker 定期写入，/metrics 合并输出）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metrics_snapshots (
+                process TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        ''')
+
+        # 幂等迁移：将旧的单值偏好补录到新的多订阅表
+        migrate_preferences_to_subscriptions()
     print("✅ Database initialized.")
 
+@_retry_on_busy
 def migrate_preferences_to_subscriptions():
     """将 user_preferences 的历史数据迁移到 user_subscriptions（幂等）。"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+    get_connection().execute('''
         INSERT OR IGNORE INTO user_subscriptions (user_id, category, updated_at)
         SELECT user_id, category, COALESCE(updated_at, ?)
         FROM user_preferences
     ''', (datetime.now(),))
-    conn.commit()
-    conn.close()
 
+@_retry_on_busy
 def upsert_preference(user_id: str, category: str):
     """更新或插入用户偏好"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+    get_connection().execute('''
         INSERT INTO user_preferences (user_id, category, updated_at)
         VALUES (?, ?, ?)
         ON CONFLICT(user_id) DO UPDATE SET
             category=excluded.category,
             updated_at=excluded.updated_at
     ''', (user_id, category, datetime.now()))
-    conn.commit()
-    conn.close()
     return f"Saved: {category}"
 
+@_retry_on_busy
 def get_preference(user_id: str):
     """查询用户偏好"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT category FROM user_preferences WHERE user_id = ?', (user_id,))
-    row = cursor.fetchone()
-    conn.close()
+    row = get_connection().execute(
+        'SELECT category FROM user_preferences WHERE user_id = ?', (user_id,)
+    ).fetchone()
     return row[0] if row else None
 
+@_retry_on_busy
 def add_subscription(user_id: str, category: str):
     """新增用户订阅（重复订阅同一类别会被忽略）。"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
+    cursor = get_connection().execute('''
         INSERT OR IGNORE INTO user_subscriptions (user_id, category, updated_at)
         VALUES (?, ?, ?)
     ''', (user_id, category, datetime.now()))
-    inserted = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return inserted
+    return cursor.rowcount > 0
 
+@_retry_on_busy
 def remove_subscription(user_id: str, category: str):
     """取消用户对某类别的订阅。"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
+    cursor = get_connection().execute(
         'DELETE FROM user_subscriptions WHERE user_id = ? AND category = ?',
         (user_id, category)
     )
-    removed = cursor.rowcount > 0
-    conn.commit()
-    conn.close()
-    return removed
+    return cursor.rowcount > 0
 
+@_retry_on_busy
 def get_subscriptions(user_id: str) -> List[str]:
     """查询用户当前订阅的全部类别。"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
+    rows = get_connection().execute(
         'SELECT category FROM user_subscriptions WHERE user_id = ? ORDER BY category',
         (user_id,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    ).fetchall()
     return [row[0] for row in rows]
 
+@_retry_on_busy
 def list_all_subscriptions() -> List[Tuple[str, str]]:
     """列出所有用户订阅关系（供推送任务遍历）。"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
+    return get_connection().execute(
         'SELECT user_id, category FROM user_subscriptions ORDER BY user_id, category'
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    ).fetchall()
 
+@_retry_on_busy
 def replace_subscriptions(user_id: str, categories: List[str]):
     """整体替换用户订阅列表。"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
     now = datetime.now()
-    try:
-        cursor.execute('BEGIN')
-        cursor.execute('DELETE FROM user_subscriptions WHERE user_id = ?', (user_id,))
-        cursor.executemany(
+    with transaction() as conn:
+        conn.execute('DELETE FROM user_subscriptions WHERE user_id = ?', (user_id,))
+        conn.executemany(
             '''
             INSERT OR IGNORE INTO user_subscriptions (user_id, category, updated_at)
             VALUES (?, ?, ?)
             ''',
             [(user_id, category, now) for category in categories]
         )
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
 
-def save_cached_news(category, content, date_str, briefing_data=None):
-    """保存新闻缓存 (含原始数据)"""
-    conn = sqlite3.connect(DB_FILE)
-    # Note: briefing_data might be None if saving from legacy logic, handle gracefully?
-    # Actually we should enforce it ideally, but let's default to empty JSON '{}' or None
-    if briefing_data is None: 
-        briefing_data = "{}"
-        
-    conn.execute('''
-        INSERT OR REPLACE INTO daily_news_cache (category, content, generated_at, date, briefing_data)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (category, content, datetime.now(), date_str, briefing_data))
-    conn.commit()
-    conn.close()
+def _briefing_dict(briefing_data):
+    """briefing_data 可为 dict 或 JSON 字符串；非空对象才视为有效简报。"""
+    if isinstance(briefing_data, str):
+        try:
+            briefing_data = json.loads(briefing_data)
+        except ValueError:
+            return None
+    return briefing_data if isinstance(briefing_data, dict) and briefing_data else None
+
+def decode_cached_briefing(briefing_data, briefing_blob):
+    """从缓存行还原简报 dict（优先新编码，兼容旧的 JSON 文本）；无效时返回 None。"""
+    if briefing_blob:
+        try:
+            return decode_payload(briefing_blob)
+        except Exception as e:
+            print(f"⚠️ [DB] briefing_blob decode failed: {e}")
+            return None
+    return _briefing_dict(briefing_data)
+
+@_retry_on_busy
+def save_cached_news(category, content, date_str, briefing_data=None, refresh_state=None):
+    """
+    保存新闻缓存 (refresh_state 为增量刷新快照 JSON，可为空)
+    有结构化简报时只存一份紧凑编码（briefing_blob），封面卡片 content 不再落库，读取时按需渲染。
+    """
+    briefing = _briefing_dict(briefing_data)
+    if briefing is not None:
+        content, briefing_text, briefing_blob = "", None, encode_payload(briefing)
+    else:
+        # 无简报的旧逻辑：原样保存卡片文本
+        briefing_text, briefing_blob = "{}", None
+
+    get_connection().execute('''
+        INSERT OR REPLACE INTO daily_news_cache (
+            category, content, generated_at, date, briefing_data, refresh_state, briefing_blob
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (category, content, datetime.now(), date_str, briefing_text, refresh_state, briefing_blob))
+
+    # 失效进程内的日报详情缓存（延迟导入，避免循环依赖）
+    from briefing_cache import invalidate_briefing
+    invalidate_briefing(category, date_str)
 
+@_retry_on_busy
 def get_cached_news(category, date_str):
-    """读取新闻缓存 -> (content, briefing_data)"""
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        'SELECT content, briefing_data, generated_at FROM daily_news_cache WHERE category = ? AND date = ?',
+    """
+    读取新闻缓存 -> {"content", "briefing", "generated_at", "refresh_state"}
+    briefing 为已解码的简报 dict；content 仅旧数据才有（新数据的卡片由 briefing_cache.get_cover_card 渲染）。
+    """
+    row = get_connection().execute(
+        '''
+        SELECT content, briefing_data, briefing_blob, generated_at, refresh_state
+        FROM daily_news_cache WHERE category = ? AND date = ?
+        ''',
         (category, date_str)
     ).fetchone()
-    conn.close()
     if row:
         return {
-            "content": row[0],
-            "briefing_data": row[1],
-            "generated_at": row[2] # 新增
+            "content": row[0] or None,
+            "briefing": decode_cached_briefing(row[1], row[2]),
+            "generated_at": row[3],
+            "refresh_state": row[4],
         }
     return None
 
+@_retry_on_busy
+def get_cached_news_generated_at(category, date_str):
+    """只读取缓存的生成时间（作为详情缓存的版本号），无缓存返回 None"""
+    row = get_connection().execute(
+        'SELECT generated_at FROM daily_news_cache WHERE category = ? AND date = ?',
+        (category, date_str)
+    ).fetchone()
+    return row[0] if row else None
+
+@_retry_on_busy
+def list_subscribers_by_category() -> Dict[str, List[str]]:
+    """按类别分组返回全部订阅用户 {category: [user_id, ...]}（一次查询，供推送规划使用）。"""
+    grouped: Dict[str, List[str]] = {}
+    for category, user_id in get_connection().execute(
+        'SELECT category, user_id FROM user_subscriptions ORDER BY category, user_id'
+    ):
+        grouped.setdefault(category, []).append(user_id)
+    return grouped
+
+@_retry_on_busy
+def get_cached_news_batch(categories: List[str], date_str: str) -> Dict[str, Dict[str, Any]]:
+    """
+    一次查询读取多个类别当日的缓存 {category: {content, briefing, generated_at}}（无缓存的类别不出现）。
+    字段含义同 get_cached_news（不含 refresh_state）。
+    """
+    if not categories:
+        return {}
+    placeholders = ",".join("?" for _ in categories)
+    rows = get_connection().execute(
+        f'''
+        SELECT category, content, briefing_data, briefing_blob, generated_at
+        FROM daily_news_cache WHERE date = ? AND category IN ({placeholders})
+        ''',
+        (date_str, *categories)
+    ).fetchall()
+    return {
+        row[0]: {
+            "content": row[1] or None,
+            "briefing": decode_cached_briefing(row[2], row[3]),
+            "generated_at": row[4],
+        }
+        for row in rows
+    }
+
+# --- 规范化流水线数据（news_runs / news_articles / news_clusters / news_event_scores）---
+
+@_retry_on_busy
+def save_news_run(run_id: str, category: str, mode: str, window_start=None, window_end=None):
+    """登记一轮流水线执行（重复登记同一 run_id 会被忽略）。"""
+    get_connection().execute('''
+        INSERT OR IGNORE INTO news_runs (run_id, category, mode, window_start, window_end, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (run_id, category, mode, window_start, window_end, datetime.now()))
+
+@_retry_on_busy
+def save_articles(rows: List[Dict[str, Any]]) -> int:
+    """
+    批量写入原始文章（按 article_id upsert，保留 first_seen_at）。
+    rows: [{"article_id", "category", "title", "summary", "source_url", "source_name", "published_at", "raw_json"}]
+    """
+    now = datetime.now()
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO news_articles (
+                article_id, category, title, summary, source_url, source_name,
+                published_at, raw_json, first_seen_at, last_seen_at
+            )
+            VALUES (:article_id, :category, :title, :summary, :source_url, :source_name,
+                    :published_at, :raw_json, :now, :now)
+            ON CONFLICT(article_id) DO UPDATE SET
+                category=excluded.category,
+                title=excluded.title,
+                summary=excluded.summary,
+                source_url=excluded.source_url,
+                source_name=excluded.source_name,
+                published_at=excluded.published_at,
+                raw_json=excluded.raw_json,
+                last_seen_at=excluded.last_seen_at
+        ''', [{**row, "now": now} for row in rows])
+    return len(rows)
+
+@_retry_on_busy
+def save_clusters(run_id: str, category: str, clusters: List[Dict[str, Any]]) -> int:
+    """
+    写入一轮的去重簇（同一 run_id 重复写入时整体覆盖）。
+    clusters: [{"cluster_id", "kept_id", "member_ids": [...]}]
+    """
+    with transaction() as conn:
+        conn.execute('DELETE FROM news_cluster_members WHERE run_id = ?', (run_id,))
+        conn.execute('DELETE FROM news_clusters WHERE run_id = ?', (run_id,))
+        conn.executemany(
+            'INSERT INTO news_clusters (run_id, cluster_id, category, kept_id, event_size) VALUES (?, ?, ?, ?, ?)',
+            [
+                (run_id, c["cluster_id"], category, c.get("kept_id"), len(c.get("member_ids") or []))
+                for c in clusters
+            ]
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO news_cluster_members (run_id, cluster_id, article_id) VALUES (?, ?, ?)',
+            [
+                (run_id, c["cluster_id"], str(member_id))
+                for c in clusters
+                for member_id in c.get("member_ids") or []
+            ]
+        )
+    return len(clusters)
+
+@_retry_on_busy
+def save_event_scores(run_id: str, category: str, scored_events: List[Dict[str, Any]]) -> int:
+    """写入一轮的事件评分（同一 run_id 重复写入时整体覆盖）。"""
+    with transaction() as conn:
+        conn.execute('DELETE FROM news_event_scores WHERE run_id = ?', (run_id,))
+        conn.executemany('''
+            INSERT INTO news_event_scores (
+                run_id, event_id, category, final_score, cluster_label, selected_url, score_breakdown, result_json
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
+                run_id,
+                str(ev.get("event_id")),
+                category,
+                ev.get("final_score"),
+                ev.get("cluster_label"),
+                ev.get("selected_url"),
+                json.dumps(ev.get("score_breakdown") or {}, ensure_ascii=False),
+                json.dumps(ev, ensure_ascii=False, default=str),
+            )
+            for ev in scored_events
+        ])
+    return len(scored_events)
+
+@_retry_on_busy
+def get_latest_run_id(category: str, mode: str = None):
+    """查询某类别最近一轮的 run_id（可按 full / incremental 过滤），无记录返回 None。"""
+    if mode:
+        row = get_connection().execute(
+            'SELECT run_id FROM news_runs WHERE category = ? AND mode = ? ORDER BY created_at DESC LIMIT 1',
+            (category, mode)
+        ).fetchone()
+    else:
+        row = get_connection().execute(
+            'SELECT run_id FROM news_runs WHERE category = ? ORDER BY created_at DESC LIMIT 1',
+            (category,)
+        ).fetchone()
+    return row[0] if row else None
+
+@_retry_on_busy
+def get_articles(category: str, start: str = None, end: str = None) -> List[Dict[str, Any]]:
+    """按 publishedAt 区间（ISO 字符串，闭开区间）查询原始文章，返回与新闻接口一致的 dict。"""
+    sql = 'SELECT raw_json FROM news_articles WHERE category = ?'
+    params: List[Any] = [category]
+    if start:
+        sql += ' AND published_at >= ?'
+        params.append(start)
+    if end:
+        sql += ' AND published_at < ?'
+        params.append(end)
+    rows = get_connection().execute(sql + ' ORDER BY published_at DESC', params).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+@_retry_on_busy
+def get_run_clusters(run_id: str) -> List[Dict[str, Any]]:
+    """读取一轮的去重簇，结构与 dedup_trace["clusters"] 一致。"""
+    conn = get_connection()
+    clusters = conn.execute(
+        'SELECT cluster_id, kept_id FROM news_clusters WHERE run_id = ? ORDER BY cluster_id',
+        (run_id,)
+    ).fetchall()
+    members: Dict[str, List[str]] = {}
+    for cluster_id, article_id in conn.execute(
+        'SELECT cluster_id, article_id FROM news_cluster_members WHERE run_id = ? ORDER BY rowid',
+        (run_id,)
+    ):
+        members.setdefault(cluster_id, []).append(article_id)
+    return [
+        {"cluster_id": cluster_id, "kept_id": kept_id, "member_ids": members.get(cluster_id, [])}
+        for cluster_id, kept_id in clusters
+    ]
+
+@_retry_on_busy
+def get_event_scores(run_id: str) -> List[Dict[str, Any]]:
+    """读取一轮的完整评分结果（按 final_score 降序，结构与 scored_events 一致）。"""
+    rows = get_connection().execute(
+        'SELECT result_json FROM news_event_scores WHERE run_id = ? ORDER BY final_score DESC',
+        (run_id,)
+    ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+# --- 推送 outbox（push_outbox / push_outbox_payloads）---
+
+@_retry_on_busy
+def enqueue_outbox(messages: List[Dict[str, Any]]) -> int:
+    """
+    批量入队待发消息；幂等键已存在的消息被忽略（重复执行推送任务不会重复发送）。
+    messages: [{"idempotency_key", "source", "receive_id", "receive_id_type", "payload_hash", "content"}]
+    返回新入队的条数。
+    """
+    now = datetime.now()
+    due_at = time.time()
+    payloads = {m["payload_hash"]: m["content"] for m in messages}
+    with transaction() as conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO push_outbox_payloads (payload_hash, content, created_at) VALUES (?, ?, ?)',
+            [(payload_hash, content, now) for payload_hash, content in payloads.items()]
+        )
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT OR IGNORE INTO push_outbox (
+                idempotency_key, source, receive_id, receive_id_type, payload_hash,
+                next_attempt_at, created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
+                m["idempotency_key"], m["source"], m["receive_id"], m.get("receive_id_type") or "open_id",
+                m["payload_hash"], due_at, now, now,
+            )
+            for m in messages
+        ])
+        return conn.total_changes - before
+
+@_retry_on_busy
+def claim_outbox(limit: int, lease_sec: float) -> List[Dict[str, Any]]:
+    """
+    领取到期的待发消息（含租约过期的 sending 行，即上次进程中途退出的消息），
+    标记为 sending 并把 next_attempt_at 设为租约到期时间。
+    """
+    now = time.time()
+    with transaction() as conn:
+        rows = conn.execute('''
+            SELECT o.id, o.idempotency_key, o.source, o.receive_id, o.receive_id_type,
+                   o.payload_hash, o.attempts, p.content
+            FROM push_outbox o JOIN push_outbox_payloads p ON p.payload_hash = o.payload_hash
+            WHERE o.status IN ('pending', 'sending') AND o.next_attempt_at <= ?
+            ORDER BY o.id
+            LIMIT ?
+        ''', (now, limit)).fetchall()
+        updated_at = datetime.now()
+        conn.executemany(
+            "UPDATE push_outbox SET status = 'sending', attempts = attempts + 1, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+            [(now + lease_sec, updated_at, row[0]) for row in rows]
+        )
+    return [
+        {
+            "id": row[0],
+            "idempotency_key": row[1],
+            "source": row[2],
+            "receive_id": row[3],
+            "receive_id_type": row[4],
+            "payload_hash": row[5],
+            "attempts": row[6] + 1,
+            "content": row[7],
+        }
+        for row in rows
+    ]
+
+@_retry_on_busy
+def mark_outbox_sent(ids: List[int]):
+    now = datetime.now()
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE push_outbox SET status = 'sent', last_error = NULL, sent_at = ?, updated_at = ? WHERE id = ?",
+            [(now, now, outbox_id) for outbox_id in ids]
+        )
+
+@_retry_on_busy
+def mark_outbox_failed(failures: List[Tuple[int, str, Any]]):
+    """failures: [(id, error, next_attempt_at)]；next_attempt_at 为 None 表示转入死信（dead）。"""
+    now = datetime.now()
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE push_outbox
+            SET status = CASE WHEN ? IS NULL THEN 'dead' ELSE 'pending' END,
+                next_attempt_at = COALESCE(?, next_attempt_at),
+                last_error = ?, updated_at = ?
+            WHERE id = ?
+        ''', [(next_at, next_at, error, now, outbox_id) for outbox_id, error, next_at in failures])
+
+@_retry_on_busy
+def get_outbox_status(idempotency_keys: List[str]) -> Dict[str, str]:
+    """按幂等键查询消息当前状态（不存在的键不出现在结果中）。"""
+    if not idempotency_keys:
+        return {}
+    placeholders = ",".join("?" for _ in idempotency_keys)
+    rows = get_connection().execute(
+        f'SELECT idempotency_key, status FROM push_outbox WHERE idempotency_key IN ({placeholders})',
+        list(idempotency_keys)
+    ).fetchall()
+    return dict(rows)
+
+@_retry_on_busy
+def requeue_dead_outbox(source: str = None) -> int:
+    """把死信重新放回待发队列（attempts 清零），返回条数。"""
+    sql = "UPDATE push_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = 'dead'"
+    params: List[Any] = [time.time(), datetime.now()]
+    if source:
+        sql += " AND source = ?"
+        params.append(source)
+    return get_connection().execute(sql, params).rowcount
+
+@_retry_on_busy
+def get_outbox_stats() -> Dict[str, Any]:
+    """outbox 深度与积压：各状态条数、最早未发消息的入队时间、最早到期时间、按来源的未发条数。"""
+    conn = get_connection()
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM push_outbox GROUP BY status').fetchall())
+    oldest_created, oldest_due = conn.execute(
+        "SELECT MIN(created_at), MIN(next_attempt_at) FROM push_outbox WHERE status IN ('pending', 'sending')"
+    ).fetchone()
+    by_source = conn.execute(
+        "SELECT source, status, COUNT(*) FROM push_outbox WHERE status != 'sent' GROUP BY source, status"
+    ).fetchall()
+    return {
+        "counts": counts,
+        "oldest_unsent_created_at": oldest_created,
+        "oldest_due_at": oldest_due,
+        "unsent_by_source": [{"source": r[0], "status": r[1], "count": r[2]} for r in by_source],
+    }
+
+# --- 去重键（dedup_keys）---
+
+@_retry_on_busy
+def claim_dedup_key(namespace: str, key: str, now: float, expires_at: float) -> bool:
+    """原子地登记去重键：键不存在或已过期时写入并返回 True，仍在有效期内返回 False。"""
+    cursor = get_connection().execute('''
+        INSERT INTO dedup_keys (namespace, key, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(namespace, key) DO UPDATE SET expires_at = excluded.expires_at
+        WHERE dedup_keys.expires_at <= ?
+    ''', (namespace, key, expires_at, now))
+    return cursor.rowcount > 0
+
+@_retry_on_busy
+def load_dedup_keys(namespace: str, now: float, limit: int) -> List[Tuple[str, float]]:
+    """按过期时间升序返回未过期的键（最多 limit 条，取最新的）。"""
+    rows = get_connection().execute('''
+        SELECT key, expires_at FROM dedup_keys
+        WHERE namespace = ? AND expires_at > ?
+        ORDER BY expires_at DESC
+        LIMIT ?
+    ''', (namespace, now, limit)).fetchall()
+    return list(reversed(rows))
+
+@_retry_on_busy
+def release_dedup_key(namespace: str, key: str) -> None:
+    """删除一个去重键（被拒绝的操作允许立即重试）。"""
+    get_connection().execute('DELETE FROM dedup_keys WHERE namespace = ? AND key = ?', (namespace, key))
+
+@_retry_on_busy
+def purge_expired_dedup_keys(now: float) -> int:
+    return get_connection().execute('DELETE FROM dedup_keys WHERE expires_at <= ?', (now,)).rowcount
+
+# --- 后台任务队列（jobs）---
+
+@_retry_on_busy
+def enqueue_job(kind: str, payload: str, shard: int) -> int:
+    cursor = get_connection().execute(
+        'INSERT INTO jobs (kind, payload, shard, created_at) VALUES (?, ?, ?, ?)',
+        (kind, payload, shard, time.time())
+    )
+    return cursor.lastrowid
+
+@_retry_on_busy
+def enqueue_job_admitted(
+    kind: str,
+    payload: str,
+    shard: int,
+    task_class: str,
+    user_id: str,
+    class_limit: int,
+    user_limit: int,
+) -> Tuple[Optional[int], Optional[str]]:
+    """
+    准入检查与入队在同一事务内完成（多个 Web 进程并发入队时上限仍然准确）。
+    该类别或该用户在途（queued / running）任务已达上限时不入队。
+    返回 (job_id, None)，或 (None, "class" / "user")。
+    """
+    with transaction() as conn:
+        if class_limit > 0:
+            in_flight = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE task_class = ? AND status IN ('queued', 'running')", (task_class,)
+            ).fetchone()[0]
+            if in_flight >= class_limit:
+                return None, "class"
+        if user_id and user_limit > 0:
+            in_flight = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')", (user_id,)
+            ).fetchone()[0]
+            if in_flight >= user_limit:
+                return None, "user"
+        cursor = conn.execute(
+            'INSERT INTO jobs (kind, payload, shard, created_at, task_class, user_id) VALUES (?, ?, ?, ?, ?, ?)',
+            (kind, payload, shard, time.time(), task_class, user_id)
+        )
+        return cursor.lastrowid, None
+
+@_retry_on_busy
+def claim_job(shard: int, worker: str):
+    """领取本分片最早的排队任务并标记为 running；无任务返回 None。"""
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT id, kind, payload, attempts FROM jobs WHERE shard = ? AND status = 'queued' ORDER BY id LIMIT 1",
+            (shard,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, started_at = ? WHERE id = ?",
+            (worker, time.time(), row[0])
+        )
+    return {"id": row[0], "kind": row[1], "payload": row[2], "attempts": row[3] + 1}
+
+@_retry_on_busy
+def finish_job(job_id: int, error: str = None):
+    get_connection().execute(
+        'UPDATE jobs SET status = ?, last_error = ?, finished_at = ? WHERE id = ?',
+        ('failed' if error else 'done', error, time.time(), job_id)
+    )
+
+@_retry_on_busy
+def recover_shard_jobs(shard: int, max_attempts: int) -> Tuple[int, int]:
+    """
+    分片 worker 启动时调用：上一个 worker 进程退出时仍处于 running 的任务，
+    未超过最大次数的重新排队，否则标记失败。返回 (重新排队数, 标记失败数)。
+    """
+    with transaction() as conn:
+        requeued = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE shard = ? AND status = 'running' AND attempts < ?",
+            (shard, max_attempts)
+        ).rowcount
+        failed = conn.execute(
+            "UPDATE jobs SET status = 'failed', last_error = 'worker exited while running', finished_at = ? "
+            "WHERE shard = ? AND status = 'running'",
+            (time.time(), shard)
+        ).rowcount
+    return requeued, failed
+
+@_retry_on_busy
+def get_job_stats() -> Dict[str, Any]:
+    """任务队列深度：各状态条数、各任务类型排队数、最早排队任务的入队时间。"""
+    conn = get_connection()
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+    queued_by_kind = dict(conn.execute(
+        "SELECT kind, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY kind"
+    ).fetchall())
+    oldest_queued = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+    return {"counts": counts, "queued_by_kind": queued_by_kind, "oldest_queued_at": oldest_queued}
+
+@_retry_on_busy
+def save_metrics_snapshot(process: str, payload: str):
+    """写入（覆盖）某进程的指标快照。"""
+    get_connection().execute(
+        'INSERT INTO metrics_snapshots (process, updated_at, payload) VALUES (?, ?, ?) '
+        'ON CONFLICT(process) DO UPDATE SET updated_at = excluded.updated_at, payload = excluded.payload',
+        (process, time.time(), payload)
+    )
+
+@_retry_on_busy
+def load_metrics_snapshots(since_ts: float) -> List[Tuple[str, str]]:
+    """读取 since_ts 之后更新过的进程快照：[(process, payload_json), ...]。"""
+    return get_connection().execute(
+        'SELECT process, payload FROM metrics_snapshots WHERE updated_at >= ?', (since_ts,)
+    ).fetchall()
+
 if __name__ == "__main__":
     init_db()
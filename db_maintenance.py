@@ -0,0 +1,216 @@
+"""
+数据库保留与压缩任务
+====================
+职责（每日由调度器执行一次）：
+1) daily_news_cache 中超过保留天数的行：以 briefing_codec 紧凑编码归档到 daily_news_archive，再从热表删除；
+2) 流水线中间结果（news_runs 及其去重簇 / 评分、长期未再出现的文章）按保留天数删除；
+   已发送的推送 outbox 行及不再被引用的消息内容按保留天数删除；过期的事件去重键删除；
+   已完成 / 失败的后台任务按保留天数删除；
+3) 增量 VACUUM 回收空闲页 + ANALYZE 刷新查询计划统计；
+4) 输出各表大小与本次回收的字节数。
+
+用法：
+    python db_maintenance.py           # 立即执行一次并打印报告
+    python db_maintenance.py --report  # 只打印各表大小，不做清理
+"""
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from config import (
+    DB_INCREMENTAL_VACUUM_PAGES,
+    DB_NEWS_CACHE_ARCHIVE,
+    DB_NEWS_CACHE_RETENTION_DAYS,
+    DB_NEWS_STORE_RETENTION_DAYS,
+    JOB_RETENTION_DAYS,
+    METRICS_SNAPSHOT_TTL_SEC,
+    OUTBOX_RETENTION_DAYS,
+)
+from briefing_codec import decode_payload, encode_payload
+from database import decode_cached_briefing, get_connection, purge_expired_dedup_keys, transaction
+
+
+def read_archive(blob: bytes) -> Dict[str, Any]:
+    """读取归档：返回 {"content", "briefing"}（content 仅旧数据才有）。"""
+    record = decode_payload(blob)
+    if "briefing_data" in record:
+        # 早期归档：briefing_data 为 JSON 文本
+        record = {"content": record.get("content"), "briefing": decode_cached_briefing(record["briefing_data"], None)}
+    return record
+
+
+def _db_bytes() -> Dict[str, int]:
+    conn = get_connection()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"file_bytes": page_size * page_count, "free_bytes": page_size * freelist}
+
+
+def table_sizes() -> Dict[str, Dict[str, Optional[int]]]:
+    """各表行数与占用字节（SQLite 未编译 dbstat 时字节数为 None）。"""
+    conn = get_connection()
+    tables = [
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+    ]
+    try:
+        bytes_by_table = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except Exception:
+        bytes_by_table = {}
+    return {
+        table: {
+            "rows": conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0],
+            "bytes": bytes_by_table.get(table),
+        }
+        for table in tables
+    }
+
+
+def _ensure_incremental_vacuum() -> None:
+    """auto_vacuum 只能在 VACUUM 时切换：首次执行时做一次全量 VACUUM，之后走增量回收。"""
+    conn = get_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    print("🧹 [DBMaintenance] Switching auto_vacuum to INCREMENTAL (one-off full VACUUM)...")
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def _expire_news_cache(cutoff_date: str) -> Dict[str, int]:
+    with transaction() as conn:
+        rows = conn.execute(
+            """
+            SELECT category, date, generated_at, content, briefing_data, briefing_blob
+            FROM daily_news_cache WHERE date < ?
+            """,
+            (cutoff_date,),
+        ).fetchall()
+        if DB_NEWS_CACHE_ARCHIVE and rows:
+            now = datetime.now()
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO daily_news_archive (category, date, generated_at, payload, archived_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        category,
+                        date_str,
+                        generated_at,
+                        # refresh_state 只服务于当日增量刷新，不归档
+                        encode_payload(
+                            {
+                                "content": content or None,
+                                "briefing": decode_cached_briefing(briefing_data, briefing_blob),
+                            }
+                        ),
+                        now,
+                    )
+                    for category, date_str, generated_at, content, briefing_data, briefing_blob in rows
+                ],
+            )
+        conn.execute("DELETE FROM daily_news_cache WHERE date < ?", (cutoff_date,))
+    return {"cache_rows_expired": len(rows), "cache_rows_archived": len(rows) if DB_NEWS_CACHE_ARCHIVE else 0}
+
+
+def _expire_news_store(cutoff: datetime) -> Dict[str, int]:
+    with transaction() as conn:
+        run_filter = "run_id IN (SELECT run_id FROM news_runs WHERE created_at < ?)"
+        conn.execute(f"DELETE FROM news_cluster_members WHERE {run_filter}", (cutoff,))
+        conn.execute(f"DELETE FROM news_clusters WHERE {run_filter}", (cutoff,))
+        conn.execute(f"DELETE FROM news_event_scores WHERE {run_filter}", (cutoff,))
+        runs = conn.execute("DELETE FROM news_runs WHERE created_at < ?", (cutoff,)).rowcount
+        articles = conn.execute("DELETE FROM news_articles WHERE last_seen_at < ?", (cutoff,)).rowcount
+    return {"runs_expired": runs, "articles_expired": articles}
+
+
+def _expire_outbox(cutoff: datetime) -> Dict[str, int]:
+    """删除早于 cutoff 的已发送 outbox 行（pending / dead 保留，便于重试与排查）及孤立的消息内容。"""
+    with transaction() as conn:
+        rows = conn.execute("DELETE FROM push_outbox WHERE status = 'sent' AND sent_at < ?", (cutoff,)).rowcount
+        conn.execute(
+            "DELETE FROM push_outbox_payloads "
+            "WHERE payload_hash NOT IN (SELECT DISTINCT payload_hash FROM push_outbox)"
+        )
+    return {"outbox_rows_expired": rows}
+
+
+def run_db_maintenance() -> Dict[str, Any]:
+    """执行一次保留 + 压缩，返回报告（同时打印）。"""
+    t0 = time.perf_counter()
+    conn = get_connection()
+    before = _db_bytes()
+    print(f"🧹 [DBMaintenance] Started. file={before['file_bytes']:,}B free={before['free_bytes']:,}B")
+
+    report: Dict[str, Any] = {}
+    cutoff_date = (date.today() - timedelta(days=DB_NEWS_CACHE_RETENTION_DAYS)).isoformat()
+    report.update(_expire_news_cache(cutoff_date))
+    report.update(_expire_news_store(datetime.now() - timedelta(days=DB_NEWS_STORE_RETENTION_DAYS)))
+    report.update(_expire_outbox(datetime.now() - timedelta(days=OUTBOX_RETENTION_DAYS)))
+    report["dedup_keys_expired"] = purge_expired_dedup_keys(time.time())
+    report["jobs_expired"] = conn.execute(
+        "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+        (time.time() - JOB_RETENTION_DAYS * 86400,),
+    ).rowcount
+    # 已退出进程（pid 变化）留下的指标快照
+    report["metrics_snapshots_expired"] = conn.execute(
+        "DELETE FROM metrics_snapshots WHERE updated_at < ?",
+        (time.time() - METRICS_SNAPSHOT_TTL_SEC,),
+    ).rowcount
+
+    _ensure_incremental_vacuum()
+    pages = int(DB_INCREMENTAL_VACUUM_PAGES)
+    # incremental_vacuum 每回收一页返回一行，需要 fetchall 才会执行完
+    conn.execute(f"PRAGMA incremental_vacuum({pages})" if pages > 0 else "PRAGMA incremental_vacuum").fetchall()
+    conn.execute("ANALYZE")
+    # WAL 模式下把日志合并回主库并截断，文件大小才会真正下降
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    after = _db_bytes()
+    report.update(
+        {
+            "cache_cutoff_date": cutoff_date,
+            "file_bytes_before": before["file_bytes"],
+            "file_bytes_after": after["file_bytes"],
+            "reclaimed_bytes": before["file_bytes"] - after["file_bytes"],
+            "tables": table_sizes(),
+            "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+        }
+    )
+    print_report(report)
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    if "file_bytes_after" in report:
+        print(
+            "✅ [DBMaintenance] Done. "
+            f"cache_expired={report['cache_rows_expired']} archived={report['cache_rows_archived']} "
+            f"runs_expired={report['runs_expired']} articles_expired={report['articles_expired']} "
+            f"outbox_expired={report['outbox_rows_expired']} dedup_keys_expired={report['dedup_keys_expired']} "
+            f"jobs_expired={report['jobs_expired']} metrics_snapshots_expired={report['metrics_snapshots_expired']} "
+            f"file={report['file_bytes_before']:,}B -> {report['file_bytes_after']:,}B "
+            f"reclaimed={report['reclaimed_bytes']:,}B elapsed_ms={report['elapsed_ms']}"
+        )
+    for table, size in report["tables"].items():
+        size_text = f"{size['bytes']:,}B" if size["bytes"] is not None else "N/A"
+        print(f"   {table:<24} rows={size['rows']:<8} size={size_text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库保留与压缩任务")
+    parser.add_argument("--report", action="store_true", help="只打印各表大小，不做清理")
+    args = parser.parse_args()
+    if args.report:
+        print_report({"tables": table_sizes()})
+        return
+    run_db_maintenance()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+每日推送规划
+============
+职责：
+1) 一次查询按类别分组取出全部订阅用户；
+2) 一次查询取出这些类别当日的缓存简报（与订阅数无关，只与类别数有关），
+   每个类别渲染一次封面卡片（经 briefing_cache 记忆化）；
+3) 把同一类别的用户切成若干批，生成 (用户批, 共享卡片内容) 投递单元交给推送方。
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from briefing_cache import briefing_cache
+from config import DELIVERY_BATCH_SIZE
+from database import get_cached_news_batch, list_subscribers_by_category
+
+
+class DeliveryUnit:
+    """一个投递单元：同一类别下的一批用户共享同一份卡片内容。"""
+
+    __slots__ = ("category", "user_ids", "content", "generated_at")
+
+    def __init__(self, category: str, user_ids: List[str], content: str, generated_at: Optional[str]):
+        self.category = category
+        self.user_ids = user_ids
+        self.content = content
+        self.generated_at = generated_at
+
+    def __repr__(self) -> str:
+        return f"DeliveryUnit(category={self.category}, users={len(self.user_ids)})"
+
+
+def plan_deliveries(
+    date_str: str, batch_size: int = DELIVERY_BATCH_SIZE
+) -> Tuple[List[DeliveryUnit], Dict[str, List[str]]]:
+    """
+    生成当日投递计划。
+    返回: (投递单元列表, 缓存缺失的 {category: [user_id, ...]})
+    """
+    subscribers = list_subscribers_by_category()
+    cached = get_cached_news_batch(list(subscribers), date_str)
+    batch_size = max(1, int(batch_size))
+
+    units: List[DeliveryUnit] = []
+    misses: Dict[str, List[str]] = {}
+    for category, user_ids in subscribers.items():
+        row = cached.get(category) or {}
+        try:
+            entry = briefing_cache.load(category, date_str, row)
+            # 无结构化简报的旧数据仍沿用落库的卡片文本
+            content = entry.card if entry is not None else row.get("content")
+        except Exception as e:
+            print(f"⚠️ [Delivery] Render card failed for {category}: {e}")
+            content = None
+        if not content:
+            misses[category] = user_ids
+            continue
+        for i in range(0, len(user_ids), batch_size):
+            units.append(
+                DeliveryUnit(category, user_ids[i : i + batch_size], content, row.get("generated_at"))
+            )
+    return units, misses
@@ -2,9 +2,11 @@
 飞书文档写入辅助类
 用于将机器人生内容写入飞书云文档（支持Wiki）
 """
-import requests
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any
+
+from feishu_auth import get_token_provider
+from feishu_client import feishu_client
 
 class FeishuDocWriter:
     """飞书文档写入器"""
@@ -17,33 +19,13 @@ class FeishuDocWriter:
     def __init__(self, app_id: str, app_secret: str):
         self.app_id = app_id
         self.app_secret = app_secret
-        self._tenant_access_token: Optional[str] = None
-        self._token_expire_time: Optional[datetime] = None
         self._wiki_doc_cache: Dict[str, str] = {}  # wiki_token -> document_id
+        # 复用全局连接池（keep-alive），避免每个 Block 批次重新握手
+        self._session = feishu_client.session
 
     def get_tenant_access_token(self) -> str:
-        """获取应用访问凭证"""
-        if (self._tenant_access_token and self._token_expire_time and 
-            datetime.now() < self._token_expire_time):
-            return self._tenant_access_token
-        
-        url = f"{self.BASE_URL}/auth/v3/tenant_access_token/internal"
-        payload = {"app_id": self.app_id, "app_secret": self.app_secret}
-        
-        try:
-            response = requests.post(url, json=payload, timeout=10)
-            result = response.json()
-            if result.get("code") != 0:
-                print(f"❌ 获取access_token失败: {result.get('msg')}")
-                return ""
-            
-            self._tenant_access_token = result["tenant_access_token"]
-            expire_seconds = result.get("expire", 7200) - 300
-            self._token_expire_time = datetime.now() + timedelta(seconds=expire_seconds)
-            return self._tenant_access_token
-        except Exception as e:
-            print(f"❌ 获取access_token异常: {e}")
-            return ""
+        """获取应用访问凭证（与消息发送共用 feishu_auth 的缓存）"""
+        return get_token_provider(self.app_id, self.app_secret).get_token() or ""
 
     def _get_headers(self) -> Dict[str, str]:
         token = self.get_tenant_access_token()
@@ -61,7 +43,7 @@ class FeishuDocWriter:
         params = {"token": wiki_token}
         
         try:
-            response = requests.get(url, headers=self._get_headers(), params=params, timeout=10)
+            response = self._session.get(url, headers=self._get_headers(), params=params, timeout=10)
             result = response.json()
             
             if result.get("code") != 0:
@@ -84,7 +66,9 @@ class FeishuDocWriter:
         url = f"{self.BASE_URL}/docx/v1/documents/{document_id}/blocks/{document_id}/children"
         try:
             # 获取前50个块，假设高亮块在开头
-            response = requests.get(url, headers=self._get_headers(), params={"page_size": 50})
+            response = self._session.get(
+                url, headers=self._get_headers(), params={"page_size": 50}, timeout=feishu_client.timeout
+            )
             if response.status_code != 200:
                 return -1
                 
@@ -111,7 +95,7 @@ class FeishuDocWriter:
         }
         
         try:
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=20)
+            response = self._session.post(url, headers=self._get_headers(), json=payload, timeout=20)
             result = response.json()
             if result.get("code") != 0:
                 print(f"❌ 写入Block失败: {result.get('msg')}")
@@ -0,0 +1,134 @@
+"""
+飞书 tenant_access_token 共享提供者
+==================================
+messaging / doc_writer / update_menu 等所有飞书调用方共用同一个 token：
+1) 缓存到过期前 FEISHU_TOKEN_REFRESH_MARGIN_SEC 秒为止；
+2) 过期时只由一个线程在锁内刷新，其余线程等待后直接复用结果；
+3) 可选的后台线程在过期前主动刷新，请求路径上基本不再出现鉴权 HTTP 调用。
+
+用法：
+    from feishu_auth import get_tenant_access_token
+    token = get_tenant_access_token()  # 失败返回 None
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from config import FEISHU_TOKEN_REFRESH_MARGIN_SEC
+
+load_dotenv()
+
+TOKEN_URL = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+# 刷新失败后的重试间隔（后台线程）
+_RETRY_INTERVAL_SEC = 30
+
+
+class TenantTokenProvider:
+    """单个应用（app_id + app_secret）的 token 缓存，线程安全。"""
+
+    def __init__(self, app_id: str, app_secret: str, refresh_margin: int = FEISHU_TOKEN_REFRESH_MARGIN_SEC):
+        self.app_id = (app_id or "").strip()
+        self.app_secret = (app_secret or "").strip()
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0  # time.monotonic() 时间点
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        self.fetch_count = 0
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    def _fetch(self) -> Optional[str]:
+        """调用鉴权接口；调用方需持有锁。"""
+        data = {"app_id": self.app_id, "app_secret": self.app_secret}
+        try:
+            resp = requests.post(
+                TOKEN_URL,
+                headers={"Content-Type": "application/json; charset=utf-8"},
+                json=data,
+                timeout=10,
+            )
+            result = resp.json() if resp.status_code == 200 else {}
+        except Exception as e:
+            print(f"❌ [FeishuAuth] Failed to get token: {e}")
+            return None
+        self.fetch_count += 1
+        if result.get("code") != 0 or not result.get("tenant_access_token"):
+            print(f"❌ [FeishuAuth] Failed to get token: {resp.text}")
+            return None
+        self._token = result["tenant_access_token"]
+        self._expires_at = time.monotonic() + int(result.get("expire") or 7200)
+        return self._token
+
+    def get_token(self, force_refresh: bool = False) -> Optional[str]:
+        """返回有效 token；需要刷新时只有一个线程真正发起请求。失败返回 None。"""
+        if not force_refresh and self._is_fresh():
+            return self._token
+        with self._lock:
+            # 双重检查：等锁期间可能已被其他线程刷新
+            if not force_refresh and self._is_fresh():
+                return self._token
+            return self._fetch()
+
+    def cached_token(self) -> Optional[str]:
+        """只读缓存：token 仍新鲜时返回，否则返回 None（不发起请求，可在事件循环内调用）。"""
+        return self._token if self._is_fresh() else None
+
+    def invalidate(self) -> None:
+        """丢弃缓存（如接口返回 token 失效时），下次调用重新获取。"""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def start_background_refresh(self) -> None:
+        """启动后台刷新线程（幂等）：在进入刷新窗口时提前换取新 token。"""
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name="feishu-token-refresher", daemon=True
+            )
+            self._refresher.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop.set()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            token = self.get_token()
+            if token is None:
+                wait = _RETRY_INTERVAL_SEC
+            else:
+                wait = max(_RETRY_INTERVAL_SEC, self._expires_at - self.refresh_margin - time.monotonic())
+            if self._stop.wait(wait):
+                return
+
+
+_providers: Dict[Tuple[str, str], TenantTokenProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_token_provider(app_id: Optional[str] = None, app_secret: Optional[str] = None) -> TenantTokenProvider:
+    """按应用凭证返回共享的 provider；不传参数时使用环境变量 LARK_APP_ID / LARK_APP_SECRET。"""
+    app_id = (app_id if app_id is not None else os.getenv("LARK_APP_ID") or "").strip()
+    app_secret = (app_secret if app_secret is not None else os.getenv("LARK_APP_SECRET") or "").strip()
+    key = (app_id, app_secret)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = TenantTokenProvider(app_id, app_secret)
+            _providers[key] = provider
+        return provider
+
+
+def get_tenant_access_token() -> Optional[str]:
+    """默认应用的 tenant_access_token（缓存 + 单飞刷新）。"""
+    return get_token_provider().get_token()
@@ -0,0 +1,215 @@
+"""
+飞书开放平台 HTTP 客户端
+========================
+1) 同步路径：共享的 requests.Session（连接池 + keep-alive），供调度器线程 / 线程池使用；
+2) 异步路径：httpx.AsyncClient（连接池 + keep-alive），供 FastAPI 处理器与 async 图节点使用，
+   不阻塞事件循环；每个事件循环各持有一个客户端（调度器中的 asyncio.run 会创建新循环）；
+3) 统一默认超时、自动带上 tenant_access_token，返回结构化的 FeishuResult 而不是抛异常；
+   接口返回 token 失效时丢弃缓存，下次请求重新获取。
+
+用法：
+    from feishu_client import feishu_client
+    res = feishu_client.request("POST", "/im/v1/messages", params=..., json=...)
+    res = await feishu_client.arequest("PATCH", f"/im/v1/messages/{message_id}", json=...)
+    if not res.ok: print(res.error)
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    FEISHU_HTTP_CONNECT_TIMEOUT_SEC,
+    FEISHU_HTTP_POOL_SIZE,
+    FEISHU_HTTP_READ_TIMEOUT_SEC,
+)
+from feishu_auth import get_token_provider
+
+BASE_URL = "https://open.feishu.cn/open-apis"
+# 飞书 token 无效 / 过期的错误码
+_TOKEN_INVALID_CODES = {99991661, 99991663, 99991668}
+
+
+class FeishuResult:
+    """一次飞书接口调用的结果：HTTP 状态码 + 业务 code/msg/data；网络异常时 error 非空。"""
+
+    __slots__ = ("status_code", "code", "msg", "data", "error")
+
+    def __init__(
+        self,
+        status_code: Optional[int] = None,
+        code: Optional[int] = None,
+        msg: str = "",
+        data: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ):
+        self.status_code = status_code
+        self.code = code
+        self.msg = msg
+        self.data = data or {}
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code == 200 and self.code == 0
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def __repr__(self) -> str:
+        if self.ok:
+            return "FeishuResult(ok)"
+        return f"FeishuResult(status={self.status_code}, code={self.code}, msg={self.msg!r}, error={self.error!r})"
+
+
+def _parse_response(status_code: int, text: str, body: Optional[Dict[str, Any]]) -> FeishuResult:
+    if not isinstance(body, dict):
+        return FeishuResult(status_code, error=f"HTTP {status_code}: {text[:500]}")
+    result = FeishuResult(status_code, body.get("code"), body.get("msg") or "", body.get("data"))
+    if not result.ok:
+        result.error = f"HTTP {status_code} code={result.code} msg={result.msg}"
+    return result
+
+
+class FeishuClient:
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        connect_timeout: float = FEISHU_HTTP_CONNECT_TIMEOUT_SEC,
+        read_timeout: float = FEISHU_HTTP_READ_TIMEOUT_SEC,
+        pool_size: int = FEISHU_HTTP_POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # --- 连接池 ---
+    @property
+    def session(self) -> requests.Session:
+        """共享的同步 Session（doc_writer 等直接拼 URL 的调用方也可复用）。"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def timeout(self):
+        """requests 风格的 (connect, read) 超时。"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+                ),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _headers(self, token: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json; charset=utf-8",
+        }
+
+    def _check_token(self, result: FeishuResult) -> FeishuResult:
+        if result.code in _TOKEN_INVALID_CODES:
+            get_token_provider().invalidate()
+        return result
+
+    # --- 同步 ---
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+    ) -> FeishuResult:
+        token = get_token_provider().get_token()
+        if not token:
+            return FeishuResult(error="no tenant_access_token")
+        try:
+            resp = self.session.request(
+                method,
+                f"{self.base_url}{path}",
+                headers=self._headers(token),
+                params=params,
+                json=json,
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            return FeishuResult(error=f"{type(e).__name__}: {e}")
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        return self._check_token(_parse_response(resp.status_code, resp.text, body))
+
+    # --- 异步 ---
+    async def arequest(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+    ) -> FeishuResult:
+        provider = get_token_provider()
+        # token 通常已在缓存中；需要刷新时才放到线程里执行同步鉴权请求
+        token = provider.cached_token() or await asyncio.to_thread(provider.get_token)
+        if not token:
+            return FeishuResult(error="no tenant_access_token")
+        try:
+            resp = await self._async_client().request(
+                method,
+                f"{self.base_url}{path}",
+                headers=self._headers(token),
+                params=params,
+                json=json,
+            )
+        except httpx.HTTPError as e:
+            return FeishuResult(error=f"{type(e).__name__}: {e}")
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        return self._check_token(_parse_response(resp.status_code, resp.text, body))
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环上的异步客户端。"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+feishu_client = FeishuClient()
@@ -16,7 +16,10 @@ from group_config_loader import (
 )
 from group_message_formatter import format_group_news_message
 from group_news_client import GroupNewsClientError, fetch_group_news
+from config import OUTBOX_ENABLED
 from messaging import send_message
+from metrics import GROUP_PUSH_OUTCOMES
+from push_outbox import send_via_outbox
 
 
 group_delivery_poll_lock = threading.Lock()
@@ -25,6 +28,8 @@ group_delivery_poll_lock = threading.Lock()
 def _log(**fields):
     payload = {"ts": datetime.now(dt_timezone.utc).isoformat(timespec="milliseconds")}
     payload.update(fields)
+    if fields.get("send_result"):
+        GROUP_PUSH_OUTCOMES.inc(send_result=fields["send_result"])
     print(f"[GroupPush] {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))}")
 
 
@@ -278,7 +283,21 @@ def _run_group_delivery_once(
                 timezone_name=group_config["timezone"],
             )
 
-            sent = send_message(chat_id, message_text, receive_id_type="chat_id")
+            send_result = "success"
+            if OUTBOX_ENABLED:
+                # 经 outbox 发送：失败时由 outbox 按退避重试，视为已受理，窗口照常推进
+                outbox_status = send_via_outbox(
+                    f"group_push:{chat_id}:{serialize_runtime_datetime(window_end)}",
+                    chat_id,
+                    message_text,
+                    source="group_push",
+                    receive_id_type="chat_id",
+                )
+                sent = outbox_status != "dead"
+                if outbox_status == "pending":
+                    send_result = "queued_for_retry"
+            else:
+                sent = send_message(chat_id, message_text, receive_id_type="chat_id")
             if not sent:
                 runtime_state["last_error"] = "send_message returned False"
                 _log(
@@ -296,7 +315,7 @@ def _run_group_delivery_once(
             runtime_state["last_error"] = None
             runtime_dirty = True
             _log(
-                send_result="success",
+                send_result=send_result,
                 content_type="news",
                 next_run_at=runtime_state["next_run_at"],
                 error=None,
@@ -0,0 +1,74 @@
+"""
+后台任务队列（入队侧）
+======================
+职责：
+1) Web 进程 / 调度器只把任务（类型 + 参数）写入 SQLite jobs 表，立即返回；
+2) 按分片键（用户 ID，或无用户的任务类型）稳定哈希到固定分片，
+   同一用户的任务总由同一个 worker 进程执行（LangGraph MemorySaver 的会话状态在进程内）；
+3) JOB_HANDLERS 登记任务类型 -> 处理函数（"模块:函数"，worker 进程内按需导入）；
+4) 未启用 worker 时 run_job_inline 在当前进程直接执行，行为与改造前一致。
+
+执行侧见 job_worker.py。
+"""
+
+import asyncio
+import importlib
+import inspect
+import json
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from config import JOB_WORKER_PROCESSES
+from database import enqueue_job as _db_enqueue_job
+from database import get_job_stats
+
+# 任务类型 -> 处理函数；参数以关键字形式传入
+JOB_HANDLERS: Dict[str, str] = {
+    "lark_message": "lark_service:process_lark_message",
+    "card_expand": "lark_service:handle_card_action_async",
+    "generate_news": "lark_service:generate_news_task",
+    "refresh_news": "lark_service:refresh_news_task",
+    "daily_archive_push": "lark_service:daily_archive_and_push_job",
+    "archive_wiki": "lark_service:archive_daily_news_to_wiki",
+}
+
+
+def shard_for(key: str, shards: int = JOB_WORKER_PROCESSES) -> int:
+    """稳定分片（crc32；内置 hash() 对字符串按进程随机化，不能跨进程使用）。"""
+    return zlib.crc32(str(key).encode("utf-8")) % max(1, shards)
+
+
+def resolve_handler(kind: str) -> Callable:
+    module_name, func_name = JOB_HANDLERS[kind].split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def enqueue_job(kind: str, payload: Optional[Dict[str, Any]] = None, shard_key: Optional[str] = None) -> int:
+    """入队一个任务，返回 job id。shard_key 缺省时按任务类型分片（同类任务串行执行）。"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    shard = shard_for(shard_key or kind)
+    job_id = _db_enqueue_job(kind, json.dumps(payload or {}, ensure_ascii=False), shard)
+    print(f"📥 [JobQueue] Enqueued {kind} job={job_id} shard={shard}")
+    return job_id
+
+
+def run_job_inline(kind: str, payload: Optional[Dict[str, Any]] = None) -> Any:
+    """在当前线程直接执行任务（async 处理函数用独立事件循环运行）。"""
+    handler = resolve_handler(kind)
+    if inspect.iscoroutinefunction(handler):
+        return asyncio.run(handler(**(payload or {})))
+    return handler(**(payload or {}))
+
+
+def job_report() -> Dict[str, Any]:
+    stats = get_job_stats()
+    counts = stats["counts"]
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "queued_by_kind": stats["queued_by_kind"],
+        "oldest_queued_at": stats["oldest_queued_at"],
+    }
@@ -0,0 +1,176 @@
+"""
+后台任务 worker 进程
+====================
+职责：
+1) 每个 worker 进程负责一个分片：启动时先恢复上次退出时未完成的任务，然后由若干线程轮询领取、执行；
+   每个线程持有自己的事件循环，async 处理函数（如 run_agent 回复）直接在该循环中运行；
+2) WorkerPool 由调度器 leader 所在的 Web 进程拉起（spawn，独立解释器与 GIL），看门狗定期重启意外退出的进程，
+   Web 进程关闭时一并终止；leader 崩溃时 worker 检测到父进程退出后自行结束，由新 leader 重新拉起；
+3) LLM 密集的 agent 运行、日报生成、归档与推送都在 worker 中执行，webhook 延迟不受后台负载影响。
+
+用法：
+    python job_worker.py --shard 0   # 单独运行一个分片（不经 WorkerPool；分片总数取 JOB_WORKER_PROCESSES）
+    python job_worker.py --report    # 查看任务队列深度
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from typing import List, Optional
+
+import database
+from config import (
+    FEISHU_TOKEN_BACKGROUND_REFRESH,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL_SEC,
+    JOB_WORKER_PROCESSES,
+    JOB_WORKER_THREADS,
+)
+from job_queue import JOB_HANDLERS, job_report, resolve_handler
+from metrics import start_snapshot_flusher
+from readiness import warm_up
+
+
+def _run_job(job: dict, loop: asyncio.AbstractEventLoop) -> None:
+    payload = json.loads(job["payload"])
+    handler = resolve_handler(job["kind"])
+    if inspect.iscoroutinefunction(handler):
+        loop.run_until_complete(handler(**payload))
+    else:
+        handler(**payload)
+
+
+def _worker_thread(shard: int, worker_name: str, stop: threading.Event) -> None:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    while not stop.is_set():
+        try:
+            job = database.claim_job(shard, worker_name)
+        except Exception as e:
+            print(f"⚠️ [JobWorker] Claim failed on shard {shard}: {e}")
+            job = None
+        if job is None:
+            stop.wait(JOB_POLL_INTERVAL_SEC)
+            continue
+        started_at = time.perf_counter()
+        error = None
+        try:
+            _run_job(job, loop)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        elapsed_ms = int((time.perf_counter() - started_at) * 1000)
+        try:
+            database.finish_job(job["id"], error)
+        except Exception as e:
+            print(f"⚠️ [JobWorker] Finish job={job['id']} failed: {e}")
+        status = "❌ failed" if error else "✅ done"
+        print(f"{status} [JobWorker] {job['kind']} job={job['id']} shard={shard} elapsed_ms={elapsed_ms}")
+
+
+def worker_main(shard: int, db_file: Optional[str] = None) -> None:
+    """worker 进程入口：恢复本分片遗留任务后启动轮询线程（阻塞直到进程被终止）。"""
+    if db_file:
+        database.DB_FILE = db_file
+    requeued, failed = database.recover_shard_jobs(shard, JOB_MAX_ATTEMPTS)
+    if requeued or failed:
+        print(f"♻️ [JobWorker] Shard {shard}: requeued={requeued} failed={failed} interrupted jobs")
+
+    # 预先导入全部处理函数，并预热 LLM 客户端与图（均为懒加载），首个任务不再承担初始化耗时
+    for kind in JOB_HANDLERS:
+        resolve_handler(kind)
+    warm_up(agent_in_process=True)
+
+    if FEISHU_TOKEN_BACKGROUND_REFRESH:
+        from feishu_auth import get_token_provider
+
+        get_token_provider().start_background_refresh()
+
+    stop = threading.Event()
+    worker_name = f"shard{shard}-pid{os.getpid()}"
+    # 指标快照定期写库，由 Web 进程的 /metrics 合并输出
+    start_snapshot_flusher(worker_name)
+    threads = [
+        threading.Thread(target=_worker_thread, args=(shard, f"{worker_name}-t{i}", stop), daemon=True)
+        for i in range(max(1, JOB_WORKER_THREADS))
+    ]
+    for thread in threads:
+        thread.start()
+    print(f"👷 [JobWorker] {worker_name} started ({len(threads)} threads)")
+    # 由 WorkerPool 拉起时跟随父进程退出：leader 崩溃后由新 leader 重新拉起，避免同一分片出现两组 worker
+    parent = multiprocessing.parent_process()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            if parent is not None and not parent.is_alive():
+                print(f"🛑 [JobWorker] {worker_name} parent exited, stopping")
+                break
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+
+
+class WorkerPool:
+    """每个分片一个 worker 进程（spawn 启动，不继承 Web 进程的线程与连接）。"""
+
+    def __init__(self):
+        # 分片数与 job_queue.shard_for 一致，固定取 JOB_WORKER_PROCESSES
+        self.processes = max(1, JOB_WORKER_PROCESSES)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: List[Optional[multiprocessing.Process]] = [None] * self.processes
+        self._lock = threading.Lock()
+
+    def _spawn(self, shard: int) -> None:
+        proc = self._ctx.Process(
+            target=worker_main,
+            args=(shard, database.DB_FILE),
+            name=f"job-worker-{shard}",
+            daemon=True,
+        )
+        proc.start()
+        self._procs[shard] = proc
+
+    def start(self) -> None:
+        with self._lock:
+            for shard in range(self.processes):
+                self._spawn(shard)
+        print(f"✅ [JobWorker] Started {self.processes} worker processes")
+
+    def ensure_alive(self) -> None:
+        """看门狗：重启意外退出的 worker（新进程启动时会恢复该分片被中断的任务）。"""
+        with self._lock:
+            for shard, proc in enumerate(self._procs):
+                if proc is not None and not proc.is_alive():
+                    print(f"⚠️ [JobWorker] Worker for shard {shard} exited (code={proc.exitcode}), restarting")
+                    self._spawn(shard)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            for proc in self._procs:
+                if proc is not None and proc.is_alive():
+                    proc.terminate()
+            for proc in self._procs:
+                if proc is not None:
+                    proc.join(timeout)
+            self._procs = [None] * self.processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台任务 worker")
+    parser.add_argument("--shard", type=int, help="运行指定分片的 worker")
+    parser.add_argument("--report", action="store_true", help="打印任务队列深度")
+    args = parser.parse_args()
+    if args.report or args.shard is None:
+        print(json.dumps(job_report(), ensure_ascii=False, indent=2))
+        return
+    worker_main(args.shard)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,22 @@ from agent_graph import NewsBriefing
 import json
 from datetime import datetime
 
-def build_cover_card(briefing: NewsBriefing, generated_at: str = None, category: str = "AI") -> str:
-    """
-    构建飞书早报封面卡片
-    新结构：今日头条 + 深度专题按钮
-    """
-    
-    # 0. 动态标题映射
-    title_map = {
-        "AI": "AI每日新闻",
-        "GAMES": "游戏每日新闻",
-        "MUSIC": "音乐每日新闻",
-        "SHORT_DRAMA": "短剧每日新闻"
-    }
+# 动态标题映射
+CARD_TITLE_MAP = {
+    "AI": "AI每日新闻",
+    "GAMES": "游戏每日新闻",
+    "MUSIC": "音乐每日新闻",
+    "SHORT_DRAMA": "短剧每日新闻"
+}
+
+
+def _card_title(category: str) -> str:
     # 默认兜底
-    card_title = title_map.get(category, f"☕️ {category} 行业早报")
-    
-    # 1. 格式化时间字符串
+    return CARD_TITLE_MAP.get(category, f"☕️ {category} 行业早报")
+
+
+def _format_generated_time(generated_at) -> str:
+    """格式化生成时间为 HH:MM；缺失或无法解析时使用当前时间。"""
     time_str = datetime.now().strftime('%H:%M')
     if generated_at:
         try:
@@ -29,15 +28,23 @@ def build_cover_card(briefing: NewsBriefing, generated_at: str = None, category:
             time_str = dt.strftime('%H:%M')
         except:
             pass
-    
-    # 2. 组装今日头条文本（来自 headlines）
-    headlines_md = "**🔥 今日头条**\n"
+    return time_str
+
+
+def _headlines_markdown(briefing: NewsBriefing, heading: str = "**🔥 今日头条**") -> str:
+    """组装今日头条文本（来自 headlines）"""
+    headlines_md = f"{heading}\n"
     for i, headline in enumerate(briefing.headlines, 1):
         headlines_md += f"{i}. [{headline.title}]({headline.url})\n"
+    return headlines_md
 
-    # 3. 组装深度专题按钮（每个 Cluster 一个按钮）
+
+def _cluster_actions(briefing: NewsBriefing, category: str, pending: list) -> list:
+    """组装深度专题按钮（每个 Cluster 一个按钮，按钮携带类别供展开时定位）"""
     actions = []
     for cluster in briefing.clusters:
+        if cluster.name in pending:
+            continue
         btn_text = f"👉 {cluster.name} ({len(cluster.items)})"
         action_btn = {
             "tag": "button",
@@ -49,11 +56,43 @@ def build_cover_card(briefing: NewsBriefing, generated_at: str = None, category:
             "value": {"command": "expand", "target": cluster.name, "category": category}
         }
         actions.append(action_btn)
+    return actions
+
+
+def build_cover_card(
+    briefing: NewsBriefing,
+    generated_at: str = None,
+    category: str = "AI",
+    pending_clusters: list = None,
+    failed_clusters: list = None,
+) -> str:
+    """
+    构建飞书早报封面卡片
+    新结构：今日头条 + 深度专题按钮
+
+    pending_clusters: 渐进式投递时仍在生成中的专题名，这些专题暂不出按钮，
+    仅在底部提示“生成中”，待完成后通过 update_message 原位补齐。
+    failed_clusters: 渐进式投递中途失败时未能生成的专题名，不出按钮，底部提示“暂不可用”（卡片终态）。
+    """
+    pending = [name for name in (pending_clusters or [])]
+    failed = [name for name in (failed_clusters or [])]
+    card_title = _card_title(category)
+    time_str = _format_generated_time(generated_at)
+    headlines_md = _headlines_markdown(briefing)
+    actions = _cluster_actions(briefing, category, pending + failed)
     
+    note_text = f"⏰ 生成于 {time_str}"
+    if pending:
+        note_text += f" · ⏳ 专题生成中：{'、'.join(pending)}"
+    if failed:
+        note_text += f" · ⚠️ 专题暂不可用，请稍后重试：{'、'.join(failed)}"
+
     # 4. 组装最终 Card JSON
+    # update_multi: 共享卡片，允许通过 PATCH 接口原位更新（渐进式投递依赖）
     card = {
         "config": {
-            "wide_screen_mode": True
+            "wide_screen_mode": True,
+            "update_multi": True
         },
         "header": {
             "template": "blue",
@@ -88,7 +127,7 @@ def build_cover_card(briefing: NewsBriefing, generated_at: str = None, category:
                 "tag": "note",
                 "elements": [
                     {
-                        "content": f"⏰ 生成于 {time_str}",
+                        "content": note_text,
                         "tag": "plain_text"
                     }
                 ]
@@ -96,6 +135,72 @@ def build_cover_card(briefing: NewsBriefing, generated_at: str = None, category:
         ]
     }
     
+    # 专题全部仍在生成时，飞书不接受空的 action 组件
+    if not actions:
+        card["elements"] = [el for el in card["elements"] if el.get("tag") != "action"]
+    
+    return json.dumps(card, ensure_ascii=False)
+
+
+def build_multi_cover_card(sections: list) -> str:
+    """
+    构建多订阅合并卡片：每个类别一段（头条 + 专题按钮），段间用分隔线隔开。
+
+    sections: [{"category": str, "briefing": NewsBriefing | None, "generated_at": str | None}]
+    briefing 为 None 表示该类别本次生成失败，仅显示提示文案。
+    """
+    elements = []
+    time_parts = []
+    for section in sections:
+        category = section["category"]
+        briefing = section.get("briefing")
+        if elements:
+            elements.append({"tag": "hr"})
+        if briefing is None:
+            elements.append({
+                "tag": "div",
+                "text": {
+                    "content": f"**{_card_title(category)}**\n⚠️ 暂未获取到今日日报，请稍后单独查看该类别。",
+                    "tag": "lark_md"
+                }
+            })
+            continue
+        elements.append({
+            "tag": "div",
+            "text": {
+                "content": _headlines_markdown(briefing, heading=f"**🔥 {_card_title(category)}**"),
+                "tag": "lark_md"
+            }
+        })
+        actions = _cluster_actions(briefing, category, [])
+        if actions:
+            elements.append({"tag": "action", "actions": actions})
+        time_parts.append(f"{category} {_format_generated_time(section.get('generated_at'))}")
+
+    elements.append({
+        "tag": "note",
+        "elements": [
+            {
+                "content": f"⏰ 生成于 {' · '.join(time_parts) or datetime.now().strftime('%H:%M')}",
+                "tag": "plain_text"
+            }
+        ]
+    })
+
+    card = {
+        "config": {
+            "wide_screen_mode": True,
+            "update_multi": True
+        },
+        "header": {
+            "template": "blue",
+            "title": {
+                "content": f"我的订阅日报（{' · '.join(s['category'] for s in sections)}）",
+                "tag": "plain_text"
+            }
+        },
+        "elements": elements
+    }
     return json.dumps(card, ensure_ascii=False)
 
 
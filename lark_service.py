@@ -3,32 +3,36 @@ from fastapi import FastAPI
 import uvicorn
 import json
 from fastapi import BackgroundTasks, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import time
 
-from agent_graph import graph
+import agent_graph  # graph 懒编译：首次访问 agent_graph.graph 时才组装（由启动预热线程提前触发）
 from langchain_core.messages import HumanMessage
-from messaging import reply_message, send_message, update_message
+from messaging import areply_message, asend_message, send_message, update_message
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import date, datetime, timedelta, timezone as dt_timezone
 from database import (
     save_cached_news,
     get_cached_news,
     init_db,
-    add_subscription,
-    get_subscriptions,
-    list_all_subscriptions,
-    replace_subscriptions,
 )
+import async_database as adb
+import database
 import asyncio
 import threading
 from pytz import timezone
-from collections import deque
 from lark_card_builder import build_manage_subscribe_card
+from ttl_set import TTLSet
+from config import ACTION_DEDUP_MAX_KEYS, EVENT_DEDUP_MAX_KEYS, EVENT_DEDUP_PERSIST, EVENT_DEDUP_TTL_SEC
 from group_push_service import poll_group_delivery_task
 
-# 事件去重队列
-processed_events = deque(maxlen=100)
+# 事件去重：按 event_id 保留 EVENT_DEDUP_TTL_SEC，持久化到 SQLite，重启后仍能识别飞书重试
+processed_events = TTLSet(
+    ttl_sec=EVENT_DEDUP_TTL_SEC,
+    max_size=EVENT_DEDUP_MAX_KEYS,
+    namespace="lark_event" if EVENT_DEDUP_PERSIST else None,
+)
 
 # 初始化调度器（使用北京时区）
 beijing_tz = timezone('Asia/Shanghai')
@@ -36,12 +40,19 @@ scheduler = BackgroundScheduler(timezone=beijing_tz)
 daily_archive_push_lock = threading.Lock()
 manage_subscribe_state_lock = threading.Lock()
 pending_manage_subscriptions = {}
-manage_subscribe_action_dedup_lock = threading.Lock()
-recent_manage_subscribe_actions = {}
+# 卡片点击去重同样经 SQLite 抢占：飞书的重复回调可能落到另一个 Web 进程
 MANAGE_SUBSCRIBE_ACTION_DEDUP_WINDOW_SEC = 3.0
-expand_action_dedup_lock = threading.Lock()
-recent_expand_actions = {}
+recent_manage_subscribe_actions = TTLSet(
+    ttl_sec=MANAGE_SUBSCRIBE_ACTION_DEDUP_WINDOW_SEC,
+    max_size=ACTION_DEDUP_MAX_KEYS,
+    namespace="lark_manage_subscribe_action" if EVENT_DEDUP_PERSIST else None,
+)
 EXPAND_ACTION_DEDUP_WINDOW_SEC = 8.0
+recent_expand_actions = TTLSet(
+    ttl_sec=EXPAND_ACTION_DEDUP_WINDOW_SEC,
+    max_size=ACTION_DEDUP_MAX_KEYS,
+    namespace="lark_expand_action" if EVENT_DEDUP_PERSIST else None,
+)
 
 
 def _event_log(**fields):
@@ -109,40 +120,12 @@ def _normalize_selected_categories(action_obj, allowed_categories):
 
 def _is_duplicate_manage_subscribe_action(action_key: str) -> bool:
     """短窗口去重：防止同一次点击被双回调重复处理。"""
-    now = time.monotonic()
-    with manage_subscribe_action_dedup_lock:
-        expired = [
-            key for key, ts in recent_manage_subscribe_actions.items()
-            if now - ts > MANAGE_SUBSCRIBE_ACTION_DEDUP_WINDOW_SEC
-        ]
-        for key in expired:
-            recent_manage_subscribe_actions.pop(key, None)
-
-        last_ts = recent_manage_subscribe_actions.get(action_key)
-        if last_ts is not None and (now - last_ts) <= MANAGE_SUBSCRIBE_ACTION_DEDUP_WINDOW_SEC:
-            return True
-
-        recent_manage_subscribe_actions[action_key] = now
-        return False
+    return not recent_manage_subscribe_actions.add(action_key)
 
 
 def _is_duplicate_expand_action(action_key: str) -> bool:
     """短窗口去重：防止同一次 expand 点击被双回调重复处理。"""
-    now = time.monotonic()
-    with expand_action_dedup_lock:
-        expired = [
-            key for key, ts in recent_expand_actions.items()
-            if now - ts > EXPAND_ACTION_DEDUP_WINDOW_SEC
-        ]
-        for key in expired:
-            recent_expand_actions.pop(key, None)
-
-        last_ts = recent_expand_actions.get(action_key)
-        if last_ts is not None and (now - last_ts) <= EXPAND_ACTION_DEDUP_WINDOW_SEC:
-            return True
-
-        recent_expand_actions[action_key] = now
-        return False
+    return not recent_expand_actions.add(action_key)
 
 # def pre_generate_daily_news():
 #     """(已弃用) 每天9点：预生成4个类别的早报"""
@@ -150,7 +133,114 @@ def _is_duplicate_expand_action(action_key: str) -> bool:
 
 # --- 任务分离：生成与推送 ---
 
-from config import DAILY_NEWS_CATEGORIES
+from config import (
+    DAILY_NEWS_CATEGORIES,
+    NEWS_INCREMENTAL_REFRESH_ENABLED,
+    NEWS_INCREMENTAL_REFRESH_HOURS,
+    DB_MAINTENANCE_ENABLED,
+    DB_MAINTENANCE_HOUR,
+    FEISHU_TOKEN_BACKGROUND_REFRESH,
+    OUTBOX_DRAIN_INTERVAL_SEC,
+    OUTBOX_ENABLED,
+    JOB_WORKERS_ENABLED,
+    WEB_WORKERS,
+)
+from feishu_auth import get_token_provider
+from news_incremental import build_refresh_state
+from briefing_cache import get_cluster_detail, get_cover_card
+from delivery_planner import plan_deliveries
+from push_dispatcher import run_dispatch
+from push_outbox import drain_outbox, enqueue_units, outbox_report
+from db_maintenance import run_db_maintenance
+from job_queue import enqueue_job, job_report, run_job_inline
+from job_worker import WorkerPool
+from scheduler_leader import LeaderElection
+from readiness import readiness, start_warmup
+from admission import BUSY_TEXT, BUSY_TOAST, admission, admit_job, classify_message, should_notify_busy
+from metrics import (
+    WEBHOOK_LATENCY,
+    gauge_lines,
+    load_process_snapshots,
+    process_name as metrics_process_name,
+    register_collector,
+    render as render_metrics,
+    start_snapshot_flusher,
+)
+
+# 后台任务 worker 进程池（JOB_WORKERS_ENABLED 时在 lifespan 中启动）
+worker_pool = WorkerPool() if JOB_WORKERS_ENABLED else None
+
+
+def _queue_depth_metrics():
+    """/metrics 抓取时现查的队列深度：后台任务与推送 outbox。"""
+    jobs = job_report()
+    outbox = outbox_report()
+    job_lag = time.time() - jobs["oldest_queued_at"] if jobs["oldest_queued_at"] else 0
+    return (
+        gauge_lines(
+            "rss_agent_jobs", "Background jobs by status",
+            [({"status": status}, jobs[status]) for status in ("queued", "running", "done", "failed")],
+        )
+        + gauge_lines(
+            "rss_agent_jobs_queued_by_kind", "Queued background jobs by kind",
+            [({"kind": kind}, count) for kind, count in sorted(jobs["queued_by_kind"].items())],
+        )
+        + gauge_lines("rss_agent_jobs_lag_seconds", "Age of the oldest queued job", [({}, round(job_lag, 1))])
+        + gauge_lines(
+            "rss_agent_outbox_messages", "Push outbox messages by status",
+            [({"status": status}, outbox[status]) for status in ("pending", "sending", "sent", "dead")],
+        )
+        + gauge_lines("rss_agent_outbox_lag_seconds", "Age of the oldest unsent outbox message", [({}, outbox["lag_sec"] or 0)])
+    )
+
+
+register_collector(_queue_depth_metrics)
+
+
+def _message_text(event_data):
+    try:
+        return json.loads(event_data["message"]["content"]).get("text", "")
+    except Exception:
+        return ""
+
+
+async def _run_admitted(task_class, user_id, fn, *args):
+    """在 Web 进程内执行的后台任务：结束时归还准入名额。"""
+    try:
+        await fn(*args)
+    finally:
+        admission.release(task_class, user_id)
+
+
+def _reject_busy(background_tasks, event_id, task_class, reason, user_id, message_id=None, send_notice=True):
+    """准入拒绝：记日志；需要时在响应返回后发送繁忙提示（同一用户限频）。"""
+    notify = send_notice and should_notify_busy(user_id)
+    _event_log(
+        log_type="admission",
+        decision="rejected",
+        event_id=event_id,
+        task_class=task_class,
+        reason=reason,
+        user_id=user_id,
+        notified=notify,
+    )
+    if not notify:
+        return
+    if message_id:
+        background_tasks.add_task(areply_message, message_id, BUSY_TEXT)
+    elif user_id:
+        background_tasks.add_task(asend_message, user_id, BUSY_TEXT)
+
+
+def submit_job(kind, shard_key=None, **payload):
+    """
+    调度器 / 处理器统一入口：启用 worker 时只入队（Web 进程立即返回），
+    否则在当前线程直接执行（与改造前一致）。
+    """
+    if JOB_WORKERS_ENABLED:
+        return enqueue_job(kind, payload, shard_key=shard_key)
+    return run_job_inline(kind, payload)
+
 
 def generate_news_task(force=True):
     """
@@ -178,7 +268,7 @@ def generate_news_task(force=True):
             # 1. 生成新闻
             # 关键改动：直接传入 user_preference=category，跳过 router 解析和数据库查询
             # force_refresh=True 强制重新抓取新闻，不使用缓存
-            content, briefing_data = run_agent(
+            res = _invoke_agent(
                 user_id=category_user_id,  # ← 使用独立的 thread_id
                 text="生成日报",  # 文本不再重要，仅作占位
                 force_refresh=True,
@@ -186,9 +276,7 @@ def generate_news_task(force=True):
             )
             
             # 2. 存根
-            if briefing_data:
-                briefing_data_str = json.dumps(briefing_data, ensure_ascii=False)
-                save_cached_news(category, content, today, briefing_data_str)
+            if _save_agent_result(category, today, res):
                 print(f"💾 [Chef] Saved cache for {category}. Ready to serve.")
             else:
                 print(f"⚠️ [Chef] No data generated for {category}")
@@ -196,25 +284,91 @@ def generate_news_task(force=True):
         except Exception as e:
             print(f"❌ [Chef] Failed for {category}: {e}")
 
+
+def _save_agent_result(category, date_str, res):
+    """将一次 agent 运行结果写入日报缓存（含增量刷新快照）；无简报时返回 False。"""
+    briefing_data = res.get("briefing_data")
+    if not briefing_data:
+        return False
+    refresh_state = build_refresh_state(
+        res.get("refresh_snapshot"),
+        res.get("scored_events"),
+        res.get("rewrite_texts"),
+    )
+    save_cached_news(
+        category,
+        res["messages"][-1].content,
+        date_str,
+        json.dumps(briefing_data, ensure_ascii=False),
+        refresh_state,
+    )
+    return True
+
+
+def refresh_news_task():
+    """
+    🔁 日内增量刷新：只处理上次生成之后新增的文章。
+    今日尚无缓存（或缓存缺少增量快照）的类别会在 fetcher 内自动退回全量生成。
+    """
+    today = date.today().isoformat()
+    print(f"🔁 [Refresh] Starting incremental refresh for categories: {DAILY_NEWS_CATEGORIES}...")
+
+    for category in DAILY_NEWS_CATEGORIES:
+        category_user_id = f"system_daily_bot_{category}"
+        try:
+            res = _invoke_agent(
+                user_id=category_user_id,
+                text="增量刷新日报",
+                user_preference=category,
+                refresh_mode="incremental",
+            )
+            # rewrite_event_ids == [] 表示没有新事件（或评分失败沿用旧结果），无需覆盖缓存
+            if res.get("rewrite_event_ids") == []:
+                print(f"⏩ [Refresh] No changes for {category}.")
+                continue
+            if _save_agent_result(category, today, res):
+                changed = res.get("rewrite_event_ids")
+                print(
+                    f"💾 [Refresh] Saved cache for {category}. "
+                    f"changed_events={len(changed) if changed is not None else 'all'}"
+                )
+            else:
+                print(f"⚠️ [Refresh] No data generated for {category}")
+        except Exception as e:
+            print(f"❌ [Refresh] Failed for {category}: {e}")
+
 def push_delivery_task():
     """🛵 外卖员任务：推送最新的新闻"""
     today = date.today().isoformat()
-    subscriptions = list_all_subscriptions()
+    # 按类别一次性取货：规划成本只与类别数相关，与订阅数无关
+    units, misses = plan_deliveries(today)
     
-    from messaging import send_message
+    total_users = sum(len(unit.user_ids) for unit in units)
+    print(f"🛵 [Delivery] Starting daily push dispatch... ({len(units)} units, {total_users} recipients)")
     
-    print(f"🛵 [Delivery] Starting daily push dispatch... ({len(subscriptions)} subscriptions)")
-    
-    for user_id, category in subscriptions:
-        # 1. 只是去取货
-        cached_data = get_cached_news(category, today)
-        
-        if cached_data and cached_data.get("content"):
-            print(f"📤 [Delivery] Pushing {category} news to {user_id}")
-            send_message(user_id, cached_data["content"])
-        else:
-            print(f"⚠️ [Delivery] No food ready for {user_id}/{category} (Cache miss)")
-            # 可选：这里可以触发一次 generate_news_task() 作为补救
+    for category, user_ids in misses.items():
+        print(f"⚠️ [Delivery] No food ready for {category} (Cache miss), skip {len(user_ids)} users")
+        # 可选：这里可以触发一次 generate_news_task() 作为补救
+
+    for unit in units:
+        print(f"📤 [Delivery] Pushing {unit.category} news to {len(unit.user_ids)} users")
+    if not units:
+        return
+
+    if OUTBOX_ENABLED:
+        # 先落库再发送：失败的消息按退避重试，重启或重跑时按幂等键跳过已发送的用户
+        enqueued = enqueue_units(units, today)
+        print(f"📮 [Delivery] Enqueued {enqueued} new messages ({total_users - enqueued} already queued)")
+        summary = drain_outbox()
+        _event_log(log_type="push_outbox", date=today, enqueued=enqueued, drain=summary, outbox=outbox_report())
+        return
+
+    # 有界并发 + 令牌桶限速发送，慢响应不再拖慢排在后面的用户
+    stats = run_dispatch(units)
+    print(f"✅ [Delivery] Dispatch finished: {stats.summary()}")
+    _event_log(log_type="push_dispatch", date=today, **stats.as_dict())
+    for user_id, error in stats.failures[:20]:
+        print(f"❌ [Delivery] Push failed for {user_id}: {error}")
 
 def daily_archive_and_push_job():
     """统一定时任务：先归档，再推送。"""
@@ -234,28 +388,24 @@ def daily_archive_and_push_job():
     finally:
         daily_archive_push_lock.release()
 
-# 使用 FastAPI 推荐的 lifespan 方式（用于优雅关闭和避免重复初始化）
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup - 只在 worker 进程中执行（避免 reload 模式下的重复初始化）
-    print("📦 Initializing database...")
-    init_db()
-    
+def start_scheduler():
+    """leader 职责：登记并启动定时任务、拉起后台任务 worker（由 LeaderElection 在选主成功时调用）。"""
     print("⏰ Starting Scheduler...")
     # # 1. 厨师任务：北京时间 8:00 - 22:00，每2小时做一次饭
     # scheduler.add_job(generate_news_task, 'cron', hour='8-22/2', minute=0, timezone=beijing_tz)
     # 1. 厨师任务：北京时间每天 8:00 执行一次
-    scheduler.add_job(generate_news_task, 'cron', hour=8, minute=0, timezone=beijing_tz)
+    scheduler.add_job(submit_job, 'cron', args=["generate_news"], hour=8, minute=0, timezone=beijing_tz)
 
     
     # 2. 也是厨师任务：刚开业（启动服务）时先做一顿
     # 关键：这里 force=False，如果数据库里已经有菜了，就不重做了 (避免热重载时疯狂生成)
-    scheduler.add_job(generate_news_task, 'date', run_date=datetime.now(beijing_tz) + timedelta(seconds=5), kwargs={"force": False})
+    scheduler.add_job(submit_job, 'date', args=["generate_news"], run_date=datetime.now(beijing_tz) + timedelta(seconds=5), kwargs={"force": False})
     
     # 3. 统一任务：北京时间每天 09:10，先归档再推送
     scheduler.add_job(
-        daily_archive_and_push_job,
+        submit_job,
         'cron',
+        args=["daily_archive_push"],
         id='daily_archive_and_push_job',
         hour=9,
         minute=10,
@@ -265,6 +415,49 @@ async def lifespan(app: FastAPI):
         coalesce=True,
     )
 
+    # 4. 日内增量刷新：每小时只处理新增文章，保持日报新鲜
+    if NEWS_INCREMENTAL_REFRESH_ENABLED:
+        scheduler.add_job(
+            submit_job,
+            'cron',
+            args=["refresh_news"],
+            id='incremental_refresh_job',
+            hour=NEWS_INCREMENTAL_REFRESH_HOURS,
+            minute=30,
+            timezone=beijing_tz,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # 5. 数据库保留与压缩：过期缓存归档 + 增量 VACUUM / ANALYZE
+    if DB_MAINTENANCE_ENABLED:
+        scheduler.add_job(
+            run_db_maintenance,
+            'cron',
+            id='db_maintenance_job',
+            hour=DB_MAINTENANCE_HOUR,
+            minute=0,
+            timezone=beijing_tz,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
+    # 6. 推送 outbox：发送到期的重试消息与重启前未发完的消息
+    if OUTBOX_ENABLED:
+        scheduler.add_job(
+            drain_outbox,
+            'interval',
+            id='outbox_drain_job',
+            seconds=OUTBOX_DRAIN_INTERVAL_SEC,
+            timezone=beijing_tz,
+            next_run_time=datetime.now(beijing_tz) + timedelta(seconds=30),
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
     scheduler.add_job(
         poll_group_delivery_task,
         'interval',
@@ -277,14 +470,60 @@ async def lifespan(app: FastAPI):
         coalesce=True,
     )
     
+    # 7. 后台任务 worker：agent 运行 / 生成 / 归档推送在独立进程中执行，看门狗重启意外退出的进程
+    if worker_pool is not None:
+        worker_pool.start()
+        scheduler.add_job(
+            worker_pool.ensure_alive,
+            'interval',
+            id='job_worker_watchdog',
+            seconds=30,
+            timezone=beijing_tz,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
     scheduler.start()
     print(f"✅ Scheduler started with timezone: {beijing_tz}")
+
+
+# 调度器选主：锁文件与数据库同目录，同一台机器上的 Web 进程共享
+scheduler_elector = LeaderElection(f"{database.DB_FILE}.scheduler.lock", on_elected=start_scheduler)
+
+# 使用 FastAPI 推荐的 lifespan 方式（用于优雅关闭和避免重复初始化）
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup - 只在 worker 进程中执行（避免 reload 模式下的重复初始化）
+    print("📦 Initializing database...")
+    init_db()
+    # 载入重启前登记的事件 ID（飞书可能在重启后重试之前的事件）
+    processed_events.preload()
+    recent_manage_subscribe_actions.preload()
+    recent_expand_actions.preload()
+    # 后台预热 token / LLM 客户端 / 图（agent 在 worker 进程执行时 Web 进程只需 token），进度见 /ready
+    start_warmup(agent_in_process=not JOB_WORKERS_ENABLED)
+    # 本进程指标快照定期写库（多 Web 进程时任一进程的 /metrics 都能合并输出）
+    start_snapshot_flusher(metrics_process_name())
+
+    # 飞书 token 后台提前刷新：推送 / 回复路径上不再等待鉴权接口
+    if FEISHU_TOKEN_BACKGROUND_REFRESH:
+        get_token_provider().start_background_refresh()
+    
+    # 多 Web 进程时只有 leader 启动调度器与 worker 进程池；其余进程只处理 webhook，leader 退出后自动接管
+    scheduler_elector.start()
     
     yield
     
-    # Shutdown (优雅关闭调度器)
-    print("🛑 Shutting down scheduler...")
-    scheduler.shutdown()
+    # Shutdown (优雅关闭调度器；follower 进程未启动调度器)
+    if scheduler_elector.is_leader:
+        print("🛑 Shutting down scheduler...")
+        scheduler.shutdown()
+        if worker_pool is not None:
+            worker_pool.stop()
+    scheduler_elector.stop()
+    get_token_provider().stop_background_refresh()
+    adb.shutdown_db_executor()
 
 # 创建一个 App 实例，使用 lifespan
 app = FastAPI(lifespan=lifespan)
@@ -299,7 +538,58 @@ def run_agent(
     selected_category=None,
 ):
     """
-    运行 LangGraph Agent
+    运行 LangGraph Agent，返回 (content, briefing_data)。参数见 _invoke_agent。
+    """
+    res = _invoke_agent(
+        user_id,
+        text,
+        message_id=message_id,
+        force_refresh=force_refresh,
+        user_preference=user_preference,
+        selected_cluster=selected_cluster,
+        selected_category=selected_category,
+    )
+    content = res["messages"][-1].content
+    briefing_data = res.get("briefing_data")
+    return content, briefing_data
+
+
+async def arun_agent(
+    user_id,
+    text,
+    message_id=None,
+    force_refresh=False,
+    user_preference=None,
+    selected_cluster=None,
+    selected_category=None,
+):
+    """
+    run_agent 的 async 版本（graph.ainvoke），供 async 事件处理直接 await。
+    """
+    res = await _ainvoke_agent(
+        user_id,
+        text,
+        message_id=message_id,
+        force_refresh=force_refresh,
+        user_preference=user_preference,
+        selected_cluster=selected_cluster,
+        selected_category=selected_category,
+    )
+    return res["messages"][-1].content, res.get("briefing_data")
+
+
+def _invoke_agent(
+    user_id,
+    text,
+    message_id=None,
+    force_refresh=False,
+    user_preference=None,
+    selected_cluster=None,
+    selected_category=None,
+    refresh_mode=None,
+):
+    """
+    运行 LangGraph Agent，返回完整的最终 state
     
     参数:
         user_id: 用户ID
@@ -309,15 +599,60 @@ def run_agent(
         user_preference: 直接指定用户偏好类别（定时任务专用，跳过 router 和数据库查询）
         selected_cluster: 卡片点击时选中的专题名
         selected_category: 卡片点击时选中的类别
+        refresh_mode: 定时任务刷新模式（incremental=日内增量刷新）
     """
     config = {"configurable": {"thread_id": user_id}}
     
     # 获取历史消息（用于聊天模式的上下文记忆）
     try:
-        previous_state = graph.get_state(config)
-        history = previous_state.values.get("messages", []) if previous_state and previous_state.values else []
+        previous_state = agent_graph.graph.get_state(config)
     except Exception:
-        history = []
+        previous_state = None
+    inputs = _build_agent_inputs(
+        previous_state, user_id, text, message_id, force_refresh,
+        user_preference, selected_cluster, selected_category, refresh_mode,
+    )
+    
+    # 传入 thread_id 以启用 state 持久化（每个用户独立存储）
+    return agent_graph.graph.invoke(inputs, config=config)
+
+
+async def _ainvoke_agent(
+    user_id,
+    text,
+    message_id=None,
+    force_refresh=False,
+    user_preference=None,
+    selected_cluster=None,
+    selected_category=None,
+    refresh_mode=None,
+):
+    """_invoke_agent 的 async 版本：节点走 async 实现，多个会话共享同一个事件循环。"""
+    config = {"configurable": {"thread_id": user_id}}
+    try:
+        previous_state = await agent_graph.graph.aget_state(config)
+    except Exception:
+        previous_state = None
+    inputs = _build_agent_inputs(
+        previous_state, user_id, text, message_id, force_refresh,
+        user_preference, selected_cluster, selected_category, refresh_mode,
+    )
+    return await agent_graph.graph.ainvoke(inputs, config=config)
+
+
+def _build_agent_inputs(
+    previous_state,
+    user_id,
+    text,
+    message_id,
+    force_refresh,
+    user_preference,
+    selected_cluster,
+    selected_category,
+    refresh_mode,
+):
+    """根据 checkpointer 中的历史 state 组装本轮 graph 输入"""
+    history = previous_state.values.get("messages", []) if previous_state and previous_state.values else []
     
     # 滑动窗口：只保留最近10条消息（约5轮对话），避免超 Token 限额
     recent_history = history[-10:] if len(history) > 10 else history
@@ -331,6 +666,16 @@ def run_agent(
         "user_preference": user_preference, # [新增] 直接传入偏好类别
         "selected_cluster": selected_cluster,
         "selected_category": selected_category,
+        "delivered_message_id": None,
+        "refresh_mode": refresh_mode,
+        # 增量刷新字段每轮由 fetcher 重新给出，避免 checkpointer 残留
+        "refresh_snapshot": None,
+        "rewrite_event_ids": None,
+        "previous_scored_events": None,
+        "rewrite_cache": None,
+        "rewrite_texts": None,
+        "fanout_categories": None,
+        "pipeline_run_id": None,
     }
     if force_refresh:
         # 双保险：覆盖 checkpointer 中可能残留的结构化缓存状态
@@ -345,21 +690,29 @@ def run_agent(
             "selected_category": None,
         })
     
-    # 传入 thread_id 以启用 state 持久化（每个用户独立存储）
-    res = graph.invoke(inputs, config=config)
-    
-    # 返回 (content, briefing_data)
-    content = res["messages"][-1].content
-    briefing_data = res.get("briefing_data")
-    return content, briefing_data
+    return inputs
 
 # 定义一个 GET 接口，访问根路径 "/" 时触发
 @app.get("/")
 def health_check():
     return {"status": "ok", "message": "Bot is running! (机器人正在运行)"}
 
-# 异步后台任务：AI 思考并回复
-def process_lark_message(event_data):
+# 就绪探针：数据库可用、token 已缓存、图与 LLM 客户端已预热时返回 200，否则 503（GET / 只表示进程存活）
+@app.get("/ready")
+async def ready_check():
+    status = await adb.run_in_db_executor(readiness)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# Prometheus 抓取入口：本进程指标 + worker 进程快照 + 队列深度（读库放到 DB 线程池）
+@app.get("/metrics")
+async def metrics_endpoint():
+    body = await adb.run_in_db_executor(
+        lambda: render_metrics(load_process_snapshots(exclude=metrics_process_name()))
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+# 异步后台任务：AI 思考并回复（直接 await graph，不占用线程池）
+async def process_lark_message(event_data):
     message_id = event_data["message"]["message_id"]
     content_json = event_data["message"]["content"]
     user_text = json.loads(content_json)["text"]
@@ -368,11 +721,15 @@ def process_lark_message(event_data):
     sender_id = event_data["sender"]["sender_id"]["open_id"]
     
     # AI 思考 (传入 ID 和 Message ID)
-    # run_agent 返回 (content, briefing_data)
-    ai_reply_content, _ = run_agent(sender_id, user_text, message_id)
+    res = await _ainvoke_agent(sender_id, user_text, message_id)
     
+    # writer 已渐进式投递过卡片（并原位补齐），不再重复整卡回复
+    if res.get("delivered_message_id"):
+        print(f"📬 [Message] Card already delivered progressively: {res['delivered_message_id']}")
+        return
+
     # 回复
-    reply_message(message_id, ai_reply_content)
+    await areply_message(message_id, res["messages"][-1].content)
 
 
 
@@ -381,6 +738,7 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
     started_at = time.perf_counter()
     handled = False
     event_id = None
+    event_type = None
 
     try:
         # 解析原始 JSON
@@ -437,15 +795,17 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
         print(f"{'='*60}\n")
 
         # 0. 去重处理 (防止飞书超时重试导致二次触发)
-        if event_id and event_id in processed_events:
+        # 内存命中直接返回；未命中时登记（持久化模式会写 SQLite，放到 DB 线程池）
+        if event_id and (
+            event_id in processed_events
+            or not await adb.run_in_db_executor(processed_events.add, event_id)
+        ):
             _event_log(log_type="event_dedup", dedup="hit", event_id=event_id)
             print(f"⏩ [Event] Duplicate event {event_id}, skipping.")
             handled = True
             return {"code": 0}
 
         _event_log(log_type="event_dedup", dedup="miss", event_id=event_id)
-        if event_id:
-            processed_events.append(event_id)
 
         # 1. 握手验证
         if body.get("type") == "url_verification":
@@ -456,8 +816,25 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
         # 2. 处理用户消息 (Event v2 格式)
         if event_type == "im.message.receive_v1":
             print("📧 [Message] Processing user message")
-            # 放入后台运行，不阻塞 HTTP 返回
-            background_tasks.add_task(process_lark_message, body["event"])
+            sender_open_id = event.get("sender", {}).get("sender_id", {}).get("open_id")
+            task_class = classify_message(_message_text(body["event"]))
+            # 放入后台运行，不阻塞 HTTP 返回（启用 worker 时只入队，由 worker 进程执行 agent）
+            # 准入控制：该类别或该用户的在途任务已满时不排队，立即回复繁忙提示
+            if JOB_WORKERS_ENABLED:
+                _, reason = await adb.run_in_db_executor(
+                    admit_job, "lark_message", {"event_data": body["event"]}, task_class, sender_open_id
+                )
+            else:
+                reason = admission.try_acquire(task_class, sender_open_id)
+                if reason is None:
+                    background_tasks.add_task(
+                        _run_admitted, task_class, sender_open_id, process_lark_message, body["event"]
+                    )
+            if reason is not None:
+                _reject_busy(
+                    background_tasks, event_id, task_class, reason, sender_open_id,
+                    message_id=body["event"].get("message", {}).get("message_id"),
+                )
             handled = True
 
         # [新增] 处理菜单点击事件
@@ -467,78 +844,85 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
 
             print(f"🔘 [Menu Event] Key: {event_key}, User: {operator_id}")
 
-            if event_key.startswith("subscribe:"):
-                _event_log(
-                    log_type="menu_branch",
-                    event_id=event_id,
-                    event_key=event_key,
-                    branch="subscribe",
-                )
-                category = event_key.split(":", 1)[1]
-                add_subscription(operator_id, category)
-                subscriptions = get_subscriptions(operator_id)
-                subscribed_text = "、".join(subscriptions) if subscriptions else category
-
-                # 由于菜单点击没有 message_id 上下文，我们需要主动发消息给用户
-                # 但这里没有 reply token，通常直接调 send_message
-                from messaging import send_message
-
-                send_message(
-                    operator_id,
-                    f"✅ 已成功订阅 **{category}** 类别！\n当前已关注：{subscribed_text}\n我们将为您推送以上类别的每日日报。"
-                )
+            # 菜单请求在 Web 进程内直接处理：按进程内在途计数做准入（取日报归 read，其余归 subscribe）
+            menu_class = "read" if event_key.startswith("REQUEST_") else "subscribe"
+            reason = admission.try_acquire(menu_class, operator_id)
+            if reason is not None:
+                _reject_busy(background_tasks, event_id, menu_class, reason, operator_id)
+                handled = True
+                return {"code": 0}
 
-            elif event_key == "MANAGE_SUBSCRIBE":
-                _event_log(
-                    log_type="menu_branch",
-                    event_id=event_id,
-                    event_key=event_key,
-                    branch="manage_subscribe",
-                )
-                subscriptions = get_subscriptions(operator_id)
-                with manage_subscribe_state_lock:
-                    pending_manage_subscriptions[operator_id] = list(subscriptions)
-                manage_card = build_manage_subscribe_card(subscriptions, DAILY_NEWS_CATEGORIES)
+            try:
+                if event_key.startswith("subscribe:"):
+                    _event_log(
+                        log_type="menu_branch",
+                        event_id=event_id,
+                        event_key=event_key,
+                        branch="subscribe",
+                    )
+                    category = event_key.split(":", 1)[1]
+                    await adb.add_subscription(operator_id, category)
+                    subscriptions = await adb.get_subscriptions(operator_id)
+                    subscribed_text = "、".join(subscriptions) if subscriptions else category
+
+                    # 由于菜单点击没有 message_id 上下文，我们需要主动发消息给用户
+                    # 但这里没有 reply token，通常直接调 send_message（async 版本，不阻塞事件循环）
+                    await asend_message(
+                        operator_id,
+                        f"✅ 已成功订阅 **{category}** 类别！\n当前已关注：{subscribed_text}\n我们将为您推送以上类别的每日日报。"
+                    )
 
-                from messaging import send_message
-                send_message(operator_id, manage_card)
+                elif event_key == "MANAGE_SUBSCRIBE":
+                    _event_log(
+                        log_type="menu_branch",
+                        event_id=event_id,
+                        event_key=event_key,
+                        branch="manage_subscribe",
+                    )
+                    subscriptions = await adb.get_subscriptions(operator_id)
+                    with manage_subscribe_state_lock:
+                        pending_manage_subscriptions[operator_id] = list(subscriptions)
+                    manage_card = build_manage_subscribe_card(subscriptions, DAILY_NEWS_CATEGORIES)
 
-            # 2. 新增：处理手动触发新闻请求
-            elif event_key in ["REQUEST_MUSIC_NEWS", "REQUEST_GAMES_NEWS", "REQUEST_AI_NEWS"]:
-                _event_log(
-                    log_type="menu_branch",
-                    event_id=event_id,
-                    event_key=event_key,
-                    branch="request_news",
-                )
-                # 提取类别: REQUEST_MUSIC_NEWS -> MUSIC
-                target_category = event_key.split("_")[1]
-                print(f"🔍 [Menu] 用户 {operator_id} 请求获取：{target_category} 新闻")
+                    await asend_message(operator_id, manage_card)
+
+                # 2. 新增：处理手动触发新闻请求
+                elif event_key in ["REQUEST_MUSIC_NEWS", "REQUEST_GAMES_NEWS", "REQUEST_AI_NEWS"]:
+                    _event_log(
+                        log_type="menu_branch",
+                        event_id=event_id,
+                        event_key=event_key,
+                        branch="request_news",
+                    )
+                    # 提取类别: REQUEST_MUSIC_NEWS -> MUSIC
+                    target_category = event_key.split("_")[1]
+                    print(f"🔍 [Menu] 用户 {operator_id} 请求获取：{target_category} 新闻")
 
-                from datetime import date
-                today = date.today().isoformat()
-                cached = get_cached_news(target_category, today)
+                    from datetime import date
+                    today = date.today().isoformat()
+                    card = await adb.run_in_db_executor(get_cover_card, target_category, today)
 
-                from messaging import send_message
-                if cached and cached.get("content"):
-                    send_message(operator_id, cached["content"])
-                else:
-                    send_message(operator_id, f"ℹ️ 抱歉，今天的【{target_category}】日报暂未生成。\n请稍后再试，或等待每日定时推送。")
-
-            # 3. 新增：测试归档到 Wiki
-            elif event_key == "WRITE_DAILY_NEWS":
-                # _event_log(
-                #     log_type="menu_branch",
-                #     event_id=event_id,
-                #     event_key=event_key,
-                #     branch="WRITE_DAILY_NEWS",
-                # )
-                # #  print(f"📝 [Menu] 用户 {operator_id} 请求：归档日报到 Wiki")
-                # from messaging import send_message
-                # send_message(operator_id, "⏳ 正在将今日多类别日报归档至 Wiki，请稍候...")
-                send_message(operator_id, "此功能不需要手动触发，查看历史日报请点击：历史新闻->日报汇总")
+                    if card:
+                        await asend_message(operator_id, card)
+                    else:
+                        await asend_message(operator_id, f"ℹ️ 抱歉，今天的【{target_category}】日报暂未生成。\n请稍后再试，或等待每日定时推送。")
+
+                # 3. 新增：测试归档到 Wiki
+                elif event_key == "WRITE_DAILY_NEWS":
+                    # _event_log(
+                    #     log_type="menu_branch",
+                    #     event_id=event_id,
+                    #     event_key=event_key,
+                    #     branch="WRITE_DAILY_NEWS",
+                    # )
+                    # #  print(f"📝 [Menu] 用户 {operator_id} 请求：归档日报到 Wiki")
+                    # from messaging import send_message
+                    # send_message(operator_id, "⏳ 正在将今日多类别日报归档至 Wiki，请稍候...")
+                    await asend_message(operator_id, "此功能不需要手动触发，查看历史日报请点击：历史新闻->日报汇总")
 
                 # background_tasks.add_task(archive_daily_news_to_wiki, operator_id)
+            finally:
+                admission.release(menu_class, operator_id)
 
             handled = True
 
@@ -562,7 +946,7 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
                     command or "",
                     selected_category or "",
                 ])
-                if _is_duplicate_manage_subscribe_action(dedup_key):
+                if await adb.run_in_db_executor(_is_duplicate_manage_subscribe_action, dedup_key):
                     _event_log(
                         log_type="event_dedup",
                         dedup="hit_manage_subscribe_action",
@@ -576,26 +960,36 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
                     handled = True
                     return {"code": 0}
 
-                # 直接读库 -> 切换 -> 写库 -> 刷新卡片
-                current = list(get_subscriptions(sender_id))
-                if selected_category in current:
-                    current.remove(selected_category)
-                    toast_msg = f"已取消订阅 {selected_category}"
-                else:
-                    current.append(selected_category)
-                    toast_msg = f"已订阅 {selected_category}"
-
-                # 保持与 DAILY_NEWS_CATEGORIES 相同的顺序
-                ordered = [cat for cat in DAILY_NEWS_CATEGORIES if cat in current]
-                replace_subscriptions(sender_id, ordered)
-                print(f"💾 [Toggle Save] user={sender_id}, cat={selected_category}, new={ordered}")
-
-                subscribed_text = "、".join(ordered) or "无"
-                status_msg = f"✅ 订阅已更新：{subscribed_text}"
-                refreshed_card = build_manage_subscribe_card(ordered, DAILY_NEWS_CATEGORIES)
-                from messaging import send_message
-                send_message(sender_id, status_msg)   # 独立文字消息
-                send_message(sender_id, refreshed_card)  # 新卡片
+                # 订阅切换在 Web 进程内直接处理：按进程内在途计数做准入
+                reason = admission.try_acquire("subscribe", sender_id)
+                if reason is not None:
+                    # 允许用户立即重试同一次点击
+                    await adb.run_in_db_executor(recent_manage_subscribe_actions.discard, dedup_key)
+                    _reject_busy(background_tasks, event_id, "subscribe", reason, sender_id, send_notice=False)
+                    handled = True
+                    return {"toast": {"type": "warning", "content": BUSY_TOAST}}
+                try:
+                    # 直接读库 -> 切换 -> 写库 -> 刷新卡片
+                    current = list(await adb.get_subscriptions(sender_id))
+                    if selected_category in current:
+                        current.remove(selected_category)
+                        toast_msg = f"已取消订阅 {selected_category}"
+                    else:
+                        current.append(selected_category)
+                        toast_msg = f"已订阅 {selected_category}"
+
+                    # 保持与 DAILY_NEWS_CATEGORIES 相同的顺序
+                    ordered = [cat for cat in DAILY_NEWS_CATEGORIES if cat in current]
+                    await adb.replace_subscriptions(sender_id, ordered)
+                    print(f"💾 [Toggle Save] user={sender_id}, cat={selected_category}, new={ordered}")
+
+                    subscribed_text = "、".join(ordered) or "无"
+                    status_msg = f"✅ 订阅已更新：{subscribed_text}"
+                    refreshed_card = build_manage_subscribe_card(ordered, DAILY_NEWS_CATEGORIES)
+                    await asend_message(sender_id, status_msg)   # 独立文字消息
+                    await asend_message(sender_id, refreshed_card)  # 新卡片
+                finally:
+                    admission.release("subscribe", sender_id)
 
                 handled = True
                 return {"code": 0}
@@ -609,7 +1003,7 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
                     target or "",
                     selected_category or "",
                 ])
-                if _is_duplicate_expand_action(expand_dedup_key):
+                if await adb.run_in_db_executor(_is_duplicate_expand_action, expand_dedup_key):
                     _event_log(
                         log_type="event_dedup",
                         dedup="hit_expand_action",
@@ -637,14 +1031,41 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
                 )
 
                 # 后台处理（不返回 Toast，避免3秒超时限制）
-                background_tasks.add_task(
-                    handle_card_action_async,
-                    sender_id,
-                    simulated_text,
-                    card_msg_id,
-                    target,
-                    selected_category,
-                )
+                # 准入控制：expand 在途任务或该用户在途任务已满时直接用 toast 提示繁忙
+                if JOB_WORKERS_ENABLED:
+                    _, reason = await adb.run_in_db_executor(
+                        admit_job,
+                        "card_expand",
+                        {
+                            "user_id": sender_id,
+                            "text": simulated_text,
+                            "message_id": card_msg_id,
+                            "target": target,
+                            "selected_category": selected_category,
+                        },
+                        "expand",
+                        sender_id,
+                    )
+                else:
+                    reason = admission.try_acquire("expand", sender_id)
+                    if reason is None:
+                        background_tasks.add_task(
+                            _run_admitted,
+                            "expand",
+                            sender_id,
+                            handle_card_action_async,
+                            sender_id,
+                            simulated_text,
+                            card_msg_id,
+                            target,
+                            selected_category,
+                        )
+                if reason is not None:
+                    # 允许用户立即重试同一次点击
+                    await adb.run_in_db_executor(recent_expand_actions.discard, expand_dedup_key)
+                    _reject_busy(background_tasks, event_id, "expand", reason, sender_id, send_notice=False)
+                    handled = True
+                    return {"toast": {"type": "warning", "content": BUSY_TOAST}}
 
                 # 返回成功响应，不显示 Toast
                 # code:0 表示成功，toast.type: info 显示一个小提示
@@ -654,7 +1075,9 @@ async def handle_event(request: Request, background_tasks: BackgroundTasks):
 
         return {"code": 0}
     finally:
-        latency_ms = int((time.perf_counter() - started_at) * 1000)
+        elapsed = time.perf_counter() - started_at
+        latency_ms = int(elapsed * 1000)
+        WEBHOOK_LATENCY.observe(elapsed, event_type=event_type or "unknown", handled=str(handled).lower())
         _event_log(
             log_type="event_out",
             event_id=event_id,
@@ -669,18 +1092,38 @@ async def handle_card_action_async(user_id, text, message_id, target, selected_c
         f"target={target}, category={selected_category}, message_id={message_id}"
     )
     
+    # 快速通道：直接从进程内日报缓存取预渲染详情，不经过 LangGraph
+    if selected_category:
+        started_at = time.perf_counter()
+        # 详情缓存每次会查一列 generated_at，同样放到数据库线程池
+        detail = await adb.run_in_db_executor(
+            get_cluster_detail, selected_category, date.today().isoformat(), target
+        )
+        lookup_ms = round((time.perf_counter() - started_at) * 1000, 2)
+        if detail is not None:
+            await areply_message(message_id, detail)
+            _event_log(
+                log_type="expand_fast_path",
+                hit=True,
+                category=selected_category,
+                target=target,
+                lookup_ms=lookup_ms,
+            )
+            return
+        _event_log(log_type="expand_fast_path", hit=False, category=selected_category, target=target)
+
     # 立即发送"正在处理"消息，让用户知道系统已响应
-    reply_message(message_id, f"⏳ 正在为您展开 **{target}** 的详细内容，请稍候...")
+    await areply_message(message_id, f"⏳ 正在为您展开 **{target}** 的详细内容，请稍候...")
     
     # 后台慢慢处理（无3秒限制）
-    ai_reply_content, _ = run_agent(
+    ai_reply_content, _ = await arun_agent(
         user_id,
         text,
         message_id,
         selected_cluster=target,
         selected_category=selected_category,
     )
-    reply_message(message_id, ai_reply_content)
+    await areply_message(message_id, ai_reply_content)
 
 async def archive_daily_news_to_wiki(user_id=None, notify_user=True):
     """
@@ -707,24 +1150,14 @@ async def archive_daily_news_to_wiki(user_id=None, notify_user=True):
         all_news_data = {}
         
         for cat in categories:
-            cached = get_cached_news(cat, today)
-            briefing = None
-            if cached and cached.get("briefing_data"):
-                try:
-                    # 数据库里存的是 JSON string
-                    parsed = json.loads(cached["briefing_data"])
-                    if isinstance(parsed, dict):
-                        briefing = parsed
-                    else:
-                        print(f"⚠️ {cat} briefing_data 不是对象，已降级为暂无数据")
-                except Exception as e:
-                    print(f"⚠️ 解析 {cat} 数据失败: {e}")
-            
-            all_news_data[cat] = briefing
+            cached = await adb.get_cached_news(cat, today)
+            # get_cached_news 已完成解码；解码失败时 briefing 为 None，降级为暂无数据
+            all_news_data[cat] = cached.get("briefing") if cached else None
             
         # 2. 执行写入
         writer = FeishuDocWriter(app_id, app_secret)
-        success = writer.write_daily_news_to_wiki(WIKI_TOKEN, all_news_data)
+        # 文档写入为多次同步 HTTP 调用，放到线程中执行
+        success = await asyncio.to_thread(writer.write_daily_news_to_wiki, WIKI_TOKEN, all_news_data)
         
         # 3. 反馈用户（定时任务可关闭通知）
         if success:
@@ -735,8 +1168,7 @@ async def archive_daily_news_to_wiki(user_id=None, notify_user=True):
             print("❌ [Archiver] Archive failed.")
 
         if notify_user and user_id:
-            from messaging import send_message
-            send_message(user_id, msg)
+            await asend_message(user_id, msg)
         elif notify_user and not user_id:
             print("ℹ️ [Archiver] notify_user=True but user_id is empty, skip sending message.")
         
@@ -748,5 +1180,9 @@ if __name__ == "__main__":
     # 启动服务器：
     # "lark_service:app" -> 告诉引擎去 lark_service.py 文件里找 app 这个变量
     # port=8000 -> 监听 8000 端口
-    # reload=True -> 你一改代码，服务器自动重启（方便开发）
-    uvicorn.run("lark_service:app", host="0.0.0.0", port=36000, reload=True)
+    # workers=WEB_WORKERS -> 多进程处理 webhook，调度器只在选出的 leader 进程中运行
+    # reload=True -> 你一改代码，服务器自动重启（方便开发；仅 WEB_WORKERS=1 时启用，uvicorn 不支持二者同时使用）
+    if WEB_WORKERS > 1:
+        uvicorn.run("lark_service:app", host="0.0.0.0", port=36000, workers=WEB_WORKERS)
+    else:
+        uvicorn.run("lark_service:app", host="0.0.0.0", port=36000, reload=True)
@@ -1,14 +1,14 @@
-import requests
 import json
-import os
 from dotenv import load_dotenv
 
+# tenant_access_token 由 feishu_auth 统一缓存与刷新（保留此名称供旧调用方导入）
+from feishu_auth import get_tenant_access_token
+from feishu_client import FeishuResult, feishu_client
+from metrics import FEISHU_MESSAGES
+
 # 加载环境变量
 load_dotenv()
 
-app_id = os.getenv("LARK_APP_ID")
-app_secret = os.getenv("LARK_APP_SECRET")
-
 
 def _prepare_message_payload(content):
     msg_type = "text"
@@ -27,136 +27,114 @@ def _prepare_message_payload(content):
 
     return msg_type, final_content
 
-def get_tenant_access_token():
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-    headers = {"Content-Type": "application/json; charset=utf-8"}
-    data = {
-        "app_id": app_id.strip() if app_id else "",
-        "app_secret": app_secret.strip() if app_secret else ""
-    }
-    resp = requests.post(url, headers=headers, json=data)
-    if resp.status_code == 200:
-        return resp.json().get("tenant_access_token")
-    else:
-        print(f"❌ Failed to get token: {resp.text}")
-        return None
 
-def reply_message(message_id, content):
+# --- 请求构造与结果处理（同步 / async 版本共用） ---
+
+def _reply_request(message_id, content):
+    msg_type, final_content = _prepare_message_payload(content)
+    print(f"📤 Sending Reply: type={msg_type}, content_len={len(final_content)}")
+    return f"/im/v1/messages/{message_id}/reply", {"content": final_content, "msg_type": msg_type}
+
+
+def _reply_result(res: FeishuResult, content, return_message_id):
+    FEISHU_MESSAGES.inc(api="reply", result="sent" if res.ok else "failed")
+    if not res.ok:
+        print(f"❌ Lark API Error: {res.error}")
+        return None if return_message_id else False
+    short_content = str(content)[:20].replace('\n', ' ')
+    print(f"✅ Reply Sent: {short_content}...")
+    if return_message_id:
+        return res.data.get("message_id")
+    return True
+
+
+def _send_request(receive_id, content, receive_id_type, uuid=None):
     """
-    调用飞书 API 回复用户 (Raw HTTP)
+    uuid: 请求去重标识（≤50 字符）；飞书对同一 uuid 在 1 小时内最多发送一条消息，
+    超时 / 5xx 后重发同一请求时传入相同 uuid 即可避免重复消息。
     """
-    try:
-        token = get_tenant_access_token()
-        if not token:
-            print("❌ Cannot send message without token")
-            return False
-            
-        url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}/reply"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json; charset=utf-8"
-        }
-        msg_type, final_content = _prepare_message_payload(content)
-
-        payload = {
-            "content": final_content,
-            "msg_type": msg_type
-        }
-        
-        print(f"📤 Sending Reply: type={msg_type}, content_len={len(final_content)}")
-        
-        resp = requests.post(url, headers=headers, json=payload)
-        
-        if resp.status_code != 200:
-            print(f"❌ Lark API Error: {resp.text}")
-            return False
-        else:
-            # 飞书 API 即使 200 也可能在 body 里报错
-            res_json = resp.json()
-            if res_json.get("code") != 0:
-                print(f"❌ Lark Logic Error: {res_json}")
-                return False
-            else:
-                short_content = str(content)[:20].replace('\n', ' ')
-                print(f"✅ Reply Sent: {short_content}...")
-                return True
-            
-    except Exception as e:
-        print(f"❌ Exception in reply_message: {str(e)}")
+    msg_type, final_content = _prepare_message_payload(content)
+    params = {"receive_id_type": receive_id_type}
+    payload = {"receive_id": receive_id, "content": final_content, "msg_type": msg_type}
+    if uuid:
+        payload["uuid"] = uuid
+    return params, payload
+
+
+def _send_result(res: FeishuResult, receive_id, receive_id_type, payload):
+    FEISHU_MESSAGES.inc(api="send", result="sent" if res.ok else "failed")
+    if not res.ok:
+        print(f"❌ Push Failed: {res.error}")
+        return False
+    print(f"📤 Pushed to {receive_id_type}:{receive_id}: {payload['msg_type']}")
+    return True
+
+
+def _batch_send_request(open_ids, content):
+    """批量发送（message/v4/batch_send）请求体：同一份内容发给多个 open_id。"""
+    msg_type, final_content = _prepare_message_payload(content)
+    payload = {"open_ids": list(open_ids), "msg_type": msg_type}
+    # 旧版批量接口：卡片放 card 字段、文本放 content 字段，均为对象而非 JSON 字符串
+    if msg_type == "interactive":
+        payload["card"] = json.loads(final_content)
+    else:
+        payload["content"] = json.loads(final_content)
+    return payload
+
+
+def _update_request(content):
+    msg_type, final_content = _prepare_message_payload(content)
+    return {"content": final_content, "msg_type": msg_type}
+
+
+def _update_result(res: FeishuResult, message_id):
+    FEISHU_MESSAGES.inc(api="update", result="sent" if res.ok else "failed")
+    if not res.ok:
+        print(f"❌ Update Message Error: {res.error}")
         return False
+    print(f"📝 Updated message: {message_id}")
+    return True
+
+
+def reply_message(message_id, content, return_message_id=False):
+    """
+    调用飞书 API 回复用户（共享连接池的 HTTP 客户端）
+
+    return_message_id=True 时返回新消息的 message_id（失败为 None），
+    供后续 update_message 原位更新卡片使用。
+    """
+    path, payload = _reply_request(message_id, content)
+    return _reply_result(feishu_client.request("POST", path, json=payload), content, return_message_id)
+
+
+async def areply_message(message_id, content, return_message_id=False):
+    """reply_message 的 async 版本（事件循环内使用，不阻塞）。"""
+    path, payload = _reply_request(message_id, content)
+    return _reply_result(await feishu_client.arequest("POST", path, json=payload), content, return_message_id)
+
 
 def send_message(receive_id, content, receive_id_type="open_id"):
     """主动发送消息 (支持用户 open_id 和群 chat_id)。"""
-    try:
-        token = get_tenant_access_token()
-        if not token:
-            return False
-        
-        url = "https://open.feishu.cn/open-apis/im/v1/messages"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json; charset=utf-8"
-        }
-        
-        params = {"receive_id_type": receive_id_type}
-        msg_type, final_content = _prepare_message_payload(content)
-
-        payload = {
-            "receive_id": receive_id,
-            "content": final_content,
-            "msg_type": msg_type
-        }
-        
-        resp = requests.post(url, headers=headers, params=params, json=payload)
-        if resp.status_code != 200:
-            print(f"❌ Push Failed: {resp.text}")
-            return False
-
-        body = resp.json()
-        if body.get("code") != 0:
-            print(f"❌ Push Failed: {body}")
-            return False
-        else:
-            print(f"📤 Pushed to {receive_id_type}:{receive_id}: {msg_type}")
-            return True
-            
-    except Exception as e:
-        print(f"❌ Exception in send_message: {str(e)}")
-        return False
+    params, payload = _send_request(receive_id, content, receive_id_type)
+    res = feishu_client.request("POST", "/im/v1/messages", params=params, json=payload)
+    return _send_result(res, receive_id, receive_id_type, payload)
+
+
+async def asend_message(receive_id, content, receive_id_type="open_id"):
+    """send_message 的 async 版本。"""
+    params, payload = _send_request(receive_id, content, receive_id_type)
+    res = await feishu_client.arequest("POST", "/im/v1/messages", params=params, json=payload)
+    return _send_result(res, receive_id, receive_id_type, payload)
 
 
 def update_message(message_id, content):
     """原位更新消息内容（主要用于更新卡片状态）。"""
-    try:
-        token = get_tenant_access_token()
-        if not token:
-            return False
-
-        url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json; charset=utf-8"
-        }
-
-        msg_type, final_content = _prepare_message_payload(content)
-
-        payload = {
-            "content": final_content,
-            "msg_type": msg_type,
-        }
-
-        resp = requests.patch(url, headers=headers, json=payload)
-        if resp.status_code != 200:
-            print(f"❌ Update Message HTTP Error: {resp.text}")
-            return False
-
-        body = resp.json()
-        if body.get("code") != 0:
-            print(f"❌ Update Message Logic Error: {body}")
-            return False
-
-        print(f"📝 Updated message: {message_id}")
-        return True
-    except Exception as e:
-        print(f"❌ Exception in update_message: {str(e)}")
-        return False
+    payload = _update_request(content)
+    return _update_result(feishu_client.request("PATCH", f"/im/v1/messages/{message_id}", json=payload), message_id)
+
+
+async def aupdate_message(message_id, content):
+    """update_message 的 async 版本。"""
+    payload = _update_request(content)
+    res = await feishu_client.arequest("PATCH", f"/im/v1/messages/{message_id}", json=payload)
+    return _update_result(res, message_id)
@@ -0,0 +1,235 @@
+"""
+服务指标（Prometheus 文本格式）
+===============================
+职责：
+1) 轻量的 Counter / Histogram（带标签），热路径上只是一次加锁的字典累加；
+2) 统一登记本服务的指标：webhook 延迟、流水线阶段耗时（去重 / 评分 timing_ms）、
+   LLM 与 embedding token 用量、飞书消息发送结果、群推送结果；
+3) 队列深度（后台任务 / 推送 outbox）在抓取时由采集函数从 SQLite 现查，不占用热路径；
+4) worker 进程定期把自己的指标快照写入 SQLite（metrics_snapshots），
+   Web 进程的 /metrics 把本进程与各 worker 的快照合并后输出。
+
+用法：
+    from metrics import WEBHOOK_LATENCY
+    WEBHOOK_LATENCY.observe(0.012, event_type="im.message.receive_v1", handled="true")
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import METRICS_FLUSH_INTERVAL_SEC, METRICS_SNAPSHOT_TTL_SEC
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = _LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数（非累计）..., +Inf 桶计数, sum]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {key: list(state) for key, state in self._values.items()}
+
+
+_registry: List[_Metric] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def _register(metric: _Metric) -> _Metric:
+    _registry.append(metric)
+    return metric
+
+
+def register_collector(fn: Callable[[], Iterable[str]]) -> None:
+    """登记抓取时执行的采集函数（返回 Prometheus 文本行，如队列深度 gauge）。"""
+    _collectors.append(fn)
+
+
+# --- 指标定义 ---
+WEBHOOK_LATENCY = _register(Histogram(
+    "rss_agent_webhook_latency_seconds", "Feishu webhook handling latency", ("event_type", "handled")
+))
+PIPELINE_STAGE_SECONDS = _register(Histogram(
+    "rss_agent_pipeline_stage_seconds", "Pipeline stage durations from dedup/scoring timing_ms",
+    ("stage", "step"), buckets=_STAGE_BUCKETS,
+))
+LLM_TOKENS = _register(Counter(
+    "rss_agent_llm_tokens_total", "LLM token usage", ("step", "model", "type")
+))
+EMBEDDING_TOKENS = _register(Counter(
+    "rss_agent_embedding_tokens_total", "Embedding token usage", ("step", "model")
+))
+FEISHU_MESSAGES = _register(Counter(
+    "rss_agent_feishu_messages_total", "Feishu message sends by API and result", ("api", "result")
+))
+GROUP_PUSH_OUTCOMES = _register(Counter(
+    "rss_agent_group_push_total", "Group push outcomes", ("send_result",)
+))
+ADMISSION_REJECTIONS = _register(Counter(
+    "rss_agent_admission_rejected_total", "Webhook tasks rejected by admission control", ("task_class", "reason")
+))
+
+
+def observe_timings(stage: str, timing_ms: Optional[Dict[str, float]]) -> None:
+    """记录 dedup / scoring meta 中的 timing_ms（各步骤毫秒数）。"""
+    if not isinstance(timing_ms, dict):
+        return
+    for step, value in timing_ms.items():
+        if isinstance(value, (int, float)):
+            PIPELINE_STAGE_SECONDS.observe(value / 1000.0, stage=stage, step=step.replace("_ms", ""))
+
+
+# --- 快照（跨进程合并）---
+
+def snapshot() -> Dict[str, Dict[str, list]]:
+    """本进程的 counter / histogram 快照：{name: {"label_json": value}}。"""
+    return {
+        metric.name: {json.dumps(list(key)): value for key, value in metric.snapshot().items()}
+        for metric in _registry
+    }
+
+
+def _merge(total: Dict[str, Dict[str, object]], other: Dict[str, Dict[str, object]]) -> None:
+    for name, samples in other.items():
+        merged = total.setdefault(name, {})
+        for key, value in samples.items():
+            current = merged.get(key)
+            if current is None:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render(extra_snapshots: Iterable[Dict[str, Dict[str, object]]] = ()) -> str:
+    """输出 Prometheus 文本：本进程指标 + 其它进程快照 + 采集函数的 gauge。"""
+    merged: Dict[str, Dict[str, object]] = {}
+    _merge(merged, snapshot())
+    for other in extra_snapshots:
+        _merge(merged, other)
+
+    lines: List[str] = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(merged.get(metric.name, {}).items()):
+            label_values = json.loads(key)
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labels, label_values, le)} {cumulative}")
+                labels = _format_labels(metric.labels, label_values)
+                lines.append(f"{metric.name}_sum{labels} {value[-1]}")
+                lines.append(f"{metric.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{metric.name}{_format_labels(metric.labels, label_values)} {value}")
+
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector {getattr(collector, '__name__', 'collector')} failed: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, object], float]]) -> List[str]:
+    """供采集函数使用：生成一个 gauge 的文本行。"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+    return lines
+
+
+def load_process_snapshots(exclude: Optional[str] = None) -> List[Dict[str, Dict[str, object]]]:
+    """读取其它进程最近写入的快照（超过 METRICS_SNAPSHOT_TTL_SEC 未更新的视为已退出）。"""
+    from database import load_metrics_snapshots
+
+    return [
+        json.loads(payload)
+        for process, payload in load_metrics_snapshots(time.time() - METRICS_SNAPSHOT_TTL_SEC)
+        if process != exclude
+    ]
+
+
+def start_snapshot_flusher(process_name: str) -> threading.Thread:
+    """worker 进程调用：后台线程定期把本进程快照写入 SQLite。"""
+    from database import save_metrics_snapshot
+
+    def _loop():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL_SEC)
+            try:
+                save_metrics_snapshot(process_name, json.dumps(snapshot()))
+            except Exception as e:
+                print(f"⚠️ [Metrics] Snapshot flush failed: {e}")
+
+    thread = threading.Thread(target=_loop, name="metrics-flusher", daemon=True)
+    thread.start()
+    return thread
+
+
+def process_name() -> str:
+    return f"pid{os.getpid()}"
@@ -10,6 +10,8 @@ from config import (
     NEWS_DEDUP_MODE,
     NEWS_DEDUP_THRESHOLD,
 )
+from metrics import EMBEDDING_TOKENS
+from tracing import current_node
 
 # ============================================================================
 # 新闻去重模块（可插拔）
@@ -279,6 +281,62 @@ def dedupe_news_payload(
     return deduped_payload, meta, trace
 
 
+def exact_match_keys(item: Dict[str, Any]) -> List[str]:
+    """规则去重使用的匹配键（归一化 URL / 标题），供增量刷新与已有事件比对。"""
+    keys: List[str] = []
+    url_key = _normalize_url(item.get("sourceURL"))
+    title_key = _normalize_title(item.get("title"))
+    if url_key:
+        keys.append(f"url:{url_key}")
+    if title_key:
+        keys.append(f"title:{title_key}")
+    return keys
+
+
+def assign_to_existing_events(
+    new_items: List[Dict[str, Any]],
+    existing_items: List[Dict[str, Any]],
+    *,
+    threshold: float = NEWS_DEDUP_THRESHOLD,
+    embedding_model: str = NEWS_DEDUP_EMBEDDING_MODEL,
+) -> List[Optional[int]]:
+    """
+    增量去重：把新簇代表稿归入已有事件。
+    对每个 new_item 返回相似度最高且 >= threshold 的 existing_items 下标，否则为 None。
+
+    说明：
+    - 只与已有事件的代表稿比较（近似 complete linkage，避免为全部成员重新 embedding）；
+    - 一次 embedding 请求同时覆盖新旧文本；失败时抛异常，由调用方决定降级。
+    """
+    result: List[Optional[int]] = [None] * len(new_items)
+    new_idx = [i for i, item in enumerate(new_items) if _semantic_text(item)]
+    old_idx = [j for j, item in enumerate(existing_items) if _semantic_text(item)]
+    if not new_idx or not old_idx:
+        return result
+
+    texts = [_semantic_text(new_items[i]) for i in new_idx] + [
+        _semantic_text(existing_items[j]) for j in old_idx
+    ]
+    vectors = _get_embeddings(texts, embedding_model)
+    normed: List[List[float]] = []
+    for vec in vectors:
+        norm = math.sqrt(sum(float(x) * float(x) for x in vec))
+        normed.append([float(x) / norm for x in vec] if norm else [0.0 for _ in vec])
+
+    new_vecs = normed[: len(new_idx)]
+    old_vecs = normed[len(new_idx):]
+    for a, vi in enumerate(new_vecs):
+        best_score = threshold
+        best_j: Optional[int] = None
+        for b, vj in enumerate(old_vecs):
+            score = sum(x * y for x, y in zip(vi, vj))
+            if score >= best_score:
+                best_score = score
+                best_j = old_idx[b]
+        result[new_idx[a]] = best_j
+    return result
+
+
 def _safe_count(payload: Any) -> int:
     """安全读取 payload 中 data 列表长度。"""
     if isinstance(payload, dict) and isinstance(payload.get("data"), list):
@@ -411,6 +469,10 @@ def _get_embeddings(texts: List[str], model: str) -> List[List[float]]:
         req_kwargs["extra_headers"] = extra_headers
 
     resp = client.embeddings.create(**req_kwargs)
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        tokens = getattr(usage, "total_tokens", None) or getattr(usage, "prompt_tokens", None) or 0
+        EMBEDDING_TOKENS.inc(tokens, step=current_node() or "dedup", model=model)
     data = getattr(resp, "data", None)
     if not isinstance(data, list) or len(data) != len(texts):
         raise RuntimeError("invalid_embedding_response")
@@ -0,0 +1,283 @@
+"""
+日内增量刷新
+============
+职责：
+1) 从一次完整生成（fetcher -> dedup -> scorer -> writer）中沉淀“刷新快照”：
+   事件列表（代表稿 + 成员 ID）、已见文章 ID、评分结果、改写文本；
+2) 增量模式下只拉取上次窗口之后的新文章，归入已有事件或新建事件；
+3) 只把“新增 / 成员变化”的事件交给 scorer，只让 writer 改写这些事件的文本。
+
+快照随日报缓存一起存入 daily_news_cache.refresh_state（JSON）。
+"""
+
+import copy
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from metrics import observe_timings
+from news_dedup import assign_to_existing_events, dedupe_news_payload, exact_match_keys
+
+REFRESH_STATE_VERSION = 1
+
+
+def _article_key(item: Dict[str, Any], fallback_idx: int) -> str:
+    """与 news_scoring_engine 保持一致的文章 ID 规则（缺失时退化为 idx_xxx）。"""
+    value = item.get("id")
+    return str(value) if value is not None else f"idx_{fallback_idx}"
+
+
+def _valid_records(payload: Any) -> List[Dict[str, Any]]:
+    if not isinstance(payload, dict) or payload.get("status") != 200:
+        return []
+    data = payload.get("data")
+    if not isinstance(data, list):
+        return []
+    return [x for x in data if isinstance(x, dict)]
+
+
+def build_refresh_events(deduped_payload: Any, dedup_trace: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    将 dedup 输出转换为快照事件列表。
+    event_id 规则与 build_events_from_dedup 一致，保证与 scored_events 对齐。
+    """
+    data = _valid_records(deduped_payload)
+    id_to_item = {_article_key(item, i): item for i, item in enumerate(data)}
+    clusters = []
+    if isinstance(dedup_trace, dict) and isinstance(dedup_trace.get("clusters"), list):
+        clusters = [c for c in dedup_trace["clusters"] if isinstance(c, dict)]
+
+    events: List[Dict[str, Any]] = []
+    if clusters:
+        for i, cluster in enumerate(clusters):
+            kept_id = str(cluster.get("kept_id") or "").strip()
+            rep_item = id_to_item.get(kept_id)
+            if rep_item is None:
+                continue
+            member_ids = cluster.get("member_ids")
+            if not isinstance(member_ids, list) or not member_ids:
+                member_ids = [kept_id]
+            events.append(
+                {
+                    "event_id": str(cluster.get("cluster_id") or kept_id or f"event_{i+1}"),
+                    "article": rep_item,
+                    "member_ids": [str(x) for x in member_ids],
+                }
+            )
+    else:
+        for i, item in enumerate(data):
+            article_id = _article_key(item, i)
+            events.append(
+                {
+                    "event_id": f"event_{article_id}",
+                    "article": item,
+                    "member_ids": [article_id],
+                }
+            )
+    return events
+
+
+def collect_seen_ids(events: List[Dict[str, Any]], dedup_trace: Optional[Dict[str, Any]]) -> List[str]:
+    """汇总已处理过的文章 ID（事件成员 + 规则去重丢弃项），增量拉取时据此跳过。"""
+    seen: Set[str] = set()
+    for event in events:
+        seen.update(str(x) for x in event.get("member_ids") or [])
+    if isinstance(dedup_trace, dict):
+        seen.update(str(x) for x in dedup_trace.get("kept_ids") or [])
+        for dropped in dedup_trace.get("dropped") or []:
+            if isinstance(dropped, dict) and dropped.get("id") is not None:
+                seen.add(str(dropped["id"]))
+    return sorted(seen)
+
+
+def build_snapshot(
+    events: List[Dict[str, Any]],
+    seen_ids: List[str],
+    window_end: datetime,
+    run_seq: int = 0,
+) -> Dict[str, Any]:
+    """fetcher 产出的刷新快照（尚不含评分与改写文本）。"""
+    return {
+        "events": events,
+        "seen_ids": seen_ids,
+        "window_end": window_end.isoformat(),
+        "run_seq": run_seq,
+    }
+
+
+def merge_incremental_articles(
+    refresh_state: Dict[str, Any],
+    new_payload: Any,
+    *,
+    mode: str,
+    threshold: float,
+    debug: bool,
+    embedding_model: str,
+) -> Tuple[List[Dict[str, Any]], List[str], List[str], Dict[str, Any]]:
+    """
+    把新拉取的文章并入已有事件。
+    返回: (全部事件, 成员变化的已有事件ID, 新事件ID, meta)
+
+    规则：
+    - ID 已见过或与已有代表稿 URL/标题完全一致 -> 视为重复，直接丢弃；
+    - 其余新文章先在内部做一次常规去重，得到新簇；
+    - semantic 模式下新簇代表稿与已有事件代表稿比较，达到阈值则并入（事件成员变化），否则新建事件。
+    """
+    events = copy.deepcopy(refresh_state.get("events") or [])
+    seen_ids: Set[str] = set(refresh_state.get("seen_ids") or [])
+    run_seq = int(refresh_state.get("run_seq") or 0) + 1
+    meta: Dict[str, Any] = {
+        "fetched_count": 0,
+        "duplicate_count": 0,
+        "fresh_count": 0,
+        "merged_clusters": 0,
+        "new_clusters": 0,
+        "warnings": [],
+    }
+
+    key_index: Set[str] = set()
+    for event in events:
+        key_index.update(exact_match_keys(event.get("article") or {}))
+
+    records = _valid_records(new_payload)
+    meta["fetched_count"] = len(records)
+    fresh: List[Dict[str, Any]] = []
+    for item in records:
+        article_id = item.get("id")
+        keys = exact_match_keys(item)
+        if (article_id is not None and str(article_id) in seen_ids) or any(k in key_index for k in keys):
+            meta["duplicate_count"] += 1
+            continue
+        fresh.append(item)
+        key_index.update(keys)
+    meta["fresh_count"] = len(fresh)
+    if not fresh:
+        return events, [], [], {**meta, "run_seq": run_seq, "seen_ids": sorted(seen_ids)}
+
+    deduped, dedup_meta, dedup_trace = dedupe_news_payload(
+        {"status": 200, "message": "ok", "data": fresh},
+        enabled=True,
+        mode=mode,
+        threshold=threshold,
+        debug=debug,
+        embedding_model=embedding_model,
+    )
+    meta["dedup_timing_ms"] = dedup_meta.get("timing_ms")
+    observe_timings("dedup", dedup_meta.get("timing_ms"))
+    new_events = build_refresh_events(deduped, dedup_trace)
+
+    matches: List[Optional[int]] = [None] * len(new_events)
+    if mode == "semantic" and events and new_events:
+        try:
+            matches = assign_to_existing_events(
+                [e["article"] for e in new_events],
+                [e["article"] for e in events],
+                threshold=threshold,
+                embedding_model=embedding_model,
+            )
+        except Exception as e:
+            # 归并失败 -> fail-open：全部视为新事件
+            meta["warnings"].append(f"assign_failed:{str(e)}")
+
+    touched: List[str] = []
+    created: List[str] = []
+    for new_event, match in zip(new_events, matches):
+        if match is not None:
+            target = events[match]
+            target["member_ids"] = list(target.get("member_ids") or []) + new_event["member_ids"]
+            if target["event_id"] not in touched:
+                touched.append(target["event_id"])
+            meta["merged_clusters"] += 1
+            continue
+        new_event["event_id"] = f"r{run_seq}_{new_event['event_id']}"
+        events.append(new_event)
+        created.append(new_event["event_id"])
+        meta["new_clusters"] += 1
+
+    seen_ids.update(collect_seen_ids(new_events, dedup_trace))
+    for item in fresh:
+        if item.get("id") is not None:
+            seen_ids.add(str(item["id"]))
+    meta.update({"run_seq": run_seq, "seen_ids": sorted(seen_ids)})
+    return events, touched, created, meta
+
+
+def build_scoring_input(
+    events: List[Dict[str, Any]], event_ids: List[str]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """只为指定事件构造 scorer 输入（payload + dedup_trace），保持 event_id 与 event_size 不变。"""
+    wanted = set(event_ids)
+    data: List[Dict[str, Any]] = []
+    clusters: List[Dict[str, Any]] = []
+    for event in events:
+        if event["event_id"] not in wanted:
+            continue
+        article = event["article"]
+        kept_id = _article_key(article, len(data))
+        data.append(article)
+        clusters.append(
+            {
+                "cluster_id": event["event_id"],
+                "kept_id": kept_id,
+                "member_ids": list(event.get("member_ids") or [kept_id]),
+            }
+        )
+    payload = {"status": 200, "message": "ok", "data": data}
+    trace = {"kept_ids": [c["kept_id"] for c in clusters], "dropped": [], "clusters": clusters}
+    return payload, trace
+
+
+def merge_rewrite_texts(
+    previous: Optional[Dict[str, Dict[str, str]]],
+    current: Dict[str, Dict[str, str]],
+    rewritten_ids: Optional[List[str]],
+    live_event_ids: Set[str],
+) -> Dict[str, Dict[str, str]]:
+    """合并改写文本：丢弃已失效事件与本轮被重写事件的旧文本，再叠加本轮结果。"""
+    stale = set(rewritten_ids or [])
+    merged: Dict[str, Dict[str, str]] = {}
+    for kind in ("headlines", "summaries"):
+        kept = {
+            event_id: text
+            for event_id, text in ((previous or {}).get(kind) or {}).items()
+            if event_id in live_event_ids and event_id not in stale
+        }
+        kept.update((current or {}).get(kind) or {})
+        merged[kind] = kept
+    return merged
+
+
+def build_refresh_state(
+    snapshot: Optional[Dict[str, Any]],
+    scored_events: Optional[List[Dict[str, Any]]],
+    rewrite_texts: Optional[Dict[str, Dict[str, str]]],
+) -> Optional[str]:
+    """把一次运行的结果序列化为可持久化的刷新状态；缺少评分结果时不支持增量，返回 None。"""
+    if not snapshot or not scored_events:
+        return None
+    state = {
+        "version": REFRESH_STATE_VERSION,
+        "events": snapshot.get("events") or [],
+        "seen_ids": snapshot.get("seen_ids") or [],
+        "window_end": snapshot.get("window_end"),
+        "run_seq": snapshot.get("run_seq") or 0,
+        "scored_events": scored_events,
+        "rewrite_texts": rewrite_texts or {"headlines": {}, "summaries": {}},
+    }
+    return json.dumps(state, ensure_ascii=False)
+
+
+def load_refresh_state(cached: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """从 get_cached_news 结果中解析刷新状态；版本不符或缺失时返回 None（调用方退回全量刷新）。"""
+    if not cached or not cached.get("refresh_state"):
+        return None
+    try:
+        state = json.loads(cached["refresh_state"])
+    except Exception as e:
+        print(f"⚠️ [Incremental] refresh_state parse failed: {e}")
+        return None
+    if not isinstance(state, dict) or state.get("version") != REFRESH_STATE_VERSION:
+        return None
+    if not state.get("window_end") or not state.get("scored_events"):
+        return None
+    return state
@@ -297,6 +297,7 @@ def score_events(
     llm: Any = None,
     topk: int = 10,
     debug: bool = False,
+    source_pool_urls: Optional[List[str]] = None,
 ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
     批量评分主入口（核心链路）：
@@ -306,6 +307,9 @@ def score_events(
     4) Step B 批量通用维度打分
     5) Step D 规则惩罚计算
     6) 合成 final_score 并按分数排序
+
+    source_pool_urls: 增量刷新只对部分事件评分时，传入当日全部事件的代表稿 URL，
+    使来源灌水惩罚仍按全天来源分布计算。
     """
     from simple_bot import llm_fast, llm_reasoning
 
@@ -356,7 +360,10 @@ def score_events(
         DEFAULT_WEIGHT_HINT.get("penalty", {}).get("penalty_score", 1.0)
     )
     event_by_id = {e.event_id: e for e in events}
-    source_counter = Counter(_extract_domain(e.articles[0].sourceURL) for e in events)
+    if source_pool_urls is not None:
+        source_counter = Counter(_extract_domain(url) for url in source_pool_urls)
+    else:
+        source_counter = Counter(_extract_domain(e.articles[0].sourceURL) for e in events)
 
     # Step A：批量分类 + 主体抽取（LLM）
     step_a_t0 = time.perf_counter()
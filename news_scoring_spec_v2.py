@@ -388,6 +388,7 @@ def score_events(
     llm: Any = None,
     topk: int = 10,
     debug: bool = False,
+    source_pool_urls: Optional[List[str]] = None,
 ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
     对外统一入口：代理到执行引擎。
@@ -402,4 +403,5 @@ def score_events(
         llm=llm,
         topk=topk,
         debug=debug,
+        source_pool_urls=source_pool_urls,
     )
@@ -0,0 +1,124 @@
+"""
+流水线中间结果落库
+==================
+职责：
+1) 为每次 fetcher -> dedup -> scorer 执行分配 run_id，并登记到 news_runs；
+2) fetcher 阶段写入原始文章（news_articles，按文章 ID upsert）；
+3) dedup 阶段写入本轮去重簇（news_clusters + news_cluster_members）；
+4) scorer 阶段写入本轮事件评分（news_event_scores，含 score_breakdown）。
+
+所有写入均为 fail-open：落库失败只打印告警，不影响日报生成。
+读取接口见 database.get_articles / get_run_clusters / get_event_scores / get_latest_run_id。
+"""
+
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import NEWS_STORE_ENABLED
+from database import save_articles, save_clusters, save_event_scores, save_news_run
+
+
+def _article_id(item: Dict[str, Any]) -> Optional[str]:
+    """文章主键：优先接口 ID，缺失时退化为 URL（两者都没有则不落库）。"""
+    if item.get("id") is not None:
+        return str(item["id"])
+    url = str(item.get("sourceURL") or "").strip()
+    return f"url:{url}" if url else None
+
+
+def new_run_id(category: str, started_at: datetime) -> str:
+    """run_id 形如 AI-20260101T083000-1a2b3c（时间为 UTC）。"""
+    return f"{category}-{started_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def record_run(
+    run_id: str,
+    category: str,
+    mode: str,
+    window_start: Optional[datetime],
+    window_end: Optional[datetime],
+) -> None:
+    """登记一轮执行（mode: full / incremental）。"""
+    if not NEWS_STORE_ENABLED:
+        return
+    try:
+        save_news_run(
+            run_id,
+            category,
+            mode,
+            window_start.isoformat() if window_start else None,
+            window_end.isoformat() if window_end else None,
+        )
+    except Exception as e:
+        print(f"⚠️ [NewsStore] save run failed run_id={run_id}: {e}")
+
+
+def record_articles(category: str, payload: Any) -> int:
+    """写入新闻接口返回的原始文章（去重之前的全集）。"""
+    if not NEWS_STORE_ENABLED:
+        return 0
+    if not isinstance(payload, dict) or payload.get("status") != 200:
+        return 0
+    rows: List[Dict[str, Any]] = []
+    for item in payload.get("data") or []:
+        if not isinstance(item, dict):
+            continue
+        article_id = _article_id(item)
+        if article_id is None:
+            continue
+        rows.append(
+            {
+                "article_id": article_id,
+                "category": item.get("category") or category,
+                "title": item.get("title"),
+                "summary": item.get("summary"),
+                "source_url": item.get("sourceURL"),
+                "source_name": item.get("sourceName"),
+                "published_at": item.get("publishedAt"),
+                "raw_json": json.dumps(item, ensure_ascii=False),
+            }
+        )
+    if not rows:
+        return 0
+    try:
+        return save_articles(rows)
+    except Exception as e:
+        print(f"⚠️ [NewsStore] save articles failed category={category}: {e}")
+        return 0
+
+
+def record_clusters(run_id: Optional[str], category: str, events: List[Dict[str, Any]]) -> int:
+    """
+    写入本轮去重簇。events 为 news_incremental.build_refresh_events 的输出
+    （event_id 与 dedup_trace 的 cluster_id 一致，article 为代表稿）。
+    """
+    if not NEWS_STORE_ENABLED or not run_id:
+        return 0
+    clusters = []
+    for event in events:
+        article = event.get("article") or {}
+        clusters.append(
+            {
+                "cluster_id": str(event.get("event_id")),
+                "kept_id": _article_id(article),
+                "member_ids": [str(x) for x in event.get("member_ids") or []],
+            }
+        )
+    try:
+        return save_clusters(run_id, category, clusters)
+    except Exception as e:
+        print(f"⚠️ [NewsStore] save clusters failed run_id={run_id}: {e}")
+        return 0
+
+
+def record_scores(run_id: Optional[str], category: str, scored_events: Optional[List[Dict[str, Any]]]) -> int:
+    """写入本轮事件评分（增量模式下为与上一轮合并后的完整结果）。"""
+    if not NEWS_STORE_ENABLED or not run_id or not scored_events:
+        return 0
+    try:
+        return save_event_scores(run_id, category, scored_events)
+    except Exception as e:
+        print(f"⚠️ [NewsStore] save scores failed run_id={run_id}: {e}")
+        return 0
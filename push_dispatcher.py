@@ -0,0 +1,323 @@
+"""
+每日推送并发分发
+================
+职责：
+1) 以有界并发（信号量）把投递单元中的消息发给每个用户，慢响应只占用一个并发槽位，不拖慢后续用户；
+2) 令牌桶限速，整体发送速率不超过飞书单应用的 QPS 配额；
+3) 5xx / 429 / 频控错误码 / 网络异常按指数退避 + 抖动重试，其它业务错误直接记为失败；
+   逐用户发送的每条消息带固定 uuid，超时 / 5xx 后重发不会产生重复消息；
+4) 同一投递单元内容相同：优先走批量发送接口（一次请求发给最多 200 个 open_id），
+   接口返回的无效 open_id 逐个记为失败；批量请求无法去重，只对明确未受理的结果（429 / 频控）重试，
+   明确被拒绝（4xx / 业务错误码）或重试后仍被限流时回退为逐用户发送（带 uuid），
+   结果不确定（超时 / 5xx）时整批记为失败、不再重发；
+5) 每轮分发汇总接口调用数、吞吐、延迟分位数、重试与失败明细（DispatchStats）。
+
+用法（调度器线程中）：
+    stats = run_dispatch(units)
+    print(stats.summary())
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    PUSH_BATCH_SEND_ENABLED,
+    PUSH_BATCH_SEND_MAX_RECIPIENTS,
+    PUSH_DISPATCH_CONCURRENCY,
+    PUSH_MAX_RETRIES,
+    PUSH_RATE_BURST,
+    PUSH_RATE_LIMIT_QPS,
+    PUSH_RETRY_BASE_DELAY_SEC,
+    PUSH_RETRY_MAX_DELAY_SEC,
+)
+from feishu_client import FeishuResult, feishu_client
+from messaging import _batch_send_request, _send_request
+from metrics import FEISHU_MESSAGES
+
+# 飞书频控错误码（请求过于频繁）
+_RATE_LIMIT_CODES = {99991400}
+BATCH_SEND_PATH = "/message/v4/batch_send/"
+_SEND_PATH = "/im/v1/messages"
+
+
+class TokenBucket:
+    """异步令牌桶：rate 为每秒补充的令牌数，capacity 为允许的突发量。"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                # 持锁等待：保证令牌按到达顺序发放
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class DispatchStats:
+    """一轮分发的统计结果。"""
+
+    def __init__(self):
+        self.total = 0
+        self.sent = 0
+        self.retries = 0
+        self.api_calls = 0
+        self.batch_calls = 0
+        self.batch_fallbacks = 0
+        self.latencies_ms: List[float] = []
+        self.failures: List[Tuple[str, str]] = []  # (receive_id, error)
+        # 其中结果不确定的接收方（批量请求超时 / 5xx，可能已受理）：调用方不应再重发
+        self.unknown: List[Tuple[str, str]] = []
+        self.elapsed_sec = 0.0
+
+    @property
+    def failed(self) -> int:
+        return len(self.failures)
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        latencies = sorted(self.latencies_ms)
+        return {
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "unknown": len(self.unknown),
+            "retries": self.retries,
+            "api_calls": self.api_calls,
+            "batch_calls": self.batch_calls,
+            "batch_fallbacks": self.batch_fallbacks,
+            "elapsed_sec": round(self.elapsed_sec, 2),
+            "throughput_per_sec": round(self.throughput, 1),
+            "latency_p50_ms": round(_percentile(latencies, 50), 1),
+            "latency_p95_ms": round(_percentile(latencies, 95), 1),
+            "latency_p99_ms": round(_percentile(latencies, 99), 1),
+            "latency_max_ms": round(latencies[-1], 1) if latencies else 0.0,
+        }
+
+    def summary(self) -> str:
+        d = self.as_dict()
+        return (
+            f"sent={d['sent']}/{d['total']} failed={d['failed']} (unknown={d['unknown']}) retries={d['retries']} "
+            f"api_calls={d['api_calls']} (batch={d['batch_calls']}, fallback={d['batch_fallbacks']}) "
+            f"elapsed={d['elapsed_sec']}s throughput={d['throughput_per_sec']}/s "
+            f"p50={d['latency_p50_ms']}ms p95={d['latency_p95_ms']}ms p99={d['latency_p99_ms']}ms"
+        )
+
+
+def _is_rate_limited(res: FeishuResult) -> bool:
+    """请求被限流：飞书明确未受理，重发不会产生重复消息。"""
+    return res.status_code == 429 or res.code in _RATE_LIMIT_CODES
+
+
+def _is_retryable(res: FeishuResult) -> bool:
+    if res.status_code is None:
+        # 网络异常 / 超时（拿不到 token 时不重试）
+        return res.error is not None and "tenant_access_token" not in res.error
+    return _is_rate_limited(res) or res.status_code >= 500
+
+
+def _is_rejected(res: FeishuResult) -> bool:
+    """
+    请求被明确拒绝（飞书未发送任何消息）：4xx（429 除外）、2xx 的业务错误码、拿不到 token。
+    超时 / 网络异常 / 5xx 可能已被受理，不属于此类。
+    """
+    if res.status_code is None:
+        return res.error is not None and "tenant_access_token" in res.error
+    if _is_rate_limited(res):
+        return False
+    return 400 <= res.status_code < 500 or (res.status_code < 300 and res.code not in (None, 0))
+
+
+def _backoff_delay(attempt: int) -> float:
+    """指数退避 + 全抖动：[0, min(max, base * 2^attempt)]。"""
+    return random.uniform(0, min(PUSH_RETRY_MAX_DELAY_SEC, PUSH_RETRY_BASE_DELAY_SEC * (2 ** attempt)))
+
+
+class PushDispatcher:
+    def __init__(
+        self,
+        concurrency: int = PUSH_DISPATCH_CONCURRENCY,
+        rate_limit_qps: float = PUSH_RATE_LIMIT_QPS,
+        burst: int = PUSH_RATE_BURST,
+        max_retries: int = PUSH_MAX_RETRIES,
+        batch_send: bool = PUSH_BATCH_SEND_ENABLED,
+        batch_size: int = PUSH_BATCH_SEND_MAX_RECIPIENTS,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.rate_limit_qps = rate_limit_qps
+        self.burst = burst
+        self.max_retries = max_retries
+        self.batch_send = batch_send
+        self.batch_size = max(1, batch_size)
+        self._bucket: Optional[TokenBucket] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _call(
+        self, path: str, params: Optional[Dict], payload: Dict, stats: DispatchStats, idempotent: bool = True
+    ) -> FeishuResult:
+        """
+        带限速与重试的一次接口调用；返回最后一次的结果。
+        idempotent=False（请求不带 uuid，如批量发送）时只重试限流，超时 / 5xx 可能已受理，不重发。
+        """
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._bucket.acquire()
+                started_at = time.perf_counter()
+                res = await feishu_client.arequest("POST", path, params=params, json=payload)
+                stats.latencies_ms.append((time.perf_counter() - started_at) * 1000)
+                stats.api_calls += 1
+            retryable = _is_retryable(res) if idempotent else _is_rate_limited(res)
+            if res.ok or attempt >= self.max_retries or not retryable:
+                return res
+            stats.retries += 1
+            # 退避期间释放并发槽位，让其它请求继续发送
+            await asyncio.sleep(_backoff_delay(attempt))
+        return res
+
+    async def _send_one(
+        self,
+        receive_id: str,
+        content: str,
+        receive_id_type: str,
+        stats: DispatchStats,
+        request_uuid: Optional[str] = None,
+    ) -> bool:
+        """逐用户发送；未指定 request_uuid 时生成一个，本次调用内的重试共用同一 uuid。"""
+        params, payload = _send_request(receive_id, content, receive_id_type, uuid=request_uuid or uuid.uuid4().hex)
+        res = await self._call(_SEND_PATH, params, payload, stats)
+        FEISHU_MESSAGES.inc(api="push", result="sent" if res.ok else "failed")
+        if res.ok:
+            stats.sent += 1
+            return True
+        stats.failures.append((receive_id, res.error or "unknown"))
+        return False
+
+    async def _send_batch(
+        self, open_ids: List[str], content: str, stats: DispatchStats, uuids: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        批量发送一组 open_id：整批被明确拒绝、或重试后仍被限流（均未受理）时回退为逐用户发送（uuids 见 dispatch）；
+        结果不确定（超时 / 5xx，可能已受理）时整批记为失败并登记到 stats.unknown，避免同一卡片发送两次。
+        """
+        uuids = uuids or {}
+        res = await self._call(BATCH_SEND_PATH, None, _batch_send_request(open_ids, content), stats, idempotent=False)
+        stats.batch_calls += 1
+        if not res.ok and (_is_rejected(res) or _is_rate_limited(res)):
+            print(f"⚠️ [Dispatch] Batch send not accepted for {len(open_ids)} users, falling back: {res.error}")
+            stats.batch_fallbacks += 1
+            await asyncio.gather(
+                *(self._send_one(open_id, content, "open_id", stats, uuids.get(open_id)) for open_id in open_ids)
+            )
+            return
+        if not res.ok:
+            print(f"⚠️ [Dispatch] Batch send outcome unknown for {len(open_ids)} users, not resending: {res.error}")
+            error = f"batch_send outcome unknown: {res.error or 'unknown'}"
+            stats.failures.extend((open_id, error) for open_id in open_ids)
+            stats.unknown.extend((open_id, error) for open_id in open_ids)
+            FEISHU_MESSAGES.inc(len(open_ids), api="push_batch", result="failed")
+            return
+        # 批量接口为异步投递：只返回无法识别的 open_id，其余视为已受理
+        invalid = set(res.data.get("invalid_open_ids") or [])
+        for open_id in open_ids:
+            if open_id in invalid:
+                stats.failures.append((open_id, "invalid open_id (batch_send)"))
+            else:
+                stats.sent += 1
+        invalid_count = sum(1 for open_id in open_ids if open_id in invalid)
+        FEISHU_MESSAGES.inc(len(open_ids) - invalid_count, api="push_batch", result="sent")
+        if invalid_count:
+            FEISHU_MESSAGES.inc(invalid_count, api="push_batch", result="failed")
+
+    def _start(self) -> DispatchStats:
+        self._bucket = TokenBucket(self.rate_limit_qps, self.burst)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return DispatchStats()
+
+    async def dispatch(
+        self,
+        messages: Iterable[Tuple[str, str]],
+        receive_id_type: str = "open_id",
+        uuids: Optional[Dict[str, str]] = None,
+    ) -> DispatchStats:
+        """
+        逐用户并发发送 [(receive_id, content), ...]，返回本轮统计。
+        uuids: receive_id -> 请求 uuid（如 outbox 由幂等键派生），跨多次分发保持不变时重发也不会重复。
+        """
+        uuids = uuids or {}
+        stats = self._start()
+        started_at = time.perf_counter()
+        tasks = [
+            self._send_one(receive_id, content, receive_id_type, stats, uuids.get(receive_id))
+            for receive_id, content in messages
+        ]
+        stats.total = len(tasks)
+        await asyncio.gather(*tasks)
+        stats.elapsed_sec = time.perf_counter() - started_at
+        return stats
+
+    async def dispatch_grouped(
+        self, groups: Iterable[Tuple[str, List[str]]], uuids: Optional[Dict[str, str]] = None
+    ) -> DispatchStats:
+        """按相同内容分组发送 [(content, [open_id, ...]), ...]：每组切块走批量接口（uuids 用于逐用户发送）。"""
+        if not self.batch_send:
+            return await self.dispatch(
+                [(open_id, content) for content, open_ids in groups for open_id in open_ids], uuids=uuids
+            )
+        stats = self._start()
+        started_at = time.perf_counter()
+        tasks = []
+        for content, open_ids in groups:
+            stats.total += len(open_ids)
+            for i in range(0, len(open_ids), self.batch_size):
+                tasks.append(self._send_batch(open_ids[i:i + self.batch_size], content, stats, uuids))
+        await asyncio.gather(*tasks)
+        stats.elapsed_sec = time.perf_counter() - started_at
+        return stats
+
+
+def _group_by_content(units) -> List[Tuple[str, List[str]]]:
+    """合并内容完全相同的投递单元（同一类别被切成多个单元时重新聚合）。"""
+    groups: Dict[str, List[str]] = {}
+    for unit in units:
+        groups.setdefault(unit.content, []).extend(unit.user_ids)
+    return list(groups.items())
+
+
+async def dispatch_units(units, dispatcher: Optional[PushDispatcher] = None) -> DispatchStats:
+    """发送 delivery_planner 生成的投递单元（相同内容的用户合并走批量接口）。"""
+    dispatcher = dispatcher or PushDispatcher()
+    return await dispatcher.dispatch_grouped(_group_by_content(units))
+
+
+def run_dispatch(units, dispatcher: Optional[PushDispatcher] = None) -> DispatchStats:
+    """同步入口（调度器线程）：在独立事件循环中分发，结束时关闭该循环上的 HTTP 客户端。"""
+
+    async def _run():
+        try:
+            return await dispatch_units(units, dispatcher)
+        finally:
+            await feishu_client.aclose()
+
+    return asyncio.run(_run())
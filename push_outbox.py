@@ -0,0 +1,231 @@
+"""
+推送 outbox（SQLite 持久化发件箱）
+==================================
+职责：
+1) 推送任务只负责入队：(幂等键, 接收方, 内容哈希)；相同幂等键重复入队被忽略，
+   推送任务重跑 / 服务重启后不会重复发送已发出的消息；
+2) drain_outbox 领取到期消息（带租约），按相同内容（payload_hash）分组交给 PushDispatcher：
+   open_id 接收方走批量发送（PUSH_BATCH_SEND_ENABLED），其余逐条发送；
+   成功标记 sent；失败按指数退避重新排期，超过最大次数转入死信（dead）；
+   批量请求结果不确定（超时 / 5xx，可能已受理）的消息直接转入死信，不重新排期，避免重复推送；
+   进程在发送中途退出时，租约到期后的下一次 drain 会继续发送剩余消息；
+3) 逐条发送的请求 uuid 由幂等键派生（request_uuid），接口超时重试、租约到期后重新领取
+   发出的都是同一 uuid，飞书在 1 小时内只投递一次；
+4) outbox_report 输出各状态深度与积压时长，便于观察推送积压。
+
+说明：批量发送接口不支持 uuid，飞书已受理、但进程在标记 sent 之前崩溃的批量消息，租约到期后会重发一次；
+同一 uuid 的去重窗口为 1 小时，超过 1 小时后的逐条重试仍可能重复。
+
+用法：
+    python push_outbox.py --report             # 查看 outbox 深度与积压
+    python push_outbox.py --drain              # 立即发送所有到期消息
+    python push_outbox.py --requeue-dead [src] # 死信重新入队
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    OUTBOX_CLAIM_LIMIT,
+    OUTBOX_LEASE_SEC,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE_SEC,
+    OUTBOX_RETRY_MAX_SEC,
+)
+from database import (
+    claim_outbox,
+    enqueue_outbox,
+    get_outbox_stats,
+    get_outbox_status,
+    mark_outbox_failed,
+    mark_outbox_sent,
+    requeue_dead_outbox,
+)
+from feishu_client import feishu_client
+from push_dispatcher import DispatchStats, PushDispatcher
+
+
+def payload_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def enqueue(
+    messages: Iterable[Tuple[str, str, str]],
+    source: str,
+    receive_id_type: str = "open_id",
+) -> int:
+    """入队 [(idempotency_key, receive_id, content), ...]，返回新入队条数（已存在的幂等键忽略）。"""
+    hashes: Dict[str, str] = {}
+    rows = []
+    for key, receive_id, content in messages:
+        if content not in hashes:
+            hashes[content] = payload_hash(content)
+        rows.append(
+            {
+                "idempotency_key": key,
+                "source": source,
+                "receive_id": receive_id,
+                "receive_id_type": receive_id_type,
+                "payload_hash": hashes[content],
+                "content": content,
+            }
+        )
+    return enqueue_outbox(rows) if rows else 0
+
+
+def enqueue_units(units, date_str: str) -> int:
+    """每日推送入队：幂等键 = daily_push:日期:类别:用户，同一天重跑推送不会重复发送。"""
+    return enqueue(
+        (
+            (f"daily_push:{date_str}:{unit.category}:{user_id}", user_id, unit.content)
+            for unit in units
+            for user_id in unit.user_ids
+        ),
+        source="daily_push",
+    )
+
+
+def request_uuid(idempotency_key: str) -> str:
+    """飞书请求去重 uuid（上限 50 字符）：幂等键的 sha1。"""
+    return hashlib.sha1(idempotency_key.encode("utf-8")).hexdigest()[:50]
+
+
+def _retry_at(attempts: int) -> Optional[float]:
+    """下一次重试时间（epoch 秒）；超过最大次数返回 None（转入死信）。"""
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        return None
+    delay = min(OUTBOX_RETRY_MAX_SEC, OUTBOX_RETRY_BASE_SEC * (2 ** (attempts - 1)))
+    return time.time() + delay * random.uniform(0.5, 1.0)
+
+
+async def _send_group(
+    dispatcher: PushDispatcher, content: str, receive_id_type: str, rows: List[Dict[str, Any]]
+) -> DispatchStats:
+    # 逐条发送带幂等键派生的 uuid（同一接收方只发一次，取第一条的幂等键）
+    uuids: Dict[str, str] = {}
+    for row in rows:
+        uuids.setdefault(row["receive_id"], request_uuid(row["idempotency_key"]))
+    if receive_id_type == "open_id":
+        return await dispatcher.dispatch_grouped([(content, list(uuids))], uuids=uuids)
+    return await dispatcher.dispatch(
+        [(receive_id, content) for receive_id in uuids], receive_id_type, uuids=uuids
+    )
+
+
+async def adrain_outbox(dispatcher: Optional[PushDispatcher] = None, limit: int = OUTBOX_CLAIM_LIMIT) -> Dict[str, int]:
+    """发送所有到期消息（逐批领取直到队列中没有到期消息），返回本次汇总。"""
+    dispatcher = dispatcher or PushDispatcher()
+    summary = {"claimed": 0, "sent": 0, "retry_scheduled": 0, "dead": 0, "unknown": 0, "api_calls": 0}
+    while True:
+        rows = claim_outbox(limit, OUTBOX_LEASE_SEC)
+        if not rows:
+            break
+        summary["claimed"] += len(rows)
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            groups[(row["payload_hash"], row["receive_id_type"])].append(row)
+
+        for (_, receive_id_type), group_rows in groups.items():
+            stats = await _send_group(dispatcher, group_rows[0]["content"], receive_id_type, group_rows)
+            summary["api_calls"] += stats.api_calls
+            errors = dict(stats.failures)
+            unknown = dict(stats.unknown)
+            sent_ids, failures = [], []
+            for row in group_rows:
+                error = errors.get(row["receive_id"])
+                if error is None:
+                    sent_ids.append(row["id"])
+                    continue
+                if row["receive_id"] in unknown:
+                    # 可能已送达：不重新排期，转入死信由人工确认（--requeue-dead）
+                    failures.append((row["id"], unknown[row["receive_id"]], None))
+                    summary["unknown"] += 1
+                    continue
+                next_at = _retry_at(row["attempts"])
+                failures.append((row["id"], error, next_at))
+                summary["retry_scheduled" if next_at is not None else "dead"] += 1
+            mark_outbox_sent(sent_ids)
+            mark_outbox_failed(failures)
+            summary["sent"] += len(sent_ids)
+    return summary
+
+
+def drain_outbox(dispatcher: Optional[PushDispatcher] = None, limit: int = OUTBOX_CLAIM_LIMIT) -> Dict[str, int]:
+    """同步入口（调度器线程）：在独立事件循环中发送，结束时关闭该循环上的 HTTP 客户端。"""
+
+    async def _run():
+        try:
+            return await adrain_outbox(dispatcher, limit)
+        finally:
+            await feishu_client.aclose()
+
+    summary = asyncio.run(_run())
+    if summary["claimed"]:
+        print(
+            f"📮 [Outbox] Drained: claimed={summary['claimed']} sent={summary['sent']} "
+            f"retry={summary['retry_scheduled']} dead={summary['dead']} unknown={summary['unknown']} "
+            f"api_calls={summary['api_calls']}"
+        )
+    return summary
+
+
+def send_via_outbox(
+    idempotency_key: str,
+    receive_id: str,
+    content: str,
+    source: str,
+    receive_id_type: str = "open_id",
+) -> str:
+    """入队并立即发送一条消息，返回其状态：sent / pending（已排期重试）/ dead。"""
+    enqueue([(idempotency_key, receive_id, content)], source=source, receive_id_type=receive_id_type)
+    drain_outbox()
+    return get_outbox_status([idempotency_key]).get(idempotency_key, "pending")
+
+
+def outbox_report() -> Dict[str, Any]:
+    """outbox 深度与积压（lag_sec：最早一条未发消息已等待的秒数）。"""
+    stats = get_outbox_stats()
+    lag_sec = None
+    if stats["oldest_unsent_created_at"]:
+        lag_sec = round((datetime.now() - datetime.fromisoformat(str(stats["oldest_unsent_created_at"]))).total_seconds(), 1)
+    counts = stats["counts"]
+    return {
+        "pending": counts.get("pending", 0),
+        "sending": counts.get("sending", 0),
+        "sent": counts.get("sent", 0),
+        "dead": counts.get("dead", 0),
+        "lag_sec": lag_sec,
+        "unsent_by_source": stats["unsent_by_source"],
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"📮 [Outbox] pending={report['pending']} sending={report['sending']} "
+        f"sent={report['sent']} dead={report['dead']} lag_sec={report['lag_sec']}"
+    )
+    for item in report["unsent_by_source"]:
+        print(f"   {item['source']:<16} {item['status']:<8} {item['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推送 outbox 运维工具")
+    parser.add_argument("--report", action="store_true", help="打印 outbox 深度与积压")
+    parser.add_argument("--drain", action="store_true", help="立即发送所有到期消息")
+    parser.add_argument("--requeue-dead", nargs="?", const="", metavar="SOURCE", help="死信重新入队（可按来源过滤）")
+    args = parser.parse_args()
+    if args.requeue_dead is not None:
+        print(f"♻️ [Outbox] Requeued {requeue_dead_outbox(args.requeue_dead or None)} dead messages")
+    if args.drain:
+        drain_outbox()
+    print_report(outbox_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+服务就绪状态与启动预热
+======================
+职责：
+1) LLM 客户端与 LangGraph 图均为懒加载（simple_bot / agent_graph 的模块级 __getattr__），
+   进程启动后由 start_warmup 在后台线程中提前创建，webhook 不必等待；
+2) readiness() 汇总各组件状态，供 GET /ready 使用（GET / 仍只表示进程存活）：
+   - db：数据库可读写（现查 SELECT 1）；
+   - token：飞书 tenant_access_token 已缓存；
+   - graph / llm：图已编译、LLM 客户端已创建（agent 在 worker 进程执行时 Web 进程不需要，标记为 skipped）；
+3) profile_imports 用 `python -X importtime` 统计启动路径上最慢的导入，便于定位启动耗时。
+
+用法：
+    python readiness.py --profile                  # lark_service 导入耗时 Top 25
+    python readiness.py --profile job_worker --top 40
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_state_lock = threading.Lock()
+# 组件 -> {"status": pending/ok/failed/skipped, "ms": 耗时, "error": 错误}
+_components: Dict[str, Dict[str, Any]] = {}
+_started_at = time.time()
+_ready_at: Optional[float] = None
+
+
+def _set(name: str, status: str, ms: Optional[int] = None, error: Optional[str] = None) -> None:
+    with _state_lock:
+        _components[name] = {"status": status, "ms": ms, "error": error}
+
+
+def _warm_graph() -> None:
+    import agent_graph
+
+    agent_graph.graph  # 触发编译
+
+
+def _warm_llm() -> None:
+    import simple_bot
+
+    simple_bot.llm_fast, simple_bot.llm_reasoning  # 触发创建
+
+
+def _warm_token() -> None:
+    from feishu_auth import get_token_provider
+
+    if not get_token_provider().get_token():
+        raise RuntimeError("tenant_access_token unavailable")
+
+
+def _run_step(name: str, fn: Callable[[], None]) -> None:
+    t0 = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        _set(name, "failed", int((time.perf_counter() - t0) * 1000), f"{type(e).__name__}: {e}")
+        print(f"⚠️ [Ready] Warm-up {name} failed: {e}")
+        return
+    _set(name, "ok", int((time.perf_counter() - t0) * 1000))
+
+
+def _plan(agent_in_process: bool) -> List[Tuple[str, Callable[[], None]]]:
+    """登记本进程需要预热的组件（先标记为 pending，避免预热线程开始前 /ready 误报就绪）。"""
+    steps: List[Tuple[str, Callable[[], None]]] = [("token", _warm_token)]
+    if agent_in_process:
+        steps += [("llm", _warm_llm), ("graph", _warm_graph)]
+    else:
+        _set("llm", "skipped")
+        _set("graph", "skipped")
+    for name, _ in steps:
+        _set(name, "pending")
+    return steps
+
+
+def warm_up(agent_in_process: bool = True) -> None:
+    """依次预热 token、LLM 客户端与图；agent_in_process=False 时跳过后两者（由 worker 进程负责）。"""
+    steps = _plan(agent_in_process)
+    for name, fn in steps:
+        _run_step(name, fn)
+    summary = " ".join(f"{name}={_components[name]['status']}({_components[name]['ms']}ms)" for name, _ in steps)
+    print(f"🔥 [Ready] Warm-up finished: {summary}")
+
+
+def start_warmup(agent_in_process: bool = True) -> threading.Thread:
+    """启动后台预热线程（lifespan 中调用，不阻塞服务启动）。"""
+    global _started_at, _ready_at
+    _started_at, _ready_at = time.time(), None
+    _plan(agent_in_process)
+    thread = threading.Thread(target=warm_up, args=(agent_in_process,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _check_db() -> Dict[str, Any]:
+    from database import get_connection
+
+    t0 = time.perf_counter()
+    try:
+        get_connection().execute("SELECT 1").fetchone()
+    except Exception as e:
+        return {"status": "failed", "ms": None, "error": f"{type(e).__name__}: {e}"}
+    return {"status": "ok", "ms": round((time.perf_counter() - t0) * 1000, 2), "error": None}
+
+
+def readiness() -> Dict[str, Any]:
+    """各组件状态；所有组件为 ok / skipped 时 ready=True。token 以当前缓存为准（过期后视为未就绪）。"""
+    global _ready_at
+    from feishu_auth import get_token_provider
+
+    with _state_lock:
+        components = {name: dict(info) for name, info in _components.items()}
+    components["db"] = _check_db()
+    if components.get("token", {}).get("status") == "ok" and not get_token_provider().cached_token():
+        components["token"] = {"status": "expired", "ms": None, "error": None}
+    ready = "token" in components and all(info["status"] in ("ok", "skipped") for info in components.values())
+    if ready and _ready_at is None:
+        _ready_at = time.time()
+    return {
+        "ready": ready,
+        "components": components,
+        "uptime_sec": round(time.time() - _started_at, 1),
+        "ready_after_sec": round(_ready_at - _started_at, 2) if _ready_at else None,
+        "pid": os.getpid(),
+    }
+
+
+def profile_imports(module: str = "lark_service", top: int = 25) -> List[Tuple[int, int, str]]:
+    """在子进程中导入 module（-X importtime），返回累计耗时最高的 [(cumulative_us, self_us, name), ...]。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (.*)$", line)
+        if match:
+            rows.append((int(match.group(2)), int(match.group(1)), match.group(3).rstrip()))
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时与就绪状态")
+    parser.add_argument("--profile", nargs="?", const="lark_service", metavar="MODULE", help="统计模块导入耗时")
+    parser.add_argument("--top", type=int, default=25, help="显示前 N 个最慢的导入")
+    args = parser.parse_args()
+    module = args.profile or "lark_service"
+    rows = profile_imports(module, args.top)
+    print(f"⏱️ [Ready] Import profile for {module} (cumulative / self, ms):")
+    for cumulative, self_us, name in rows:
+        print(f"   {cumulative / 1000:>9.1f} {self_us / 1000:>9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Router 快速通道（零 LLM）
+========================
+职责：
+1) 用预编译的关键词/正则语法识别菜单类指令（"当日AI新闻"、"订阅 GAMES"、问候语等）；
+2) 用归一化文本做 key 的 LRU 缓存记住历史 LLM 路由结果；
+3) 统计命中率并周期性打印，便于观察快速通道的覆盖面。
+
+命中时返回与 router_node 相同结构的 dict；未命中返回 None，由调用方继续走 LLM。
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import (
+    DAILY_NEWS_CATEGORIES,
+    ROUTER_DECISION_CACHE_SIZE,
+    ROUTER_FAST_PATH_ENABLED,
+    ROUTER_FAST_PATH_LOG_EVERY,
+)
+from tracing import annotate
+
+# 类别别名（小写）；未配置别名的类别只匹配自身名称
+CATEGORY_ALIASES: Dict[str, List[str]] = {
+    "AI": ["ai", "人工智能", "科技"],
+    "GAMES": ["games", "game", "游戏"],
+    "MUSIC": ["music", "音乐"],
+}
+
+_TRAILING_PUNCT = "。！!？?～~，,；;…. "
+
+
+def normalize_text(text: str) -> str:
+    """归一化：NFKC（全角转半角）、小写、压缩空白、去掉句末标点。"""
+    normalized = unicodedata.normalize("NFKC", str(text or "")).lower()
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return normalized.rstrip(_TRAILING_PUNCT)
+
+
+def _build_alias_index(categories: List[str]) -> Dict[str, str]:
+    alias_to_category: Dict[str, str] = {}
+    for category in categories:
+        alias_to_category[category.lower()] = category
+        for alias in CATEGORY_ALIASES.get(category, []):
+            alias_to_category[alias] = category
+    return alias_to_category
+
+
+_ALIAS_TO_CATEGORY = _build_alias_index(DAILY_NEWS_CATEGORIES)
+# 长别名优先，避免 "game" 抢先匹配 "games"
+_ALIAS_PATTERN = "|".join(
+    re.escape(alias) for alias in sorted(_ALIAS_TO_CATEGORY, key=len, reverse=True)
+)
+
+# 订阅：订阅/关注/追踪 + 一个或多个类别别名（允许 "关注游戏GAMES" 这种同义重复）
+_SUBSCRIBE_RE = re.compile(
+    rf"^(?:我想|我要|帮我)?(?:订阅|关注|追踪)(?:一下)?\s*(?P<cats>(?:(?:{_ALIAS_PATTERN})\s*)+)(?:板块|类别|频道|新闻)?$"
+)
+# 阅读：可选前缀 + 可选类别 + 新闻/日报 等名词
+_READ_RE = re.compile(
+    rf"^(?:给我|帮我)?(?:看看?|来一?份|获取|查看)?\s*(?:当日|今日|今天的?|最新的?)?\s*"
+    rf"(?P<cat>{_ALIAS_PATTERN})?\s*(?:的)?\s*(?:每日)?(?:新闻|日报|早报|简报|资讯)$"
+)
+# 问候 / 致谢：直接进入 chat
+_GREETING_RE = re.compile(
+    r"^(?:你好|您好|hi|hello|hey|嗨|哈喽|在吗|在不在|早上好|早安|晚上好|晚安|谢谢|多谢|thanks|thank you)(?:呀|啊|哦)?$"
+)
+
+
+class RouterDecisionCache:
+    """线程安全的 LRU：归一化文本 -> 路由结果。"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max(0, int(max_size))
+        self._items: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                return None
+            self._items.move_to_end(key)
+            return dict(value)
+
+    def put(self, key: str, value: Dict) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = dict(value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+decision_cache = RouterDecisionCache(ROUTER_DECISION_CACHE_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {"grammar": 0, "cache": 0, "llm": 0}
+
+
+def _record(source: str) -> None:
+    with _stats_lock:
+        _stats[source] += 1
+        total = sum(_stats.values())
+        snapshot = dict(_stats)
+    if ROUTER_FAST_PATH_LOG_EVERY > 0 and total % ROUTER_FAST_PATH_LOG_EVERY == 0:
+        print(
+            "📊 [RouterFastPath] "
+            f"total={total} "
+            f"grammar={snapshot['grammar'] / total:.1%} "
+            f"cache={snapshot['cache'] / total:.1%} "
+            f"llm={snapshot['llm'] / total:.1%} "
+            f"cache_size={len(decision_cache)}"
+        )
+
+
+def get_stats() -> Dict[str, int]:
+    """返回命中计数快照（grammar/cache/llm）。"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _match_grammar(normalized: str) -> Optional[Dict]:
+    match = _SUBSCRIBE_RE.match(normalized)
+    if match:
+        aliases = re.findall(_ALIAS_PATTERN, match.group("cats"))
+        categories = {_ALIAS_TO_CATEGORY[alias] for alias in aliases}
+        # 多个不同类别属于歧义输入，交给 LLM 处理
+        if len(categories) == 1:
+            return {"intent": "write", "user_preference": categories.pop()}
+        return None
+
+    match = _READ_RE.match(normalized)
+    if match:
+        alias = match.group("cat")
+        return {"intent": "read", "user_preference": _ALIAS_TO_CATEGORY[alias] if alias else None}
+
+    if _GREETING_RE.match(normalized):
+        return {"intent": "chat", "user_preference": None}
+    return None
+
+
+def classify_fast(text: str) -> Optional[Dict]:
+    """
+    快速通道入口：先查语法，再查 LRU。
+    命中返回 {"intent", "user_preference"}，未命中返回 None（并计入 llm 计数）。
+    """
+    if not ROUTER_FAST_PATH_ENABLED:
+        return None
+
+    t0 = time.perf_counter()
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+
+    decision = _match_grammar(normalized)
+    source = "grammar"
+    if decision is None:
+        decision = decision_cache.get(normalized)
+        source = "cache"
+
+    elapsed_us = int((time.perf_counter() - t0) * 1_000_000)
+    if decision is None:
+        _record("llm")
+        return None
+
+    _record(source)
+    annotate(router_source=f"fast_{source}")
+    print(
+        f"⚡ [RouterFastPath] hit={source} intent={decision['intent']} "
+        f"category={decision.get('user_preference')} elapsed_us={elapsed_us}"
+    )
+    return decision
+
+
+def peek_intent(text: str) -> Optional[str]:
+    """只读预判意图（语法 + LRU），不计入命中统计、不打日志；供 webhook 准入控制给消息归类。"""
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    decision = _match_grammar(normalized) or decision_cache.get(normalized)
+    return decision["intent"] if decision else None
+
+
+def remember_decision(text: str, intent: str, category: Optional[str]) -> None:
+    """记录一次 LLM 路由结果，供后续相同文本直接复用。"""
+    if not ROUTER_FAST_PATH_ENABLED or intent not in ("write", "read", "chat"):
+        return
+    normalized = normalize_text(text)
+    if normalized:
+        decision_cache.put(normalized, {"intent": intent, "user_preference": category})
@@ -0,0 +1,95 @@
+"""
+调度器 leader 选举（多 Web 进程部署）
+=====================================
+职责：
+1) 多个 uvicorn worker 进程共用同一份数据目录，只有持有锁文件排他锁的进程是 leader，
+   负责启动 APScheduler 与后台任务 WorkerPool；其余进程只处理 webhook；
+2) 锁由操作系统持有（fcntl.flock）：leader 进程退出或崩溃时内核自动释放，
+   其它进程的后台线程每 SCHEDULER_LEADER_RETRY_SEC 秒尝试一次，抢到后接管调度器；
+3) 不支持 fcntl 的平台退化为单进程语义：直接成为 leader。
+
+说明：锁文件与数据库放在同一目录（同一台机器上的进程共享），跨主机部署需另行选主。
+
+用法：
+    elector = LeaderElection(lock_path, on_elected=start_scheduler)
+    elector.start()   # 立即尝试一次；失败则后台重试
+    ...
+    elector.stop()    # 关闭时释放锁
+"""
+
+import os
+import threading
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from config import SCHEDULER_LEADER_RETRY_SEC
+
+
+class LeaderElection:
+    def __init__(self, lock_path: str, on_elected: Callable[[], None]):
+        self.lock_path = lock_path
+        self.on_elected = on_elected
+        self.is_leader = False
+        self._fd: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _try_acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # 记录 leader 的 pid，便于排查（锁本身不依赖文件内容）
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        self._fd = fd
+        return True
+
+    def _become_leader(self) -> None:
+        self.is_leader = True
+        print(f"👑 [Leader] pid={os.getpid()} acquired {self.lock_path}, starting scheduler")
+        self.on_elected()
+
+    def _wait_for_leadership(self) -> None:
+        while not self._stop.wait(SCHEDULER_LEADER_RETRY_SEC):
+            try:
+                acquired = self._try_acquire()
+            except OSError as e:
+                print(f"⚠️ [Leader] Lock attempt failed: {e}")
+                continue
+            if acquired:
+                if self._stop.is_set():
+                    self._release()
+                    return
+                self._become_leader()
+                return
+
+    def start(self) -> bool:
+        """立即尝试成为 leader；失败时启动后台线程等待接管。返回当前是否为 leader。"""
+        if self._try_acquire():
+            self._become_leader()
+            return True
+        print(f"👥 [Leader] pid={os.getpid()} is a follower (webhooks only), waiting for leadership")
+        self._thread = threading.Thread(target=self._wait_for_leadership, name="leader-election", daemon=True)
+        self._thread.start()
+        return False
+
+    def _release(self) -> None:
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._release()
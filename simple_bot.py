@@ -1,6 +1,7 @@
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from tracing import token_usage_callback
 
 load_dotenv()
 
@@ -11,21 +12,42 @@ api_base = os.getenv("OPENAI_API_BASE")
 fast_model_name = os.getenv("LLM_FAST_MODEL")
 reasoning_model_name = os.getenv("LLM_REASONING_MODEL")
 
-print(f"⚡️ Init Fast LLM: {fast_model_name}")
-llm_fast = ChatOpenAI(
-    model=fast_model_name,
-    openai_api_key=api_key,
-    openai_api_base=api_base,
-    temperature=0.1 # Router 需要精准
-)
-
-print(f"🧠 Init Reasoning LLM: {reasoning_model_name}")
-llm_reasoning = ChatOpenAI(
-    model=reasoning_model_name,
-    openai_api_key=api_key,
-    openai_api_base=api_base,
-    temperature=0.7 # Writer 需要创意
-)
+# 客户端在首次访问 simple_bot.llm_fast / llm_reasoning 时才创建（langchain_openai 导入约 1s），
+# 服务启动与只用到数据库 / 卡片的脚本不再承担这部分耗时
+_llm_lock = threading.Lock()
+
+
+def _build_llm(name):
+    from langchain_openai import ChatOpenAI
+
+    if name == "llm_fast":
+        print(f"⚡️ Init Fast LLM: {fast_model_name}")
+        return ChatOpenAI(
+            model=fast_model_name,
+            openai_api_key=api_key,
+            openai_api_base=api_base,
+            temperature=0.1, # Router 需要精准
+            callbacks=[token_usage_callback], # 节点 span 统计 token 用量
+        )
+    print(f"🧠 Init Reasoning LLM: {reasoning_model_name}")
+    return ChatOpenAI(
+        model=reasoning_model_name,
+        openai_api_key=api_key,
+        openai_api_base=api_base,
+        temperature=0.7, # Writer 需要创意
+        callbacks=[token_usage_callback],
+    )
+
+
+def __getattr__(name):
+    """模块级懒加载：首次访问 llm_fast / llm_reasoning 时创建并缓存为模块属性。"""
+    if name not in ("llm_fast", "llm_reasoning"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _llm_lock:
+        if name not in globals():
+            globals()[name] = _build_llm(name)
+    return globals()[name]
+
 
 def get_bot_response(user_input: str) -> str:
     """
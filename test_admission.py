@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+webhook 准入控制测试脚本
+使用临时 SQLite 数据库，不启动 worker、不调用 LLM。
+
+覆盖：
+1) enqueue_job_admitted：按类别 / 按用户的在途（queued / running）上限，结束的任务释放名额
+2) AdmissionController：进程内计数的上限与 release
+3) 繁忙提示按用户限频
+
+用法：
+    python test_admission.py
+"""
+
+import json
+import os
+import tempfile
+
+import database
+from admission import AdmissionController, should_notify_busy
+
+
+def _fresh_db():
+    """每个用例使用独立的临时数据库。"""
+    database.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="rss_admission_test_"), "test.db")
+    database.init_db()
+
+
+def _enqueue(task_class, user_id, class_limit, user_limit):
+    return database.enqueue_job_admitted(
+        "card_expand", json.dumps({"user_id": user_id}), 0, task_class, user_id, class_limit, user_limit
+    )
+
+
+def test_job_user_limit():
+    """同一用户在途任务达到上限后拒绝，任务完成后释放名额"""
+    _fresh_db()
+    job_ids = [_enqueue("expand", "u1", 0, 2)[0] for _ in range(2)]
+    assert all(job_ids)
+    assert _enqueue("expand", "u1", 0, 2) == (None, "user")
+    # 其它用户不受影响
+    assert _enqueue("expand", "u2", 0, 2)[1] is None
+    # running 仍占名额，done 释放名额
+    job = database.claim_job(0, "test-worker")
+    assert _enqueue("expand", "u1", 0, 2) == (None, "user")
+    database.finish_job(job["id"], None)
+    assert _enqueue("expand", "u1", 0, 2)[1] is None
+
+
+def test_job_class_limit():
+    """同一类别在途任务达到上限后拒绝（类别之间互不影响）"""
+    _fresh_db()
+    for user_id in ("u1", "u2", "u3"):
+        assert _enqueue("expand", user_id, 3, 0)[1] is None
+    assert _enqueue("expand", "u4", 3, 0) == (None, "class")
+    assert _enqueue("chat", "u4", 3, 0)[1] is None
+    # 上限为 0 表示不限制
+    assert _enqueue("expand", "u5", 0, 0)[1] is None
+
+
+def test_controller_limits():
+    """进程内计数：类别 / 用户上限与 release"""
+    controller = AdmissionController({"chat": 2}, per_user_limit=1)
+    assert controller.try_acquire("chat", "u1") is None
+    assert controller.try_acquire("chat", "u1") == "user"
+    assert controller.try_acquire("chat", "u2") is None
+    assert controller.try_acquire("chat", "u3") == "class"
+    controller.release("chat", "u1")
+    assert controller.try_acquire("chat", "u3") is None
+    controller.release("chat", "u2")
+    controller.release("chat", "u3")
+    assert controller.stats() == {"in_flight": {}, "users": 0}
+
+
+def test_busy_notice_rate_limit():
+    """同一用户的繁忙提示在间隔内只发一次"""
+    assert should_notify_busy("busy-user") is True
+    assert should_notify_busy("busy-user") is False
+    assert should_notify_busy("another-user") is True
+
+
+def main():
+    print("\n🧪 准入控制测试")
+    print("=" * 60)
+    tests = [test_job_user_limit, test_job_class_limit, test_controller_limits, test_busy_notice_rate_limit]
+    results = []
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: {test.__doc__}")
+            results.append(True)
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {test.__doc__} {e}")
+            results.append(False)
+
+    print("=" * 60)
+    print(f"通过: {sum(results)}/{len(results)}")
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
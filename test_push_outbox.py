@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+推送 outbox 测试脚本
+使用临时 SQLite 数据库与模拟的飞书接口，不发送真实消息。
+
+覆盖：
+1) enqueue_units 按幂等键去重（同一天重跑推送不会重复入队）
+2) 租约到期后重新领取 sending 消息并继续发送
+3) 接口超时重试 / 租约重新领取时请求 uuid 保持不变（由幂等键派生）
+4) 失败次数达到 OUTBOX_MAX_ATTEMPTS 后转入死信
+
+用法：
+    python test_push_outbox.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import database
+import push_dispatcher
+import push_outbox
+from config import OUTBOX_MAX_ATTEMPTS
+from delivery_planner import DeliveryUnit
+from feishu_client import FeishuResult, feishu_client
+
+DATE_STR = "2026-01-01"
+
+
+def _fresh_db():
+    """每个用例使用独立的临时数据库。"""
+    database.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="rss_outbox_test_"), "test.db")
+    database.init_db()
+
+
+class FakeFeishu:
+    """模拟飞书接口：记录逐条发送的 (receive_id, uuid)，按 respond(receive_id, 第几次) 返回结果。"""
+
+    def __init__(self, respond=None):
+        self.respond = respond or (lambda receive_id, nth: FeishuResult(200, 0))
+        self.sends = []
+        self.batch_calls = 0
+
+    async def arequest(self, method, path, *, params=None, json=None):
+        if path == push_dispatcher.BATCH_SEND_PATH:
+            self.batch_calls += 1
+            return FeishuResult(200, 0, data={})
+        receive_id = json["receive_id"]
+        self.sends.append((receive_id, json.get("uuid")))
+        nth = sum(1 for rid, _ in self.sends if rid == receive_id)
+        return self.respond(receive_id, nth)
+
+    def __enter__(self):
+        feishu_client.arequest = self.arequest
+        return self
+
+    def __exit__(self, *exc):
+        del feishu_client.arequest
+
+
+def _status_by_receiver():
+    return dict(database.get_connection().execute("SELECT receive_id, status FROM push_outbox").fetchall())
+
+
+def _per_user_dispatcher():
+    # 逐条发送（不走批量接口），重试退避压到毫秒级
+    push_dispatcher.PUSH_RETRY_BASE_DELAY_SEC = 0.001
+    push_dispatcher.PUSH_RETRY_MAX_DELAY_SEC = 0.001
+    return push_dispatcher.PushDispatcher(batch_send=False)
+
+
+def test_enqueue_idempotency():
+    """同一天同一类别同一用户只入队一次"""
+    _fresh_db()
+    units = [DeliveryUnit("AI", ["u1", "u2"], "card-ai", None), DeliveryUnit("GAMES", ["u1"], "card-games", None)]
+    assert push_outbox.enqueue_units(units, DATE_STR) == 3
+    assert push_outbox.enqueue_units(units, DATE_STR) == 0
+    assert push_outbox.enqueue_units(units, "2026-01-02") == 3
+
+
+def test_lease_reclaim():
+    """进程在发送中途退出：租约到期前不会被重复领取，到期后由下一次 drain 继续发送"""
+    _fresh_db()
+    push_outbox.enqueue_units([DeliveryUnit("AI", ["u1", "u2", "u3"], "card-ai", None)], DATE_STR)
+    crashed = database.claim_outbox(2, lease_sec=0.2)
+    assert len(crashed) == 2
+
+    with FakeFeishu() as fake:
+        summary = push_outbox.drain_outbox(_per_user_dispatcher())
+        assert summary["claimed"] == 1
+        time.sleep(0.25)
+        summary = push_outbox.drain_outbox(_per_user_dispatcher())
+        assert summary["claimed"] == 2 and summary["sent"] == 2
+    assert sorted(receive_id for receive_id, _ in fake.sends) == ["u1", "u2", "u3"]
+    assert set(_status_by_receiver().values()) == {"sent"}
+
+
+def test_retry_keeps_uuid():
+    """超时重试与租约重新领取发出的请求 uuid 相同，且等于幂等键派生值"""
+    _fresh_db()
+    push_outbox.enqueue_units([DeliveryUnit("AI", ["u1"], "card-ai", None)], DATE_STR)
+    expected = push_outbox.request_uuid(f"daily_push:{DATE_STR}:AI:u1")
+
+    def respond(receive_id, nth):
+        return FeishuResult(error="timeout") if nth == 1 else FeishuResult(200, 0)
+
+    with FakeFeishu(respond) as fake:
+        # 第一次领取后“崩溃”：发出请求但不标记结果
+        crashed = database.claim_outbox(1, lease_sec=0.2)
+        asyncio.run(push_outbox._send_group(_per_user_dispatcher(), crashed[0]["content"], "open_id", crashed))
+        time.sleep(0.25)
+        push_outbox.drain_outbox(_per_user_dispatcher())
+    uuids = [uuid for _, uuid in fake.sends]
+    assert len(uuids) >= 3 and set(uuids) == {expected}
+    assert len(expected) <= 50
+    assert _status_by_receiver() == {"u1": "sent"}
+
+
+def test_dead_letter():
+    """失败达到 OUTBOX_MAX_ATTEMPTS 次后转入死信，不再排期"""
+    _fresh_db()
+    push_outbox.enqueue_units([DeliveryUnit("AI", ["bad", "ok"], "card-ai", None)], DATE_STR)
+
+    def respond(receive_id, nth):
+        return FeishuResult(400, 230001, error="bad receive_id") if receive_id == "bad" else FeishuResult(200, 0)
+
+    conn = database.get_connection()
+    with FakeFeishu(respond):
+        for _ in range(OUTBOX_MAX_ATTEMPTS):
+            push_outbox.drain_outbox(_per_user_dispatcher())
+            # 跳过退避等待，让失败消息立即到期
+            conn.execute("UPDATE push_outbox SET next_attempt_at = 0 WHERE status = 'pending'")
+        summary = push_outbox.drain_outbox(_per_user_dispatcher())
+    assert summary["claimed"] == 0
+    assert _status_by_receiver() == {"bad": "dead", "ok": "sent"}
+    attempts = conn.execute("SELECT attempts FROM push_outbox WHERE receive_id = 'bad'").fetchone()[0]
+    assert attempts == OUTBOX_MAX_ATTEMPTS
+
+
+def main():
+    print("\n🧪 推送 outbox 测试")
+    print("=" * 60)
+    tests = [test_enqueue_idempotency, test_lease_reclaim, test_retry_keeps_uuid, test_dead_letter]
+    results = []
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: {test.__doc__}")
+            results.append(True)
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {test.__doc__} {e}")
+            results.append(False)
+
+    print("=" * 60)
+    print(f"通过: {sum(results)}/{len(results)}")
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+TTLSet 去重集合测试脚本
+使用临时 SQLite 数据库；两个同 namespace 的实例模拟两个 Web 进程。
+
+覆盖：
+1) 内存模式：重复键判重、过期后可重新加入
+2) 持久化模式：一个实例登记的键，另一个实例（另一进程）判为重复
+3) discard 同时删除数据库记录，其它实例随后可以重新登记
+4) 持久化模式下重启（新实例 preload）仍能识别之前的键
+
+用法：
+    python test_ttl_set.py
+"""
+
+import os
+import tempfile
+import time
+
+import database
+from ttl_set import TTLSet
+
+
+def _fresh_db():
+    """每个用例使用独立的临时数据库。"""
+    database.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="rss_ttlset_test_"), "test.db")
+    database.init_db()
+
+
+def test_memory_dedup_and_expiry():
+    """内存模式：有效期内重复，过期后重新出现"""
+    dedup = TTLSet(ttl_sec=0.2, max_size=100)
+    assert dedup.add("k") is True
+    assert dedup.add("k") is False
+    assert "k" in dedup
+    time.sleep(0.25)
+    assert "k" not in dedup
+    assert dedup.add("k") is True
+
+
+def test_cross_instance_claim():
+    """持久化模式：另一个进程登记过的键判为重复"""
+    _fresh_db()
+    web_a = TTLSet(ttl_sec=8, max_size=100, namespace="test_action")
+    web_b = TTLSet(ttl_sec=8, max_size=100, namespace="test_action")
+    web_a.preload()
+    web_b.preload()
+    assert web_a.add("click") is True
+    assert web_b.add("click") is False
+    # namespace 隔离
+    other = TTLSet(ttl_sec=8, max_size=100, namespace="other_action")
+    assert other.add("click") is True
+
+
+def test_discard_releases_claim():
+    """discard 删除数据库记录：被拒绝的点击可在任一进程立即重试"""
+    _fresh_db()
+    web_a = TTLSet(ttl_sec=8, max_size=100, namespace="test_action")
+    web_b = TTLSet(ttl_sec=8, max_size=100, namespace="test_action")
+    web_a.preload()
+    web_b.preload()
+    assert web_a.add("click") is True
+    assert web_b.add("click") is False
+    web_a.discard("click")
+    assert web_b.add("click") is True
+    assert web_a.add("click") is False
+
+
+def test_restart_preload():
+    """重启后（新实例）仍能识别未过期的键"""
+    _fresh_db()
+    before = TTLSet(ttl_sec=60, max_size=100, namespace="test_event")
+    assert before.add("event-1") is True
+    after = TTLSet(ttl_sec=60, max_size=100, namespace="test_event")
+    after.preload()
+    assert "event-1" in after
+    assert after.add("event-1") is False
+
+
+def main():
+    print("\n🧪 TTLSet 测试")
+    print("=" * 60)
+    tests = [test_memory_dedup_and_expiry, test_cross_instance_claim, test_discard_releases_claim, test_restart_preload]
+    results = []
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: {test.__doc__}")
+            results.append(True)
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {test.__doc__} {e}")
+            results.append(False)
+
+    print("=" * 60)
+    print(f"通过: {sum(results)}/{len(results)}")
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
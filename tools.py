@@ -1,4 +1,5 @@
 import requests
+import httpx
 import json
 import os
 from datetime import datetime, timedelta, timezone
@@ -20,34 +21,39 @@ def post_news_search(payload: dict, timeout: int = 10):
     return requests.post(NEWS_API_URL, headers=headers, json=payload, timeout=timeout)
 
 
-def fetch_news(
+def build_news_search_payload(
     category: str,
     start_dt: Optional[datetime] = None,
     end_dt: Optional[datetime] = None,
-):
-    """
-    调用外部 API 获取新闻数据
-    """
+) -> dict:
     # 默认构造过去 24 小时 UTC 时间窗口；实验场景可外部传入固定时间
     if end_dt is None:
         end_dt = datetime.now(timezone.utc)
     if start_dt is None:
         start_dt = end_dt - timedelta(hours=24)
-    start_dt_str = format_news_api_datetime(start_dt)
-    end_dt_str = format_news_api_datetime(end_dt)
-    
-    payload = {
+    return {
         "category": category,
-        "startDateTime": start_dt_str,
-        "endDateTime": end_dt_str,
+        "startDateTime": format_news_api_datetime(start_dt),
+        "endDateTime": format_news_api_datetime(end_dt),
         "sortOrder": "latest",
         "includeContent": False  # 只拿标题摘要，省 token
     }
+
+
+def fetch_news(
+    category: str,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
+):
+    """
+    调用外部 API 获取新闻数据
+    """
+    payload = build_news_search_payload(category, start_dt, end_dt)
     
     try:
         print(
             f"🌍 Fetching news category={category}, "
-            f"startDateTime={start_dt_str}, endDateTime={end_dt_str}"
+            f"startDateTime={payload['startDateTime']}, endDateTime={payload['endDateTime']}"
         )
         resp = post_news_search(payload, timeout=10)
         if resp.status_code == 200:
@@ -60,6 +66,33 @@ def fetch_news(
     except Exception as e:
         return f"Fetch exception: {str(e)}"
 
+async def afetch_news(
+    category: str,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
+):
+    """
+    fetch_news 的 async 版本（httpx），供 async 图节点使用；返回值约定与 fetch_news 一致
+    """
+    payload = build_news_search_payload(category, start_dt, end_dt)
+
+    try:
+        print(
+            f"🌍 Fetching news (async) category={category}, "
+            f"startDateTime={payload['startDateTime']}, endDateTime={payload['endDateTime']}"
+        )
+        async with httpx.AsyncClient(timeout=10) as client:
+            resp = await client.post(
+                NEWS_API_URL,
+                headers={"Content-Type": "application/json"},
+                json=payload,
+            )
+        if resp.status_code == 200:
+            return resp.json()
+        return f"Error: API status {resp.status_code}"
+    except Exception as e:
+        return f"Fetch exception: {str(e)}"
+
 if __name__ == "__main__":
     # 本地测试
     print(fetch_news("AI"))
@@ -0,0 +1,215 @@
+"""
+Agent 图节点追踪
+================
+职责：
+1) 为 agent_graph 的每个节点（router/saver/fetcher/scorer/writer/detail/chat）记录一个 span：
+   thread_id、category、缓存命中等标记、LLM token 用量、耗时、状态；
+2) span 以单行 JSON 写入本地滚动文件（RotatingFileHandler），供 view_traces.py 统计分位数；
+3) 通过 LangChain 回调自动累计节点内的 LLM token 用量。
+
+用法：
+- 节点注册时用 traced_node("writer")(writer_node) 包一层；
+- 节点内部用 annotate(cache_hit=True) 补充属性；
+- 节点内若把 LLM 调用放进线程池，提交时用 bind_span(fn) 让子线程仍归属当前 span。
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from config import TRACE_BACKUP_COUNT, TRACE_ENABLED, TRACE_LOG_PATH, TRACE_MAX_BYTES
+from metrics import LLM_TOKENS
+
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "agent_trace_span", default=None
+)
+# 同一 span 可能被多个线程（writer 并行改写）同时累加 token
+_span_lock = threading.Lock()
+
+_logger: Optional[logging.Logger] = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger() -> Optional[logging.Logger]:
+    """懒加载 span 输出文件；目录不可写时打印一次告警并关闭追踪输出。"""
+    global _logger
+    if _logger is not None:
+        return _logger if _logger.handlers else None
+    with _logger_lock:
+        if _logger is not None:
+            return _logger if _logger.handlers else None
+        logger = logging.getLogger("rss_agent.trace")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            os.makedirs(os.path.dirname(TRACE_LOG_PATH) or ".", exist_ok=True)
+            handler = RotatingFileHandler(
+                TRACE_LOG_PATH,
+                maxBytes=TRACE_MAX_BYTES,
+                backupCount=TRACE_BACKUP_COUNT,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        except OSError as e:
+            print(f"⚠️ [Trace] Cannot open {TRACE_LOG_PATH}, tracing output disabled: {e}")
+        _logger = logger
+        return _logger if _logger.handlers else None
+
+
+def _emit(span: Dict[str, Any]) -> None:
+    logger = _get_logger()
+    if logger is None:
+        return
+    logger.info(json.dumps(span, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+def annotate(**fields: Any) -> None:
+    """给当前 span 补充属性（如 cache_hit / router_source）；不在 span 内时忽略。"""
+    span = _current_span.get()
+    if span is None:
+        return
+    with _span_lock:
+        span["attrs"].update(fields)
+
+
+def current_node() -> Optional[str]:
+    """当前 span 对应的图节点名；不在 span 内时为 None。"""
+    span = _current_span.get()
+    return span["node"] if span is not None else None
+
+
+def record_token_usage(usage: Dict[str, Any], model: Optional[str] = None, step: Optional[str] = None) -> None:
+    """
+    把一次 LLM 调用的 token 用量累加到当前 span，并计入 /metrics 的 token 计数（step 默认取节点名）。
+    没有 span 的调用（如评分引擎自有线程池内的调用）不计数，由调用方按汇总结果补记，避免重复统计。
+    """
+    if not isinstance(usage, dict):
+        return
+    span = _current_span.get()
+    if span is None:
+        return
+    prompt_tokens = int(usage.get("prompt_tokens") or usage.get("input_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or usage.get("output_tokens") or 0)
+    total_tokens = int(usage.get("total_tokens") or (prompt_tokens + completion_tokens))
+    step = step or span["node"]
+    LLM_TOKENS.inc(prompt_tokens, step=step, model=model or "unknown", type="prompt")
+    LLM_TOKENS.inc(completion_tokens, step=step, model=model or "unknown", type="completion")
+    with _span_lock:
+        tokens = span["tokens"]
+        tokens["prompt_tokens"] += prompt_tokens
+        tokens["completion_tokens"] += completion_tokens
+        tokens["total_tokens"] += total_tokens
+        span["llm_calls"] += 1
+        if model and model not in span["models"]:
+            span["models"].append(model)
+
+
+def bind_span(fn: Callable) -> Callable:
+    """让提交到线程池的函数继续归属当前 span（每次提交各自复制一份上下文）。"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """LangChain 回调：LLM 调用结束时把 token 用量记到当前 span。"""
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        llm_output = getattr(response, "llm_output", None) or {}
+        usage = llm_output.get("token_usage") or llm_output.get("usage")
+        if not usage:
+            # 部分模型只在消息的 usage_metadata 中返回用量
+            for generations in getattr(response, "generations", None) or []:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    usage = getattr(message, "usage_metadata", None)
+                    if usage:
+                        break
+                if usage:
+                    break
+        if usage:
+            record_token_usage(dict(usage), llm_output.get("model_name"))
+
+
+token_usage_callback = TokenUsageCallback()
+
+
+def _new_span(name: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "node": name,
+        # run_agent 以 user_id 作为 LangGraph thread_id
+        "thread_id": state.get("user_id"),
+        "category": state.get("user_preference") or state.get("selected_category"),
+        "status": "ok",
+        "duration_ms": 0.0,
+        "llm_calls": 0,
+        "models": [],
+        "tokens": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        "attrs": {},
+    }
+
+
+def _finish_span(span: Dict[str, Any], started_at: float, result: Any = None, error: Exception = None) -> None:
+    if isinstance(result, dict) and result.get("user_preference"):
+        span["category"] = result["user_preference"]
+    if error is not None:
+        span["status"] = "error"
+        span["error"] = f"{type(error).__name__}: {error}"
+    span["duration_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+    _emit(span)
+
+
+def traced_node(name: str) -> Callable:
+    """节点装饰器（同步 / async 均可）：记录一次节点执行的 span（异常照常抛出，span 标记为 error）。"""
+
+    def decorator(fn: Callable) -> Callable:
+        if not TRACE_ENABLED:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(state, *args, **kwargs):
+                span = _new_span(name, state)
+                token = _current_span.set(span)
+                started_at = time.perf_counter()
+                try:
+                    result = await fn(state, *args, **kwargs)
+                except Exception as e:
+                    _current_span.reset(token)
+                    _finish_span(span, started_at, error=e)
+                    raise
+                _current_span.reset(token)
+                _finish_span(span, started_at, result=result)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state, *args, **kwargs):
+            span = _new_span(name, state)
+            token = _current_span.set(span)
+            started_at = time.perf_counter()
+            try:
+                result = fn(state, *args, **kwargs)
+            except Exception as e:
+                _current_span.reset(token)
+                _finish_span(span, started_at, error=e)
+                raise
+            _current_span.reset(token)
+            _finish_span(span, started_at, result=result)
+            return result
+
+        return wrapper
+
+    return decorator
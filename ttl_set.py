@@ -0,0 +1,105 @@
+"""
+带过期时间的去重集合
+====================
+职责：
+1) 哈希表 O(1) 判重，键在 ttl_sec 后过期；
+2) 内存上限 max_size：超出时淘汰最早加入的键，长时间突发也不会无限增长；
+3) 可选持久化（namespace 非空）：键同时写入 SQLite dedup_keys 表，
+   进程重启后仍能识别飞书的超时重试；多进程共用同一数据库时，add() 的写入本身就是原子的“抢占”。
+
+由于所有键的 TTL 相同，插入顺序即过期顺序：过期清理只需从队头弹出，均摊 O(1)。
+
+用法：
+    processed_events = TTLSet(ttl_sec=12 * 3600, max_size=100_000, namespace="lark_event")
+    if not processed_events.add(event_id):
+        ...  # 重复事件
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from database import claim_dedup_key, load_dedup_keys, release_dedup_key
+
+
+class TTLSet:
+    def __init__(self, ttl_sec: float, max_size: int, namespace: Optional[str] = None):
+        self.ttl_sec = float(ttl_sec)
+        self.max_size = max(1, int(max_size))
+        self.namespace = namespace
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()  # key -> expires_at（time.time()）
+        self._lock = threading.Lock()
+        self._loaded = namespace is None
+
+    def _load(self) -> None:
+        """首次使用时从 SQLite 载入未过期的键（持久化模式）。"""
+        try:
+            rows = load_dedup_keys(self.namespace, time.time(), self.max_size)
+        except Exception as e:
+            print(f"⚠️ [TTLSet] Load {self.namespace} failed, starting empty: {e}")
+            rows = []
+        for key, expires_at in rows:
+            self._entries[key] = expires_at
+        self._loaded = True
+
+    def preload(self) -> None:
+        """提前载入持久化的键（服务启动时调用，避免首个请求在事件循环里读库）。"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _evict(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            key, expires_at = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.max_size:
+                break
+            entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            expires_at = self._entries.get(key)
+            return expires_at is not None and expires_at > now
+
+    def add(self, key: Hashable) -> bool:
+        """加入键；返回 True 表示首次出现（或已过期后重新出现），False 表示仍在有效期内的重复键。"""
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._evict(now)
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            if self.namespace is not None:
+                # 其它进程可能已处理过该键；写库失败时退化为仅内存判重
+                # 其它进程持有的键不缓存到内存：该进程 discard 后，本进程下一次 add 能从数据库看到
+                try:
+                    if not claim_dedup_key(self.namespace, str(key), now, now + self.ttl_sec):
+                        return False
+                except Exception as e:
+                    print(f"⚠️ [TTLSet] Persist {self.namespace} failed: {e}")
+            self._entries.pop(key, None)
+            self._entries[key] = now + self.ttl_sec
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def discard(self, key: Hashable) -> None:
+        """移除键（持久化模式同时删除 SQLite 中的记录；用于被拒绝的操作，允许用户立即重试）。"""
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.namespace is not None:
+                try:
+                    release_dedup_key(self.namespace, str(key))
+                except Exception as e:
+                    print(f"⚠️ [TTLSet] Release {self.namespace} failed: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(time.time())
+            return len(self._entries)
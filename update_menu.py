@@ -3,6 +3,7 @@ import os
 import json
 from dotenv import load_dotenv
 from config import DAILY_NEWS_CATEGORIES
+from feishu_auth import get_token_provider
 
 load_dotenv()
 
@@ -10,14 +11,10 @@ APP_ID = os.getenv("LARK_APP_ID")
 APP_SECRET = os.getenv("LARK_APP_SECRET")
 
 def get_tenant_access_token():
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-    req_body = {
-        "app_id": APP_ID,
-        "app_secret": APP_SECRET
-    }
-    resp = requests.post(url, json=req_body)
-    resp.raise_for_status()
-    return resp.json().get("tenant_access_token")
+    token = get_token_provider(APP_ID, APP_SECRET).get_token()
+    if not token:
+        raise RuntimeError("Failed to get tenant_access_token")
+    return token
 
 def update_bot_menu():
     token = get_tenant_access_token()
@@ -7,8 +7,11 @@
 import sqlite3
 import json
 import os
+import zlib
 from datetime import date
 
+from briefing_codec import decode_payload
+
 # 数据库文件路径（兼容容器内外）
 DB_PATHS = [
     "/app/data/rss_agent.db",  # 容器内
@@ -74,17 +77,19 @@ def view_user_preferences(conn):
     print_table(headers, table_data, [38, 10, 25])
     print(f"  总计: {len(rows)} 个订阅\n")
 
-def view_daily_news_cache(conn):
-    """查看每日新闻缓存"""
+def view_daily_news_cache(conn, limit=30):
+    """查看每日新闻缓存（只列最近 limit 条，更早的数据由保留任务归档）"""
     print_header("📰 每日新闻缓存 (daily_news_cache)")
     
+    total = conn.execute("SELECT COUNT(*) FROM daily_news_cache").fetchone()[0]
     cursor = conn.execute("""
         SELECT category, date, generated_at, 
                length(content) as content_size,
-               length(briefing_data) as briefing_size
+               COALESCE(length(briefing_blob), length(briefing_data)) as briefing_size
         FROM daily_news_cache 
         ORDER BY date DESC, category
-    """)
+        LIMIT ?
+    """, (limit,))
     
     rows = cursor.fetchall()
     
@@ -105,7 +110,7 @@ def view_daily_news_cache(conn):
         ])
     
     print_table(headers, table_data, [8, 12, 25, 12, 12])
-    print(f"  总计: {len(rows)} 条缓存\n")
+    print(f"  总计: {total} 条缓存（显示最近 {len(rows)} 条）\n")
 
 def view_briefing_details(conn, category=None, target_date=None):
     """查看详细的briefing数据"""
@@ -117,7 +122,7 @@ def view_briefing_details(conn, category=None, target_date=None):
     
     print_header(title)
     
-    query = "SELECT category, date, briefing_data FROM daily_news_cache WHERE 1=1"
+    query = "SELECT category, date, briefing_data, briefing_blob FROM daily_news_cache WHERE 1=1"
     params = []
     
     if category:
@@ -138,19 +143,20 @@ def view_briefing_details(conn, category=None, target_date=None):
         return
     
     for row in rows:
-        cat, dt, briefing_json = row
+        cat, dt, briefing_json, briefing_blob = row
         
         print(f"\n{'─'*80}")
         print(f"  📂 Category: {cat}")
         print(f"  📅 Date: {dt}")
         print(f"{'─'*80}")
         
-        if not briefing_json:
+        if not briefing_json and not briefing_blob:
             print("\n  ⚠️  无briefing数据\n")
             continue
         
         try:
-            briefing = json.loads(briefing_json)
+            # 新数据为紧凑编码（briefing_blob），旧数据为 JSON 文本
+            briefing = decode_payload(briefing_blob) if briefing_blob else json.loads(briefing_json)
             
             # 输出摘要
             if 'summary' in briefing:
@@ -184,7 +190,7 @@ def view_briefing_details(conn, category=None, target_date=None):
             
             print()
             
-        except json.JSONDecodeError as e:
+        except (ValueError, zlib.error) as e:
             print(f"\n  ❌ JSON 解析失败: {e}\n")
 
 def main():
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+节点追踪查看工具
+统计 agent_spans.jsonl（含滚动备份）中各节点的耗时分位数、错误数、缓存命中与 token 用量
+
+用法：
+    python view_traces.py                       # 全部 span
+    python view_traces.py --since-hours 24      # 最近 24 小时
+    python view_traces.py --thread ou_xxx       # 只看某个用户（thread_id）
+    python view_traces.py --node writer --tail 20
+"""
+
+import argparse
+import glob
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+# span 文件路径（兼容容器内外）
+TRACE_PATHS = [
+    "/app/data/traces/agent_spans.jsonl",  # 容器内
+    "./data/traces/agent_spans.jsonl",     # 容器外（项目根目录）
+]
+NODE_ORDER = ["router", "saver", "fetcher", "scorer", "writer", "detail", "chat"]
+
+
+def get_trace_path():
+    """自动检测 span 文件路径"""
+    for path in TRACE_PATHS:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"span 文件未找到，尝试过的路径: {TRACE_PATHS}")
+
+
+def load_spans(path, since=None, thread_id=None, node=None):
+    """读取主文件与滚动备份（.1 .2 ...），按时间升序返回"""
+    spans = []
+    for file_path in sorted(glob.glob(f"{path}.*"), reverse=True) + [path]:
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if since and datetime.fromisoformat(span["ts"]) < since:
+                    continue
+                if thread_id and span.get("thread_id") != thread_id:
+                    continue
+                if node and span.get("node") != node:
+                    continue
+                spans.append(span)
+    spans.sort(key=lambda x: x["ts"])
+    return spans
+
+
+def percentile(sorted_values, pct):
+    """最近秩法分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def print_summary(spans):
+    """按节点打印 p50/p90/p95/p99/max、错误数、缓存命中率与平均 token"""
+    by_node = {}
+    for span in spans:
+        by_node.setdefault(span["node"], []).append(span)
+
+    headers = ["node", "count", "err", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms", "cache_hit", "avg_tokens"]
+    rows = []
+    for node in NODE_ORDER + sorted(set(by_node) - set(NODE_ORDER)):
+        node_spans = by_node.get(node)
+        if not node_spans:
+            continue
+        durations = sorted(float(s.get("duration_ms") or 0) for s in node_spans)
+        errors = sum(1 for s in node_spans if s.get("status") == "error")
+        cache_flags = [s["attrs"]["cache_hit"] for s in node_spans if "cache_hit" in (s.get("attrs") or {})]
+        cache_hit = f"{sum(cache_flags) / len(cache_flags):.0%}" if cache_flags else "-"
+        avg_tokens = sum((s.get("tokens") or {}).get("total_tokens", 0) for s in node_spans) / len(node_spans)
+        rows.append([
+            node,
+            len(node_spans),
+            errors,
+            *(f"{percentile(durations, p):.1f}" for p in (50, 90, 95, 99)),
+            f"{durations[-1]:.1f}",
+            cache_hit,
+            f"{avg_tokens:.0f}",
+        ])
+
+    widths = [max(len(str(x)) for x in col) for col in zip(headers, *rows)]
+    print()
+    print("  " + " | ".join(h.ljust(widths[i]) for i, h in enumerate(headers)))
+    print("  " + "-" * (sum(widths) + 3 * (len(widths) - 1)))
+    for row in rows:
+        print("  " + " | ".join(str(c).ljust(widths[i]) for i, c in enumerate(row)))
+    print()
+
+
+def print_tail(spans, n):
+    """打印最近 n 条 span 明细"""
+    for span in spans[-n:]:
+        attrs = " ".join(f"{k}={v}" for k, v in (span.get("attrs") or {}).items())
+        print(
+            f"  {span['ts']} {span['node']:<8} {span.get('status'):<5} "
+            f"{float(span.get('duration_ms') or 0):>9.1f}ms "
+            f"thread={span.get('thread_id')} category={span.get('category')} "
+            f"tokens={(span.get('tokens') or {}).get('total_tokens', 0)} {attrs}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看 agent 节点 span 统计")
+    parser.add_argument("--file", help="span 文件路径（默认自动检测）")
+    parser.add_argument("--since-hours", type=float, help="只统计最近 N 小时")
+    parser.add_argument("--thread", help="只看某个 thread_id（即 user_id）")
+    parser.add_argument("--node", help="只看某个节点")
+    parser.add_argument("--tail", type=int, default=0, help="额外打印最近 N 条明细")
+    args = parser.parse_args()
+
+    path = args.file or get_trace_path()
+    since = datetime.now(timezone.utc) - timedelta(hours=args.since_hours) if args.since_hours else None
+    spans = load_spans(path, since=since, thread_id=args.thread, node=args.node)
+
+    print(f"📈 {path}: {len(spans)} spans")
+    if not spans:
+        return
+    print(f"   {spans[0]['ts']} ~ {spans[-1]['ts']}")
+    print_summary(spans)
+    if args.tail:
+        print_tail(spans, args.tail)
+
+
+if __name__ == "__main__":
+    main()